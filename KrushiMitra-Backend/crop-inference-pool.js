@@ -0,0 +1,236 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+const SCRIPT_PATH = path.join(__dirname, 'scripts', 'crop_inference.py');
+
+// Worker exit code for a planned recycle (memory cap / request budget reached)
+const WORKER_RECYCLE_EXIT_CODE = 3;
+// A worker that stayed up this long is healthy again; its crash backoff starts over
+const WORKER_STABLE_MS = 60000;
+
+/**
+ * Supervised pool of resident `crop_inference.py --worker` processes.
+ *
+ * Each worker loads YOLO once and answers JSON-lines requests, so an upload
+ * no longer pays interpreter start-up and model load. Requests go to the
+ * least busy ready worker. A worker that is about to recycle (request budget
+ * or memory cap) stops receiving work, and whatever it had not answered is
+ * re-queued for the other workers. Crashed workers are restarted with backoff
+ * and their in-flight requests are failed rather than left hanging.
+ */
+class CropInferencePool {
+  constructor(options = {}) {
+    this.size = options.size || parseInt(process.env.CROP_WORKER_POOL_SIZE || '2', 10);
+    this.maxMemoryMb = options.maxMemoryMb || parseInt(process.env.CROP_WORKER_MAX_MEMORY_MB || '1024', 10);
+    this.maxRequests = options.maxRequests || parseInt(process.env.CROP_WORKER_MAX_REQUESTS || '0', 10);
+    this.requestTimeoutMs = options.requestTimeoutMs || parseInt(process.env.CROP_WORKER_TIMEOUT_MS || '60000', 10);
+    this.pythonPath = options.pythonPath || process.env.PYTHON_PATH || 'python';
+    this.scriptPath = options.scriptPath || SCRIPT_PATH;
+    this.workers = [];
+    this.waiting = [];
+    this.nextRequestId = 1;
+    this.closed = false;
+  }
+
+  start() {
+    for (let slot = 0; slot < this.size; slot++) {
+      this.workers.push(this._spawnWorker(slot, 0));
+    }
+    console.log(`🧵 Crop inference pool started with ${this.size} workers`);
+    return this;
+  }
+
+  /**
+   * Analyze an image file on the next available worker
+   * @param {string} imagePath - Path to the uploaded image
+   * @returns {Promise<Object>} - Parsed output of crop_inference.py
+   */
+  analyze(imagePath) {
+    if (this.closed) {
+      return Promise.reject(new Error('Crop inference pool is shut down'));
+    }
+    if (this.workers.length === 0) this.start();
+
+    return new Promise((resolve, reject) => {
+      const request = { id: this.nextRequestId++, imagePath, resolve, reject };
+      request.timer = setTimeout(() => {
+        this._forget(request);
+        reject(new Error(`Crop inference timed out after ${this.requestTimeoutMs}ms`));
+      }, this.requestTimeoutMs);
+
+      const worker = this._pickWorker();
+      if (worker) {
+        this._dispatch(worker, request);
+      } else {
+        // No worker is ready yet (start-up or restart); hold until one is
+        this.waiting.push(request);
+      }
+    });
+  }
+
+  shutdown() {
+    this.closed = true;
+    for (const worker of this.workers) {
+      clearTimeout(worker.restartTimer);
+      if (worker.process) worker.process.kill();
+    }
+    for (const request of this.waiting.splice(0)) {
+      clearTimeout(request.timer);
+      request.reject(new Error('Crop inference pool is shut down'));
+    }
+  }
+
+  stats() {
+    return {
+      size: this.size,
+      waiting: this.waiting.length,
+      workers: this.workers.map((worker) => ({
+        pid: worker.process ? worker.process.pid : null,
+        ready: worker.ready,
+        inFlight: worker.pending.size,
+        restarts: worker.restarts  // consecutive quick crashes
+      }))
+    };
+  }
+
+  _spawnWorker(slot, restarts) {
+    const child = spawn(this.pythonPath, [
+      this.scriptPath,
+      '--worker',
+      '--max-memory-mb', String(this.maxMemoryMb),
+      '--max-requests', String(this.maxRequests)
+    ]);
+
+    const worker = {
+      slot,
+      process: child,
+      ready: false,
+      pending: new Map(),
+      dispatched: 0,
+      restarts,
+      startedAt: Date.now(),
+      restartTimer: null
+    };
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (e) {
+        console.error('Crop worker sent invalid JSON:', line);
+        return;
+      }
+
+      if (message.recycling) {
+        // Announced just before a planned exit; send nothing more its way
+        worker.ready = false;
+        return;
+      }
+
+      if (message.ready !== undefined) {
+        worker.ready = message.ready === true;
+        if (worker.ready) {
+          this._drainWaiting();
+        } else {
+          console.error(`Crop worker ${slot} failed to start: ${message.error}`);
+        }
+        return;
+      }
+
+      const request = worker.pending.get(message.id);
+      if (!request) return;
+      worker.pending.delete(message.id);
+      clearTimeout(request.timer);
+      delete message.id;
+      request.resolve(message);
+      this._drainWaiting();
+    });
+
+    child.stderr.on('data', (data) => {
+      console.error(`Crop worker ${slot}: ${data.toString().trim()}`);
+    });
+
+    child.stdin.on('error', (err) => {
+      // EPIPE when the worker dies mid-write; the exit handler fails its requests
+      console.error(`Crop worker ${slot} stdin error: ${err.message}`);
+    });
+
+    child.on('error', (err) => {
+      console.error(`Failed to start crop worker ${slot}: ${err.message}`);
+    });
+
+    // 'close' comes after stdout has ended, so every result the worker wrote has been handled
+    child.on('close', (code, signal) => {
+      worker.ready = false;
+      worker.process = null;
+      const planned = code === WORKER_RECYCLE_EXIT_CODE && !this.closed;
+
+      const unanswered = [...worker.pending.values()];
+      worker.pending.clear();
+      if (planned) {
+        // Requests the worker never read go back to the front of the queue, in order
+        for (const request of unanswered) request.worker = null;
+        this.waiting.unshift(...unanswered);
+        this._drainWaiting();
+      } else {
+        for (const request of unanswered) {
+          clearTimeout(request.timer);
+          request.reject(new Error(`Crop worker exited (code ${code}, signal ${signal})`));
+        }
+      }
+
+      if (this.closed) return;
+
+      const crashes = Date.now() - worker.startedAt >= WORKER_STABLE_MS ? 0 : restarts;
+      const nextRestarts = planned ? crashes : crashes + 1;
+      // Exponential backoff for crash loops, capped at 30s; recycles restart at once
+      const delay = planned ? 0 : Math.min(1000 * 2 ** crashes, 30000);
+      if (!planned) {
+        console.error(`⚠️ Crop worker ${slot} crashed (code ${code}, signal ${signal}); restarting in ${delay}ms`);
+      }
+      worker.restartTimer = setTimeout(() => {
+        this.workers[slot] = this._spawnWorker(slot, nextRestarts);
+        this._drainWaiting();
+      }, delay);
+    });
+
+    return worker;
+  }
+
+  _pickWorker() {
+    let best = null;
+    for (const worker of this.workers) {
+      if (!worker.ready) continue;
+      if (!best || worker.pending.size < best.pending.size) best = worker;
+    }
+    return best;
+  }
+
+  _dispatch(worker, request) {
+    worker.pending.set(request.id, request);
+    request.worker = worker;
+    worker.dispatched++;
+    if (this.maxRequests && worker.dispatched >= this.maxRequests) {
+      // The worker exits after answering its budget; anything more would be stranded
+      worker.ready = false;
+    }
+    worker.process.stdin.write(JSON.stringify({ id: request.id, image_path: request.imagePath }) + '\n');
+  }
+
+  _drainWaiting() {
+    while (this.waiting.length > 0) {
+      const worker = this._pickWorker();
+      if (!worker) return;
+      this._dispatch(worker, this.waiting.shift());
+    }
+  }
+
+  _forget(request) {
+    const index = this.waiting.indexOf(request);
+    if (index !== -1) this.waiting.splice(index, 1);
+    if (request.worker) request.worker.pending.delete(request.id);
+  }
+}
+
+module.exports = { CropInferencePool };
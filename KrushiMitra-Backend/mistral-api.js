@@ -13,45 +13,98 @@ app.use(express.json());
 // Path to your Python AI script
 const PYTHON_SCRIPT_PATH = path.join(__dirname, '../mistral_service.py');
 
+const readline = require('readline');
+
 /**
- * Execute Python script with input and return response
+ * Resident `mistral_service.py --serve` process.
+ *
+ * One interpreter stays up with a pooled keep-alive HTTP session, so chat
+ * calls skip interpreter start-up and a fresh TLS handshake. Requests carry
+ * an id and may complete out of order; the process is restarted if it exits.
  */
-function executePythonScript(input, action = 'advice') {
-  return new Promise((resolve, reject) => {
-    const python = spawn('python', [PYTHON_SCRIPT_PATH]);
-    let output = '';
-    let error = '';
-
-    // Send input to Python script
-    const requestData = JSON.stringify({ action, input });
-    python.stdin.write(requestData);
-    python.stdin.end();
-
-    python.stdout.on('data', (data) => {
-      output += data.toString();
+class MistralServiceClient {
+  constructor(scriptPath) {
+    this.scriptPath = scriptPath;
+    this.timeoutMs = parseInt(process.env.MISTRAL_SERVICE_TIMEOUT_MS || '45000', 10);
+    this.process = null;
+    this.pending = new Map();
+    this.nextId = 1;
+  }
+
+  _ensureProcess() {
+    if (this.process) return this.process;
+
+    const python = spawn('python', [this.scriptPath, '--serve']);
+    this.process = python;
+
+    readline.createInterface({ input: python.stdout }).on('line', (line) => {
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (parseError) {
+        console.error('Mistral service sent invalid JSON:', line);
+        return;
+      }
+      if (message.ready) return;
+
+      const request = this.pending.get(message.id);
+      if (!request) return;
+      this.pending.delete(message.id);
+      clearTimeout(request.timer);
+      delete message.id;
+      request.resolve(message);
     });
 
     python.stderr.on('data', (data) => {
-      error += data.toString();
+      console.error('Mistral service error:', data.toString());
     });
 
-    python.on('close', (code) => {
-      if (code !== 0) {
-        reject(new Error(`Python script exited with code ${code}: ${error}`));
-      } else {
-        try {
-          const result = JSON.parse(output.trim());
-          resolve(result);
-        } catch (parseError) {
-          resolve({ response: output.trim() });
-        }
-      }
+    python.stdin.on('error', (err) => {
+      console.error('Mistral service stdin error:', err.message);
     });
 
     python.on('error', (err) => {
-      reject(new Error(`Failed to start Python process: ${err.message}`));
+      this._failAll(new Error(`Failed to start Python process: ${err.message}`));
     });
-  });
+
+    python.on('exit', (code) => {
+      if (this.process === python) this.process = null;
+      this._failAll(new Error(`Python service exited with code ${code}`));
+    });
+
+    return python;
+  }
+
+  _failAll(error) {
+    for (const request of this.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(error);
+    }
+    this.pending.clear();
+  }
+
+  request(input, action) {
+    return new Promise((resolve, reject) => {
+      const python = this._ensureProcess();
+      const id = this.nextId++;
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Python service timed out after ${this.timeoutMs}ms`));
+      }, this.timeoutMs);
+
+      this.pending.set(id, { resolve, reject, timer });
+      python.stdin.write(JSON.stringify({ id, action, input }) + '\n');
+    });
+  }
+}
+
+const mistralService = new MistralServiceClient(PYTHON_SCRIPT_PATH);
+
+/**
+ * Send input to the resident Python service and return its response
+ */
+function executePythonScript(input, action = 'advice') {
+  return mistralService.request(input, action);
 }
 
 // Health check endpoint
@@ -169,29 +222,13 @@ app.post('/api/mistral/stream', async (req, res) => {
 
     console.log(`[${new Date().toISOString()}] Stream request: ${query.substring(0, 100)}...`);
 
-    const python = spawn('python', [PYTHON_SCRIPT_PATH]);
-    
-    // Send input to Python script
-    const requestData = JSON.stringify({ action: 'chat', input: query });
-    python.stdin.write(requestData);
-    python.stdin.end();
-
-    python.stdout.on('data', (data) => {
-      res.write(data.toString());
-    });
-
-    python.stderr.on('data', (data) => {
-      console.error('Python error:', data.toString());
-    });
-
-    python.on('close', (code) => {
-      res.end();
-    });
-
-    python.on('error', (err) => {
-      console.error('Python process error:', err);
-      res.end();
-    });
+    try {
+      const result = await executePythonScript(query, 'chat');
+      res.write(JSON.stringify(result));
+    } catch (serviceError) {
+      console.error('Python process error:', serviceError);
+    }
+    res.end();
 
   } catch (error) {
     console.error('Stream endpoint error:', error);
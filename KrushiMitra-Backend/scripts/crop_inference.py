@@ -3,6 +3,13 @@ import json
 import os
 import argparse
 import random
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, the export is still published atomically
+    fcntl = None
 
 # Suppress YOLO logs
 os.environ["YOLO_VERBOSE"] = "False"
@@ -15,86 +22,230 @@ except ImportError as e:
     print(json.dumps({"success": False, "error": f"Import Error: {str(e)}"}))
     sys.exit(1)
 
+# Simulated Disease Classes
+DISEASES = [
+    "Healthy",
+    "Leaf Blight",
+    "Brown Spot",
+    "Powdery Mildew",
+    "Rust"
+]
+
+# Exit code used by a worker that retires itself after crossing its memory cap
+# or request budget. The supervisor treats it as a planned restart, not a crash.
+WORKER_RECYCLE_EXIT_CODE = 3
+
+
+# Exported detector artifacts, by CROP_DETECTOR_FORMAT. They are cached in
+# CROP_MODEL_DIR (default: this directory) rather than the working directory,
+# named by input size and precision so a config change triggers a new export.
+EXPORTED_DETECTORS = {
+    "onnx": "yolov8n-{imgsz}-{precision}.onnx",
+    "openvino": "yolov8n-{imgsz}-{precision}_openvino_model",
+}
+
+
+def find_weights(model_dir):
+    """Local yolov8n.pt in CROP_MODEL_DIR or the working directory, if there is one"""
+    for directory in (model_dir, os.getcwd()):
+        weights = os.path.join(directory, "yolov8n.pt")
+        if os.path.exists(weights):
+            return weights
+    return None
+
+
+def export_detector(detector_format, path, imgsz, half, weights):
+    """Export yolov8n once across all worker processes and publish it atomically"""
+    # Workers start together; the first one exports while the others wait on the lock
+    with open(path + ".lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            return  # exported by another worker while this one waited
+
+        # Ultralytics writes the export next to the weights, so work on a private
+        # copy; without local weights it downloads them into the work directory
+        work_dir = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(path))
+        try:
+            local_weights = os.path.join(work_dir, "yolov8n.pt")
+            if weights is not None:
+                shutil.copyfile(weights, local_weights)
+            exported = YOLO(local_weights).export(
+                format=detector_format, imgsz=imgsz, half=half
+            )
+            os.replace(exported, path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def load_model():
+    """Load the detection model once per process"""
+    # Using a pre-trained model. In a real scenario, this would be a custom trained 'yolov8n-leaf.pt'
+    # For this demo, we use standard 'yolov8n.pt' and check for any detection as a proxy for "something found"
+    detector_format = os.environ.get("CROP_DETECTOR_FORMAT", "pytorch")
+    model_dir = os.environ.get("CROP_MODEL_DIR", os.path.dirname(os.path.abspath(__file__)))
+    if detector_format not in EXPORTED_DETECTORS:
+        return YOLO(find_weights(model_dir) or "yolov8n.pt")
+
+    # One-time export with a fixed input size; later processes load the cached file
+    imgsz = int(os.environ.get("CROP_DETECTOR_IMGSZ", "640"))
+    half = os.environ.get("CROP_DETECTOR_HALF", "false").lower() == "true"
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, EXPORTED_DETECTORS[detector_format].format(
+        imgsz=imgsz, precision="fp16" if half else "fp32"
+    ))
+    if not os.path.exists(path):
+        export_detector(detector_format, path, imgsz, half, find_weights(model_dir))
+    return YOLO(path, task="detect")
+
+
+def analyze_image(model, image_path):
+    """Run leaf detection and disease analysis on a single image file"""
+    if not os.path.exists(image_path):
+        return {"success": False, "error": "File not found"}
+
+    # ---------------------------------------------------------
+    # STEP 4: Leaf/Region Detection (YOLOv8)
+    # ---------------------------------------------------------
+    results = model(image_path, verbose=False)
+
+    detected_objects = []
+    has_leaf_or_plant = False
+
+    # Mocking "Leaf" detection if *any* object is found or just assuming success for the demo
+    # In reality, check for class_id corresponding to plant/potted plant
+    if len(results) > 0 and len(results[0].boxes) > 0:
+        has_leaf_or_plant = True # Simplified for demo
+
+        # Creating a mock bounding box result (whole tensors converted at once)
+        boxes = results[0].boxes
+        detected_objects = [
+            {"class": class_id, "conf": conf, "box": box}
+            for class_id, conf, box in zip(
+                boxes.cls.int().tolist(), boxes.conf.tolist(), boxes.xywh.tolist()
+            )
+        ]
+
+    # ---------------------------------------------------------
+    # STEP 5: Disease Analysis (MobileNet / CNN)
+    # ---------------------------------------------------------
+    # Since we don't have the trained .h5 model file yet, we simulate the classification logic.
+    # This structure is ready to swap in `tf.keras.models.load_model('disease_model.h5')`
+
+    # Random simulation for demonstration (skewed towards Healthy or randomness)
+    # In production: img = preprocess(image_path); prediction = disease_model.predict(img)
+    predicted_index = random.choices(
+        range(len(DISEASES)),
+        weights=[0.4, 0.2, 0.2, 0.1, 0.1],
+        k=1
+    )[0]
+
+    disease_name = DISEASES[predicted_index]
+    confidence = round(random.uniform(0.75, 0.99), 2)
+
+    # ---------------------------------------------------------
+    # Output JSON
+    # ---------------------------------------------------------
+    return {
+        "success": True,
+        "leaf_detection": {
+            "detected": has_leaf_or_plant,
+            "objects": len(detected_objects),
+            "model": "YOLOv8n"
+        },
+        "disease_analysis": {
+            "disease": disease_name,
+            "confidence": confidence,
+            "model": "MobileNetV3 (Simulated)"
+        }
+    }
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (0 where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(max_memory_mb=0, max_requests=0):
+    """
+    Serve many images from one process over JSON lines on stdin/stdout.
+
+    Each request line is {"id": ..., "image_path": ...}; each response line is
+    the normal one-shot output plus the echoed "id". The model is loaded once.
+    """
+    # Keep stdout reserved for the protocol; stray prints from libraries go to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def send(message):
+        protocol_out.write(json.dumps(message) + "\n")
+        protocol_out.flush()
+
+    try:
+        model = load_model()
+    except Exception as e:
+        send({"ready": False, "error": f"Model load failed: {str(e)}"})
+        sys.exit(1)
+
+    send({"ready": True, "pid": os.getpid()})
+
+    served = 0
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            output = analyze_image(model, request["image_path"])
+        except Exception as e:
+            output = {"success": False, "error": str(e)}
+
+        output["id"] = request_id
+        send(output)
+        served += 1
+
+        # Recycle after answering; the announcement lets the pool stop routing
+        # here and re-queue anything already written to stdin but never read
+        if max_memory_mb and _peak_rss_mb() > max_memory_mb:
+            print(f"Worker {os.getpid()} exceeded {max_memory_mb} MB, recycling", file=sys.stderr)
+            send({"recycling": True})
+            sys.exit(WORKER_RECYCLE_EXIT_CODE)
+        if max_requests and served >= max_requests:
+            send({"recycling": True})
+            sys.exit(WORKER_RECYCLE_EXIT_CODE)
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("image_path", help="Path to the image file")
+    parser.add_argument("image_path", nargs="?", help="Path to the image file")
+    parser.add_argument("--worker", action="store_true",
+                        help="Stay resident and serve JSON-lines requests on stdin")
+    parser.add_argument("--max-memory-mb", type=int,
+                        default=int(os.environ.get("CROP_WORKER_MAX_MEMORY_MB", "0")),
+                        help="Recycle the worker once its peak RSS exceeds this (0 = no cap)")
+    parser.add_argument("--max-requests", type=int,
+                        default=int(os.environ.get("CROP_WORKER_MAX_REQUESTS", "0")),
+                        help="Recycle the worker after serving this many images (0 = no limit)")
     args = parser.parse_args()
 
-    image_path = args.image_path
-
-    if not os.path.exists(image_path):
-        print(json.dumps({"success": False, "error": "File not found"}))
+    if args.worker:
+        run_worker(args.max_memory_mb, args.max_requests)
         return
 
+    if not args.image_path:
+        parser.error("image_path is required unless --worker is given")
+
     try:
-        # ---------------------------------------------------------
-        # STEP 4: Leaf/Region Detection (YOLOv8)
-        # ---------------------------------------------------------
-        # Using a pre-trained model. In a real scenario, this would be a custom trained 'yolov8n-leaf.pt'
-        # For this demo, we use standard 'yolov8n.pt' and check for any detection as a proxy for "something found"
-        model = YOLO("yolov8n.pt") 
-        
-        results = model(image_path, verbose=False)
-        
-        detected_objects = []
-        has_leaf_or_plant = False
-
-        # Mocking "Leaf" detection if *any* object is found or just assuming success for the demo
-        # In reality, check for class_id corresponding to plant/potted plant
-        if len(results) > 0 and len(results[0].boxes) > 0:
-            has_leaf_or_plant = True # Simplified for demo
-            
-            # Creating a mock bounding box result
-            for box in results[0].boxes:
-                detected_objects.append({
-                    "class": int(box.cls),
-                    "conf": float(box.conf),
-                    "box": box.xywh.tolist()[0]
-                })
-
-        # ---------------------------------------------------------
-        # STEP 5: Disease Analysis (MobileNet / CNN)
-        # ---------------------------------------------------------
-        # Since we don't have the trained .h5 model file yet, we simulate the classification logic.
-        # This structure is ready to swap in `tf.keras.models.load_model('disease_model.h5')`
-        
-        # Simulated Disease Classes
-        DISEASES = [
-            "Healthy",
-            "Leaf Blight",
-            "Brown Spot",
-            "Powdery Mildew",
-            "Rust"
-        ]
-        
-        # Random simulation for demonstration (skewed towards Healthy or randomness)
-        # In production: img = preprocess(image_path); prediction = disease_model.predict(img)
-        predicted_index = random.choices(
-            range(len(DISEASES)), 
-            weights=[0.4, 0.2, 0.2, 0.1, 0.1], 
-            k=1
-        )[0]
-        
-        disease_name = DISEASES[predicted_index]
-        confidence = round(random.uniform(0.75, 0.99), 2)
-
-        # ---------------------------------------------------------
-        # Output JSON
-        # ---------------------------------------------------------
-        output = {
-            "success": True,
-            "leaf_detection": {
-                "detected": has_leaf_or_plant,
-                "objects": len(detected_objects),
-                "model": "YOLOv8n"
-            },
-            "disease_analysis": {
-                "disease": disease_name,
-                "confidence": confidence,
-                "model": "MobileNetV3 (Simulated)"
-            }
-        }
-        
+        output = analyze_image(load_model(), args.image_path)
         print(json.dumps(output))
 
     except Exception as e:
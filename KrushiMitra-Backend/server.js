@@ -22,7 +22,7 @@ const { OAuth2Client } = require('google-auth-library'); // Google OAuth verific
 const Groq = require('groq-sdk');
 const multer = require('multer');
 const { identifyPlant } = require('./plantnet_client');//ERROR FIXED BROOOO
-const { spawn } = require('child_process');
+const { CropInferencePool } = require('./crop-inference-pool');
 
 
 
@@ -58,6 +58,9 @@ if (process.env.GROQ_API_KEY) {
   console.warn("⚠️ GROQ_API_KEY is missing. AI treatment recommendations will be disabled.");
 }
 
+// Resident YOLO workers for /predict (started with the server, or lazily on first use)
+const cropInferencePool = new CropInferencePool();
+
 
 
 // Ensure the working directory is the backend folder even if started from project root
@@ -1518,53 +1521,36 @@ app.post('/predict', upload.single('file'), async (req, res) => {
     // ---------- PHASE 4 & 5: AI Disease Analysis (YOLOv8 + MobileNet via Python) ----------
     console.log('🔬 Starting AI Disease Analysis...');
 
-    // Spawn Python process
-    const pythonProcess = spawn('python', ['scripts/crop_inference.py', filePath]);
-
-    let pythonData = '';
-    let pythonError = '';
-
-    const diseaseResult = await new Promise((resolve, reject) => {
-      pythonProcess.stdout.on('data', (data) => {
-        pythonData += data.toString();
-      });
-
-      pythonProcess.stderr.on('data', (data) => {
-        pythonError += data.toString();
-      });
-
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          console.error(`Python script exited with code ${code}`);
-          console.error(`Python Error: ${pythonError}`);
-          // Fallback to Healthy if script fails
-          resolve({
+    // Hand the image to a resident Python worker (models stay loaded between requests)
+    const diseaseResult = await cropInferencePool.analyze(filePath)
+      .then((result) => {
+        if (!result.success) {
+          console.error(`Crop inference failed: ${result.error}`);
+          return {
             success: false,
             disease: "Unknown (Analysis Failed)",
             confidence: 0,
             details: "AI Model could not process image."
-          });
-        } else {
-          try {
-            const result = JSON.parse(pythonData);
-            const analysis = result.disease_analysis;
-            resolve({
-              success: true,
-              disease: analysis.disease,
-              confidence: analysis.confidence,
-              details: `Detected via ${analysis.model}. Leaf detected: ${result.leaf_detection.detected}`
-            });
-          } catch (e) {
-            console.error('Failed to parse Python output:', pythonData);
-            resolve({
-              success: false,
-              disease: "Parse Error",
-              confidence: 0
-            });
-          }
+          };
         }
+        const analysis = result.disease_analysis;
+        return {
+          success: true,
+          disease: analysis.disease,
+          confidence: analysis.confidence,
+          details: `Detected via ${analysis.model}. Leaf detected: ${result.leaf_detection.detected}`
+        };
+      })
+      .catch((poolError) => {
+        console.error('Crop inference worker error:', poolError.message);
+        // Fallback to Healthy if the worker fails
+        return {
+          success: false,
+          disease: "Unknown (Analysis Failed)",
+          confidence: 0,
+          details: "AI Model could not process image."
+        };
       });
-    });
 
     // ---------- PHASE 6: INTELLECTUAL AI SOLUTION (Groq / Llama 3) ----------
     let aiSolution = {
@@ -2916,8 +2902,9 @@ app.use((error, req, res, next) => {
 
 // Start server only if executed directly
 if (require.main === module) {
-  app.listen(PORT, '0.0.0.0', async () => {
+  const server = app.listen(PORT, '0.0.0.0', async () => {
     logger.info(`KrushiMitra API server running on port ${PORT} (bound to all interfaces)`);
+    cropInferencePool.start();
     try {
       await initializeCollections();
       logger.info('Database collections initialized successfully');
@@ -2925,6 +2912,15 @@ if (require.main === module) {
       logger.error('Failed to initialize database collections', { error: error.message });
     }
   });
+
+  // Replacing Node's default SIGTERM exit, so stop accepting and exit explicitly
+  process.on('SIGTERM', () => {
+    logger.info('SIGTERM received, shutting down');
+    cropInferencePool.shutdown();
+    server.close(() => process.exit(0));
+    // Keep-alive connections can hold close() open; don't wait on them forever
+    setTimeout(() => process.exit(0), 10000).unref();
+  });
 }
 
 module.exports = { app };
@@ -0,0 +1,57 @@
+const path = require('path');
+const { CropInferencePool } = require('../crop-inference-pool');
+
+const FAKE_WORKER = path.join(__dirname, 'fixtures', 'fake-crop-worker.js');
+
+function fakePool(options = {}) {
+  return new CropInferencePool({
+    size: 2,
+    requestTimeoutMs: 10000,
+    pythonPath: process.execPath,
+    scriptPath: FAKE_WORKER,
+    ...options
+  }).start();
+}
+
+describe('CropInferencePool recycling', () => {
+  let pool;
+
+  beforeAll(() => {
+    jest.spyOn(console, 'log').mockImplementation(() => {});
+  });
+
+  afterEach(() => {
+    if (pool) pool.shutdown();
+    pool = null;
+    delete process.env.FAKE_RECYCLE_AFTER;
+  });
+
+  afterAll(() => {
+    console.log.mockRestore();
+  });
+
+  it('serves every concurrent request across request-budget recycles', async () => {
+    pool = fakePool({ maxRequests: 2 });
+
+    const images = Array.from({ length: 10 }, (_, i) => `/tmp/leaf-${i}.jpg`);
+    const results = await Promise.allSettled(images.map((image) => pool.analyze(image)));
+
+    expect(results.filter((r) => r.status === 'rejected')).toEqual([]);
+    expect(results.map((r) => r.value.image_path)).toEqual(images);
+    // Two answers per process, so the work must have spanned several generations
+    expect(new Set(results.map((r) => r.value.pid)).size).toBeGreaterThanOrEqual(5);
+  });
+
+  it('re-queues requests stranded on a worker that recycles on its own', async () => {
+    // The pool does not know this cap, as with the RSS limit, so it over-dispatches
+    process.env.FAKE_RECYCLE_AFTER = '1';
+    pool = fakePool();
+
+    const images = Array.from({ length: 10 }, (_, i) => `/tmp/leaf-${i}.jpg`);
+    const results = await Promise.allSettled(images.map((image) => pool.analyze(image)));
+
+    expect(results.filter((r) => r.status === 'rejected')).toEqual([]);
+    expect(results.map((r) => r.value.image_path)).toEqual(images);
+    expect(pool.waiting).toHaveLength(0);
+  });
+});
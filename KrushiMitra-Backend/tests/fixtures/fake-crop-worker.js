@@ -0,0 +1,40 @@
+// Stand-in for `crop_inference.py --worker`: same JSON-lines protocol, no model.
+// Recycles (exit code 3) after --max-requests answers, or after
+// FAKE_RECYCLE_AFTER answers to mimic the memory cap the pool cannot see.
+const readline = require('readline');
+
+const args = process.argv.slice(2);
+const flag = args.indexOf('--max-requests');
+const maxRequests = flag === -1 ? 0 : parseInt(args[flag + 1], 10);
+const memoryCapAfter = parseInt(process.env.FAKE_RECYCLE_AFTER || '0', 10);
+const delayMs = parseInt(process.env.FAKE_DELAY_MS || '20', 10);
+
+const send = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+const queue = [];
+let busy = false;
+let served = 0;
+
+function next() {
+  if (busy || queue.length === 0) return;
+  busy = true;
+  const request = queue.shift();
+  setTimeout(() => {
+    send({ id: request.id, success: true, pid: process.pid, image_path: request.image_path });
+    served++;
+    busy = false;
+    if ((maxRequests && served >= maxRequests) || (memoryCapAfter && served >= memoryCapAfter)) {
+      // Lines still queued here were never answered, like unread stdin in the real worker
+      send({ recycling: true });
+      process.exit(3);
+    }
+    next();
+  }, delayMs);
+}
+
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+  if (!line.trim()) return;
+  queue.push(JSON.parse(line));
+  next();
+});
+
+send({ ready: true, pid: process.pid });
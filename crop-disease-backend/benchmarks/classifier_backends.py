@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Classifier backend benchmark: Keras vs ONNX Runtime vs INT8 TFLite
+
+Each backend runs in a fresh subprocess so peak RSS reflects that runtime
+alone. All backends see the same fixed input set (the fixture images plus
+seeded synthetic crops) and their top-1 predictions are compared with Keras.
+
+Usage:
+    python benchmarks/classifier_backends.py [--backends keras onnx tflite] [--repeat 20] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = [os.path.join(ROOT, "test_plant.jpg"), os.path.join(ROOT, "images2.png")]
+BATCH_SIZES = (1, 8)
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _inputs(count: int = 16):
+    """Fixed classifier inputs: fixture images, then seeded synthetic crops"""
+    import cv2
+    import numpy as np
+    from src.inference.preprocessing import preprocess_crops
+
+    images = [cv2.imread(path) for path in FIXTURES if os.path.exists(path)]
+    rng = np.random.default_rng(0)
+    while len(images) < count:
+        small = rng.integers(0, 255, (32, 32, 3), dtype=np.uint8)
+        images.append(cv2.resize(small, (320, 240), interpolation=cv2.INTER_LINEAR))
+    return preprocess_crops(images, [None] * len(images))
+
+def _build_model():
+    """Same architecture as ModelManager, with seeded weights so every process agrees"""
+    import tensorflow as tf
+    from tensorflow.keras.applications import MobileNetV3Small
+    from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+
+    tf.keras.utils.set_random_seed(0)
+    base_model = MobileNetV3Small(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
+    x = GlobalAveragePooling2D()(base_model.output)
+    x = Dense(128, activation='relu')(x)
+    return Model(inputs=base_model.input, outputs=Dense(38, activation='softmax')(x))
+
+def _measure(backend_name: str, repeat: int, cache_dir: str) -> dict:
+    """Runs inside the child process"""
+    sys.path.insert(0, ROOT)
+    import numpy as np
+    from src.models.backends import create_classifier_backend
+
+    inputs = _inputs()
+    keras_model = _build_model()
+    baseline_mb = _peak_rss_mb()
+
+    start = time.perf_counter()
+    backend = create_classifier_backend(backend_name, keras_model, cache_dir=cache_dir,
+                                        representative_data=lambda: ([inputs[i:i + 1]] for i in range(len(inputs))))
+    setup_ms = (time.perf_counter() - start) * 1000
+    if backend_name != 'keras':
+        # Only the exported runtime should count towards this backend's memory
+        del keras_model
+
+    latency = {}
+    for batch_size in BATCH_SIZES:
+        batch = np.ascontiguousarray(inputs[:batch_size])
+        backend.predict(batch)  # warmup
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            backend.predict(batch)
+            timings.append((time.perf_counter() - start) * 1000 / batch_size)
+        latency[f"batch_{batch_size}_ms_per_image"] = round(statistics.median(timings), 3)
+
+    probabilities = np.concatenate([backend.predict(inputs[i:i + 8]) for i in range(0, len(inputs), 8)])
+    return {
+        "setup_ms": round(setup_ms, 1),
+        **latency,
+        "peak_mb": round(_peak_rss_mb() - baseline_mb, 1),
+        "probabilities": probabilities.tolist()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare classifier runtime backends")
+    parser.add_argument("--backends", nargs="+", default=["keras", "onnx", "tflite"])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--cache-dir", default=os.path.join(ROOT, "models"))
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--child", metavar="BACKEND", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_measure(args.child, args.repeat, args.cache_dir)))
+        return
+
+    sys.path.insert(0, ROOT)
+    import numpy as np
+    from src.models.backends import top1_agreement
+
+    backends = ["keras"] + [name for name in args.backends if name != "keras"]
+    results = []
+    reference = None
+    print(f"{'backend':<8} {'b=1 ms/img':>11} {'b=8 ms/img':>11} {'peak MB':>8} {'top-1 vs keras':>15}")
+    for name in backends:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", name, "--repeat", str(args.repeat), "--cache-dir", args.cache_dir],
+            capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            error = output.stderr.strip().splitlines()[-1] if output.stderr.strip() else "failed"
+            results.append({"backend": name, "error": error})
+            print(f"{name:<8} {error}")
+            continue
+
+        result = {"backend": name, **json.loads(output.stdout.strip().splitlines()[-1])}
+        probabilities = np.asarray(result.pop("probabilities"))
+        if reference is None:
+            reference = probabilities
+        result["top1_agreement"] = round(top1_agreement(reference, probabilities), 4)
+        results.append(result)
+        print(f"{name:<8} {result['batch_1_ms_per_image']:>11} {result['batch_8_ms_per_image']:>11} "
+              f"{result['peak_mb']:>8} {result['top1_agreement']:>15}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Decode-stage benchmark: full-resolution decode vs JPEG scale-on-decode
+
+Each (image, mode) pair runs in a fresh subprocess so peak RSS is not
+polluted by earlier runs. Reports median decode time and the peak memory
+the decode added on top of the already-loaded upload bytes.
+
+Usage:
+    python benchmarks/decode_benchmark.py [--repeat 10] [--json results.json] [images...]
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGES = [os.path.join(ROOT, "test_plant.jpg"), os.path.join(ROOT, "images2.png")]
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _measure(path: str, mode: str, repeat: int) -> dict:
+    """Runs inside the child process"""
+    sys.path.insert(0, ROOT)
+    from src.utils.validators import ImageValidator
+
+    with open(path, "rb") as f:
+        data = f.read()
+    validator = ImageValidator()
+    if mode == "full":
+        validator.decode_target_size = 0
+
+    baseline_mb = _peak_rss_mb()
+    timings = []
+    shape = None
+    for _ in range(repeat):
+        ok, error, image = validator._decode_image_content(data)
+        if not ok:
+            return {"error": error}
+        timings.append(image.decode_ms)
+        shape = image.array.shape
+        del image
+
+    return {
+        "decode_ms": round(statistics.median(timings), 2),
+        "peak_mb": round(_peak_rss_mb() - baseline_mb, 1),
+        "decoded_shape": list(shape)
+    }
+
+def _synthetic_photo(directory: str) -> str:
+    """A 4000x3000 JPEG roughly like a 12 MP phone photo"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (300, 400, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((4000, 3000), Image.BILINEAR)
+    path = os.path.join(directory, "synthetic_4000x3000.jpg")
+    image.save(path, quality=90)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full and reduced-resolution decoding")
+    parser.add_argument("images", nargs="*", help="Images to decode (default: fixtures + synthetic photo)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_measure(args.child[0], args.child[1], args.repeat)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = args.images or DEFAULT_IMAGES + [_synthetic_photo(tmp)]
+        results = []
+        print(f"{'image':<28} {'mode':<8} {'decoded':>14} {'decode ms':>10} {'peak MB':>8}")
+        for path in images:
+            for mode in ("full", "reduced"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", path, mode, "--repeat", str(args.repeat)],
+                    capture_output=True, text=True, check=True
+                )
+                result = {"image": os.path.basename(path), "mode": mode, **json.loads(output.stdout)}
+                results.append(result)
+                if "error" in result:
+                    print(f"{result['image']:<28} {mode:<8} {result['error']}")
+                    continue
+                decoded = "x".join(str(d) for d in result["decoded_shape"][:2])
+                print(f"{result['image']:<28} {mode:<8} {decoded:>14} {result['decode_ms']:>10} {result['peak_mb']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Load generator for the inference API
+
+Replays an image corpus against /predict either at a fixed arrival rate
+(open loop) or at a fixed number of concurrent clients (closed loop).
+
+In rate mode requests are scheduled at fixed times whatever the server is
+doing, and latency is measured from the scheduled time, not from when a
+client thread got round to sending. A stalled server therefore shows up as
+high latency for every request it delayed instead of as fewer requests
+(coordinated omission).
+
+Without --url the app is started locally (uvicorn on a free port, prediction
+cache off) and its CPU and RSS, including engine worker processes, are
+sampled with psutil. No external services are needed.
+
+Usage:
+    python benchmarks/load_test.py --rate 20 --duration 60 [--json results.json]
+    python benchmarks/load_test.py --concurrency 8 --duration 60 [--url http://localhost:8000] [images...]
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGES = [os.path.join(ROOT, "test_plant.jpg"), os.path.join(ROOT, "images2.png")]
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+def _load_corpus(paths: List[str]) -> List[tuple]:
+    """(filename, bytes, content type) for every image file or image in a directory"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in IMAGE_PATTERNS:
+                files.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            files.append(path)
+
+    corpus = []
+    for path in files:
+        with open(path, "rb") as f:
+            content_type = "image/png" if path.lower().endswith(".png") else "image/jpeg"
+            corpus.append((os.path.basename(path), f.read(), content_type))
+    if not corpus:
+        raise SystemExit("No images found")
+    return corpus
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    # Nearest rank
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index], 2)
+
+class LocalServer:
+    """The app under uvicorn in a child process"""
+
+    def __init__(self, env: dict, startup_timeout: float):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.startup_timeout = startup_timeout
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=ROOT, env={**os.environ, **env}
+        )
+
+    def wait_ready(self):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"Server exited with code {self.process.returncode}")
+            try:
+                if requests.get(f"{self.url}/ready", timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise SystemExit(f"Server not ready after {self.startup_timeout}s")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+class ResourceSampler:
+    """Samples CPU and RSS of a process tree in the background"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        import psutil
+        self._psutil = psutil
+        self.root = psutil.Process(pid)
+        self.interval = interval
+        self.cpu_samples: List[float] = []
+        self.rss_samples: List[float] = []
+        self._processes = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _tree(self):
+        processes = [self.root] + self.root.children(recursive=True)
+        for process in processes:
+            # cpu_percent needs the same Process object between calls
+            self._processes.setdefault(process.pid, process)
+        return [self._processes[process.pid] for process in processes]
+
+    def _sample(self, record: bool):
+        cpu = rss = 0.0
+        for process in self._tree():
+            try:
+                cpu += process.cpu_percent(interval=None)
+                rss += process.memory_info().rss
+            except self._psutil.Error:
+                continue
+        if record:
+            self.cpu_samples.append(cpu)
+            self.rss_samples.append(rss / (1024 * 1024))
+
+    def _run(self):
+        self._sample(record=False)
+        while not self._stop.wait(self.interval):
+            self._sample(record=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        return {
+            "cpu_percent_avg": round(sum(self.cpu_samples) / len(self.cpu_samples), 1) if self.cpu_samples else None,
+            "cpu_percent_max": round(max(self.cpu_samples), 1) if self.cpu_samples else None,
+            "rss_mb_max": round(max(self.rss_samples), 1) if self.rss_samples else None,
+            "processes": len(self._processes)
+        }
+
+class LoadGenerator:
+    """Sends requests and records (scheduled start, latency, outcome)"""
+
+    def __init__(self, url: str, corpus: List[tuple], timeout: float):
+        self.url = url
+        self.corpus = corpus
+        self.timeout = timeout
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, index: int, scheduled: float):
+        """One request; latency counts from ``scheduled`` (a perf_counter reading)"""
+        filename, data, content_type = self.corpus[index % len(self.corpus)]
+        try:
+            response = self._session().post(self.url, files={"file": (filename, data, content_type)},
+                                            timeout=self.timeout)
+            outcome = str(response.status_code)
+        except requests.RequestException as e:
+            outcome = type(e).__name__
+        latency_ms = (time.perf_counter() - scheduled) * 1000
+        with self._lock:
+            self.records.append((scheduled, latency_ms, outcome))
+
+    def run_rate(self, rate: float, duration: float, max_in_flight: int):
+        """Open loop: request i is due at start + i / rate, whether or not earlier ones finished"""
+        start = time.perf_counter()
+        total = int(rate * duration)
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            for index in range(total):
+                scheduled = start + index / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # Requests waiting for a free client thread keep their scheduled time
+                pool.submit(self.send, index, scheduled)
+        return start
+
+    def run_concurrency(self, concurrency: int, duration: float):
+        """Closed loop: each client sends its next request when the previous one returns"""
+        start = time.perf_counter()
+        deadline = start + duration
+        counter = iter(range(sys.maxsize))
+        counter_lock = threading.Lock()
+
+        def client():
+            while time.perf_counter() < deadline:
+                with counter_lock:
+                    index = next(counter)
+                self.send(index, time.perf_counter())
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return start
+
+def summarize(records: List[tuple], measure_from: float) -> dict:
+    """Latency percentiles, throughput and errors of requests scheduled after warmup"""
+    measured = [record for record in records if record[0] >= measure_from]
+    if not measured:
+        return {"requests": 0}
+    latencies = sorted(latency for _, latency, _ in measured)
+    outcomes = {}
+    for _, _, outcome in measured:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    errors = sum(count for outcome, count in outcomes.items() if outcome != "200")
+    first = min(scheduled for scheduled, _, _ in measured)
+    last = max(scheduled + latency / 1000 for scheduled, latency, _ in measured)
+    return {
+        "requests": len(measured),
+        "throughput_rps": round((len(measured) - errors) / (last - first), 2) if last > first else None,
+        "error_rate": round(errors / len(measured), 4),
+        "outcomes": outcomes,
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p99": _percentile(latencies, 99),
+            "max": round(latencies[-1], 2),
+            "mean": round(sum(latencies) / len(latencies), 2)
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Open- or closed-loop load test of /predict")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--rate", type=float, help="Fixed arrival rate in requests/s (open loop)")
+    mode.add_argument("--concurrency", type=int, help="Fixed number of concurrent clients (closed loop)")
+    parser.add_argument("images", nargs="*", default=DEFAULT_IMAGES, help="Image files or directories")
+    parser.add_argument("--url", help="Base URL of a running service (default: start the app locally)")
+    parser.add_argument("--server-pid", type=int, help="Sample CPU/RSS of this process tree when using --url")
+    parser.add_argument("--endpoint", default="/predict")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load, warmup included")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Leading seconds excluded from the results")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Client threads in rate mode")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache on in the local app")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the local app, e.g. --env INFERENCE_PROCESSES=2")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--label", help="Free-form name stored with the results")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    corpus = _load_corpus(args.images)
+    server = None
+    if args.url is None:
+        env = {"PREDICTION_CACHE_SIZE": "1024" if args.cache else "0"}
+        env.update(item.split("=", 1) for item in args.env)
+        server = LocalServer(env, args.startup_timeout)
+        print(f"Starting local server on {server.url}...")
+        server.wait_ready()
+    base_url = args.url.rstrip("/") if args.url else server.url
+
+    sampler = None
+    pid = server.process.pid if server is not None else args.server_pid
+    if pid is not None:
+        try:
+            sampler = ResourceSampler(pid)
+            sampler.start()
+        except ImportError:
+            print("psutil not installed; server CPU/RSS not sampled", file=sys.stderr)
+
+    generator = LoadGenerator(base_url + args.endpoint, corpus, args.timeout)
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    try:
+        if args.rate:
+            start = generator.run_rate(args.rate, args.duration, args.max_in_flight)
+        else:
+            start = generator.run_concurrency(args.concurrency, args.duration)
+    finally:
+        server_stats = sampler.stop() if sampler is not None else None
+        if server is not None:
+            server.stop()
+
+    results = summarize(generator.records, start + args.warmup)
+    output = {
+        "label": args.label,
+        "started_at": started_at,
+        "config": {
+            "mode": "rate" if args.rate else "concurrency",
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "endpoint": args.endpoint,
+            "url": args.url or "local",
+            "images": len(corpus),
+            "env": args.env
+        },
+        "results": results,
+        "server": server_stats
+    }
+
+    latency = results.get("latency_ms", {})
+    print(f"requests {results['requests']}  throughput {results.get('throughput_rps')} rps  "
+          f"errors {results.get('error_rate')}")
+    print(f"latency ms  p50 {latency.get('p50')}  p90 {latency.get('p90')}  "
+          f"p99 {latency.get('p99')}  max {latency.get('max')}")
+    if server_stats:
+        print(f"server  cpu avg {server_stats['cpu_percent_avg']}%  max {server_stats['cpu_percent_max']}%  "
+              f"rss max {server_stats['rss_mb_max']} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(output, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Stage microbenchmarks with stored baselines
+
+Times individual pipeline stages in isolation (no HTTP, no batching, no
+event loop) on the fixture images and a seeded synthetic image, each
+resized to several resolutions, at several batch sizes:
+
+    validate          ImageValidator.validate_bytes (header checks + decode)
+    crop              DiseaseDetectionPipeline._crop_detection_region
+    crop_batch        DiseaseDetectionPipeline._crop_batch
+    detect_input      letterbox_batch, the exported detectors' input preparation
+    detect_output     postprocess_yolo on a synthetic raw YOLOv8 output
+    detect_parse      DiseaseDetectionPipeline._parse_detections
+    detect            DiseaseDetectionPipeline._run_detector (only with --models)
+    severity          ModelManager.estimate_severity
+
+Each case is timed with timeit (auto-ranged loop count, median of
+--repeat runs). Results are saved as a JSON baseline in --baseline-dir and
+compared with the most recent earlier baseline; cases whose median and best
+run both got slower by more than --threshold are flagged and the exit
+status is 1.
+
+Usage:
+    python benchmarks/stage_benchmark.py [--stages validate crop] [--threshold 0.1] [--no-save]
+    python benchmarks/stage_benchmark.py --compare benchmarks/baselines/stages-20240101-120000.json
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.inference.pipeline import DiseaseDetectionPipeline  # noqa: E402
+from src.models.detectors import Detections, letterbox_batch, postprocess_yolo  # noqa: E402
+from src.models.model_manager import ModelManager  # noqa: E402
+from src.utils.validators import ImageValidator  # noqa: E402
+
+FIXTURES = [os.path.join(ROOT, "test_plant.jpg"), os.path.join(ROOT, "images2.png")]
+DEFAULT_RESOLUTIONS = ("320x240", "640x480", "1280x960", "2048x1536")
+DEFAULT_BATCH_SIZES = (1, 4, 8)
+STAGES = ("validate", "crop", "crop_batch", "detect_input", "detect_output", "detect_parse", "detect", "severity")
+DETECTOR_SIZE = 640
+DETECTOR_CLASSES = 80
+# Post-NMS boxes per image handed to _parse_detections
+PARSE_BOXES = 20
+
+def _synthetic_image(width: int, height: int) -> np.ndarray:
+    """Seeded, JPEG-realistic content: smooth gradients plus noise"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    noise = rng.normal(0, 12, (height, width, 3))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+def _sources(resolutions: List[Tuple[int, int]]) -> Dict[str, Dict[Tuple[int, int], Tuple[np.ndarray, bytes, str]]]:
+    """{source name: {(width, height): (pixels, encoded bytes, extension)}}"""
+    originals = {}
+    for path in FIXTURES:
+        image = cv2.imread(path)
+        if image is not None:
+            originals[os.path.splitext(os.path.basename(path))[0]] = (image, os.path.splitext(path)[1].lower())
+
+    sources = {}
+    for name, (image, extension) in originals.items():
+        sources[name] = {}
+        for width, height in resolutions:
+            resized = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            sources[name][(width, height)] = (resized, cv2.imencode(extension, resized)[1].tobytes(), extension)
+    sources["synthetic"] = {}
+    for width, height in resolutions:
+        image = _synthetic_image(width, height)
+        sources["synthetic"][(width, height)] = (image, cv2.imencode(".jpg", image)[1].tobytes(), ".jpg")
+    return sources
+
+def _center_bbox(image: np.ndarray) -> Dict[str, int]:
+    height, width = image.shape[:2]
+    return {"x1": int(width * 0.1), "y1": int(height * 0.1), "x2": int(width * 0.9), "y2": int(height * 0.9),
+            "width": int(width * 0.8), "height": int(height * 0.8)}
+
+def _synthetic_detections(image: np.ndarray, count: int, rng: np.random.Generator) -> Detections:
+    height, width = image.shape[:2]
+    corners = rng.uniform(0, 1, (count, 2)) * (width * 0.5, height * 0.5)
+    sizes = rng.uniform(0.1, 0.5, (count, 2)) * (width, height)
+    boxes = np.concatenate([corners, corners + sizes], axis=1).astype(np.float32)
+    return Detections(boxes, rng.uniform(0.1, 1.0, count).astype(np.float32),
+                      rng.integers(0, DETECTOR_CLASSES, count).astype(np.int64))
+
+def _synthetic_yolo_output(batch_size: int, rng: np.random.Generator) -> np.ndarray:
+    """Raw (N, 4 + classes, anchors) output with a realistic share of confident anchors"""
+    anchors = (DETECTOR_SIZE // 8) ** 2 + (DETECTOR_SIZE // 16) ** 2 + (DETECTOR_SIZE // 32) ** 2
+    output = np.empty((batch_size, 4 + DETECTOR_CLASSES, anchors), dtype=np.float32)
+    output[:, 0:2] = rng.uniform(0, DETECTOR_SIZE, (batch_size, 2, anchors))
+    output[:, 2:4] = rng.uniform(8, DETECTOR_SIZE / 4, (batch_size, 2, anchors))
+    output[:, 4:] = rng.uniform(0, 0.05, (batch_size, DETECTOR_CLASSES, anchors))
+    hot = rng.choice(anchors, size=(batch_size, 60))
+    for index in range(batch_size):
+        output[index, 4 + rng.integers(0, DETECTOR_CLASSES, 60), hot[index]] = rng.uniform(0.3, 0.95, 60)
+    return output
+
+def _cases(stages: List[str], resolutions: List[Tuple[int, int]], batch_sizes: List[int],
+           with_models: bool) -> List[Tuple[str, str, Callable]]:
+    """(stage, case, zero-argument callable) for every selected stage"""
+    model_manager = ModelManager()
+    if with_models:
+        model_manager.load_models()
+    pipeline = DiseaseDetectionPipeline(model_manager)
+    validator = ImageValidator()
+    sources = _sources(resolutions)
+    rng = np.random.default_rng(0)
+    cases = []
+
+    def add(stage: str, case: str, func: Callable):
+        if stage in stages:
+            cases.append((stage, case, func))
+
+    for name, by_resolution in sources.items():
+        for (width, height), (image, data, extension) in by_resolution.items():
+            resolution = f"{width}x{height}"
+            filename = f"{name}{extension}"
+            content_type = "image/png" if extension == ".png" else "image/jpeg"
+            add("validate", f"{name}@{resolution}",
+                lambda filename=filename, data=data, content_type=content_type:
+                validator.validate_bytes(filename, data, content_type))
+            add("crop", f"{name}@{resolution}",
+                lambda image=image, bbox=_center_bbox(image): pipeline._crop_detection_region(image, bbox))
+
+    for width, height in resolutions:
+        resolution = f"{width}x{height}"
+        for batch_size in batch_sizes:
+            images = [sources["synthetic"][(width, height)][0]] * batch_size
+            detections = [pipeline._fallback_detection(image) for image in images]
+            parsed = [_synthetic_detections(image, PARSE_BOXES, rng) for image in images]
+            case = f"b{batch_size}@{resolution}"
+            add("crop_batch", case,
+                lambda images=images, detections=detections: pipeline._crop_batch(images, detections))
+            add("detect_input", case, lambda images=images: letterbox_batch(images, DETECTOR_SIZE))
+            add("detect_parse", case,
+                lambda images=images, parsed=parsed:
+                [pipeline._parse_detections(result, image, {}) for result, image in zip(parsed, images)])
+            if with_models:
+                add("detect", case, lambda images=images: pipeline._run_detector(images))
+
+    for batch_size in batch_sizes:
+        images = [np.zeros((480, 640, 3), dtype=np.uint8)] * batch_size
+        _, transforms = letterbox_batch(images, DETECTOR_SIZE)
+        shapes = [image.shape[:2] for image in images]
+        output = _synthetic_yolo_output(batch_size, rng)
+        add("detect_output", f"b{batch_size}",
+            lambda output=output, transforms=transforms, shapes=shapes:
+            postprocess_yolo(output, transforms, shapes, 0.25, 0.45))
+
+    grid = [(confidence, ratio) for confidence in np.linspace(0, 1, 10).tolist()
+            for ratio in np.linspace(0, 1, 10).tolist()]
+    add("severity", "grid100",
+        lambda: [model_manager.estimate_severity(confidence, ratio) for confidence, ratio in grid])
+    return cases
+
+def _time(func: Callable, repeat: int) -> Dict[str, float]:
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    per_call_us = [elapsed / loops * 1e6 for elapsed in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "median_us": round(statistics.median(per_call_us), 3),
+        "min_us": round(min(per_call_us), 3),
+        "stdev_us": round(statistics.stdev(per_call_us), 3) if len(per_call_us) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat
+    }
+
+def _environment(with_models: bool) -> Dict[str, object]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "models": with_models
+    }
+
+def _latest_baseline(directory: str) -> Optional[str]:
+    # Timestamped names sort chronologically
+    baselines = sorted(glob.glob(os.path.join(directory, "stages-*.json")))
+    return baselines[-1] if baselines else None
+
+def compare(previous: dict, current: dict, threshold: float) -> List[str]:
+    """Print per-case ratios against ``previous``; return keys that regressed beyond ``threshold``"""
+    for field in ("platform", "cpu_count", "models"):
+        if previous["environment"].get(field) != current["environment"].get(field):
+            print(f"warning: baseline {field} differs ({previous['environment'].get(field)} vs "
+                  f"{current['environment'].get(field)}); timings may not be comparable")
+
+    regressions = []
+    print(f"\n{'case':<40} {'baseline us':>12} {'current us':>12} {'ratio':>7}")
+    for key, result in current["results"].items():
+        before = previous["results"].get(key)
+        if before is None or not before["median_us"]:
+            print(f"{key:<40} {'-':>12} {result['median_us']:>12} {'new':>7}")
+            continue
+        ratio = result["median_us"] / before["median_us"]
+        # The best run must agree, so one noisy repeat does not fail the comparison
+        best_ratio = result["min_us"] / before["min_us"] if before["min_us"] else ratio
+        flag = ""
+        if ratio > 1 + threshold and best_ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{key:<40} {before['median_us']:>12} {result['median_us']:>12} {ratio:>7.2f}{flag}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages and compare with a stored baseline")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--resolutions", nargs="+", default=list(DEFAULT_RESOLUTIONS), help="WIDTHxHEIGHT")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (median is reported)")
+    parser.add_argument("--models", action="store_true", help="Load the real models and include the detect stage")
+    parser.add_argument("--baseline-dir", default=os.path.join(ROOT, "benchmarks", "baselines"))
+    parser.add_argument("--compare", help="Baseline file to compare with (default: latest in --baseline-dir)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown flagged as regression")
+    parser.add_argument("--no-save", action="store_true", help="Do not store this run as a new baseline")
+    args = parser.parse_args()
+
+    resolutions = [tuple(int(value) for value in resolution.lower().split("x")) for resolution in args.resolutions]
+    cases = _cases(args.stages, resolutions, args.batch_sizes, args.models)
+
+    current = {"environment": _environment(args.models), "results": {}}
+    print(f"{'case':<40} {'median us':>12} {'min us':>12} {'loops':>7}")
+    for stage, case, func in cases:
+        key = f"{stage}[{case}]"
+        result = _time(func, args.repeat)
+        current["results"][key] = result
+        print(f"{key:<40} {result['median_us']:>12} {result['min_us']:>12} {result['loops']:>7}")
+
+    previous_path = args.compare or _latest_baseline(args.baseline_dir)
+    regressions = []
+    if previous_path:
+        with open(previous_path) as f:
+            previous = json.load(f)
+        print(f"\nCompared with {previous_path} (threshold {args.threshold:.0%})")
+        regressions = compare(previous, current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+
+    if not args.no_save:
+        os.makedirs(args.baseline_dir, exist_ok=True)
+        path = os.path.join(args.baseline_dir,
+                            f"stages-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nSaved baseline {path}")
+
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,20 +3,46 @@ Crop Disease Detection API
 Hybrid two-stage AI pipeline using YOLOv8 + MobileNetV3
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import time
+
+# Start of app import, for the startup timing report
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import Depends, FastAPI, File, Header, Request, UploadFile, HTTPException
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 import uvicorn
+import asyncio
+import json
 import logging
 import os
+import zipfile
 
 from src.models.model_manager import ModelManager
+from src.models.registry import ModelRegistry, ModelRegistryError
 from src.inference.pipeline import DiseaseDetectionPipeline
-from src.utils.validators import ImageValidator
+from src.inference.engine import InferenceEngine, InferenceEngineError
+from src.inference.admission import OverloadedError
+from src.inference.cache import PredictionCache, content_key, dhash
+from src.utils.validators import ImageValidator, StreamingUpload, UploadRejected, ValidatedImage
+from src.utils.upload import read_image_upload
 from src.utils.logger import setup_logger
 from src.utils.cpu_optimizer import cpu_engine
+from src.utils.metrics import (
+    ADMISSION_OVERLOADED, CACHE_HIT_RATIO, CACHE_LOOKUPS, CACHE_STORE_ERRORS, CPU_CORE_PERCENT, DECODE_SECONDS,
+    MEMORY_AVAILABLE_BYTES, PROCESS_CPU_PERCENT, PROCESS_RSS_BYTES, PROCESS_THREADS, PROMETHEUS_CONTENT_TYPE,
+    QUEUE_DELAY_SECONDS, REQUESTS_QUEUED, REQUESTS_SHED, SERIALIZATION_SECONDS, SYSTEM_CPU_PERCENT, WORKERS_RSS_BYTES,
+    MetricsMiddleware, render_metrics
+)
+from src.utils.resources import resource_sampler
+from src.utils.prefork import FORK_SAFE_BACKENDS, PreforkServer
+from src.utils.profiler import ProfilerBusyError, profiler
+from src.utils.tracing import TracingMiddleware, exporter as trace_exporter, run_in_executor, span
+
+_IMPORT_FINISHED = time.perf_counter()
 
 # Setup logging
 logger = setup_logger(__name__)
@@ -38,10 +64,50 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # Global model manager
 model_manager: Optional[ModelManager] = None
 pipeline: Optional[DiseaseDetectionPipeline] = None
+inference_engine: Optional[InferenceEngine] = None
+prediction_cache = PredictionCache()
+
+# Startup phases and their durations (ms); served by /ready
+startup_report: Dict[str, Any] = {
+    "phase": "starting",
+    "import_ms": round((_IMPORT_FINISHED - _IMPORT_STARTED) * 1000, 1)
+}
+model_load_task: Optional[asyncio.Task] = None
+
+# Uvicorn processes serving the app; >1 forks pre-fork workers (see __main__)
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '1'))
+
+# Gauges read from existing counters whenever /metrics is scraped
+REQUESTS_QUEUED.set_function(lambda: pipeline.batcher.depth if pipeline is not None else 0)
+# Before the pipeline exists these raise, which leaves them out of the scrape
+REQUESTS_SHED.set_function(lambda: pipeline.batcher.admission.shed_queue_full, reason="queue_full")
+REQUESTS_SHED.set_function(lambda: pipeline.batcher.admission.shed_delay, reason="queue_delay")
+ADMISSION_OVERLOADED.set_function(lambda: int(pipeline.batcher.admission.overloaded))
+QUEUE_DELAY_SECONDS.set_function(lambda: pipeline.batcher.admission.last_delay_ms / 1000)
+CACHE_LOOKUPS.set_function(lambda: prediction_cache.hits, result="hit")
+CACHE_LOOKUPS.set_function(lambda: prediction_cache.near_hits, result="near_hit")
+CACHE_LOOKUPS.set_function(lambda: prediction_cache.disk_hits, result="disk_hit")
+CACHE_LOOKUPS.set_function(lambda: prediction_cache.misses, result="miss")
+CACHE_HIT_RATIO.set_function(lambda: prediction_cache.get_stats()["hit_ratio"])
+
+def _sampled(field: str) -> Callable[[], float]:
+    # No sample yet raises AttributeError, which leaves the gauge out of the scrape
+    return lambda: getattr(resource_sampler.latest(), field)
+
+SYSTEM_CPU_PERCENT.set_function(_sampled("cpu_percent"))
+PROCESS_CPU_PERCENT.set_function(_sampled("process_cpu_percent"))
+PROCESS_RSS_BYTES.set_function(_sampled("rss_bytes"))
+WORKERS_RSS_BYTES.set_function(_sampled("children_rss_bytes"))
+MEMORY_AVAILABLE_BYTES.set_function(_sampled("memory_available_bytes"))
+PROCESS_THREADS.set_function(_sampled("threads"))
+for _core in range(os.cpu_count() or 1):
+    CPU_CORE_PERCENT.set_function(lambda core=_core: resource_sampler.latest().per_cpu_percent[core], core=_core)
 
 class PredictionResponse(BaseModel):
     """Standard response format for predictions"""
@@ -54,35 +120,140 @@ class PredictionResponse(BaseModel):
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize models on startup"""
-    global model_manager, pipeline
+    """Open the port right away; models load in the background"""
+    global model_manager, pipeline, inference_engine, model_load_task
     
     try:
         logger.info("Starting crop disease detection service...")
         
-        # Initialize CPU optimization
-        cpu_engine.create_thread_pool(max_workers=2)
+        # Initialize CPU optimization; blocking inference stages run on these pools
+        cpu_engine.create_thread_pool(max_workers=int(os.environ.get('INFERENCE_THREADS', '2')))
+        
+        # Background CPU / memory sampling for /system and /metrics
+        resource_sampler.start()
         
         # Log system information
         system_info = cpu_engine.get_system_info()
         logger.info(f"System info: {system_info}")
         
-        # Initialize model manager
-        model_manager = ModelManager()
-        await model_manager.initialize_models()
+        # Initialize model manager, unless a pre-fork master already loaded it
+        if model_manager is None:
+            model_manager = ModelManager()
         
-        # Warm up models
-        cpu_engine.warmup_models(model_manager)
+        if model_manager.is_ready():
+            # Forked worker: weights are shared with the master; only warm up,
+            # before accepting, so a restarted worker never serves cold
+            model_load_task = asyncio.create_task(_load_models())
+            await model_load_task
+        elif int(os.environ.get('INFERENCE_PROCESSES', '0')) > 0:
+            # Model-holding worker processes load their own copies; this
+            # process only decodes uploads and routes them
+            inference_engine = InferenceEngine()
+            inference_engine.start()
+            startup_report["phase"] = "workers_starting"
+        else:
+            model_load_task = asyncio.create_task(_load_models())
         
         # Initialize pipeline
-        pipeline = DiseaseDetectionPipeline(model_manager)
+        pipeline = DiseaseDetectionPipeline(
+            model_manager,
+            executor=cpu_engine.thread_pool,
+            decode_executor=cpu_engine.get_decode_executor(),
+            engine=inference_engine
+        )
         
-        logger.info("Crop disease detection service initialized successfully!")
+        startup_report["listening_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+        logger.info(f"Crop disease detection service listening after {startup_report['listening_ms']} ms")
         
     except Exception as e:
         logger.error(f"Failed to initialize service: {str(e)}")
         raise
 
+async def _load_models():
+    """Import frameworks, load models and warm up, timing each phase"""
+    loop = asyncio.get_running_loop()
+    
+    def timed_phase(phase: str):
+        startup_report["phase"] = phase
+        return time.perf_counter()
+    
+    try:
+        if not model_manager.is_ready():
+            started = timed_phase("importing_frameworks")
+            await loop.run_in_executor(None, cpu_engine.configure_frameworks)
+            startup_report["framework_import_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            
+            started = timed_phase("loading_models")
+            await loop.run_in_executor(None, model_manager.load_models)
+            startup_report["model_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        timed_phase("warming_up")
+        warmup = await loop.run_in_executor(cpu_engine.thread_pool, cpu_engine.warmup_models, model_manager)
+        startup_report["warmup_ms"] = warmup["total_ms"]
+        if not warmup["completed"]:
+            # Models still serve, but /ready keeps the instance out of rotation
+            startup_report["phase"] = "warmup_failed"
+            logger.error(f"Model warmup failed in {warmup['failed_stages']}: {warmup['error']}")
+            return
+        
+        startup_report["phase"] = "ready"
+        startup_report["total_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+        logger.info(f"Models ready after {startup_report['total_ms']} ms: {startup_report}")
+    except Exception as e:
+        startup_report["phase"] = "failed"
+        startup_report["error"] = str(e)
+        logger.error(f"Model loading failed: {str(e)}")
+
+def preload_models(import_frameworks: bool = True):
+    """Load models in the pre-fork master, before workers are forked"""
+    global model_manager
+    
+    if import_frameworks:
+        started = time.perf_counter()
+        cpu_engine.configure_frameworks()
+        startup_report["framework_import_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    started = time.perf_counter()
+    model_manager = ModelManager()
+    if not model_manager.load_models():
+        raise RuntimeError("Model loading failed in the pre-fork master")
+    startup_report["model_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_report["preloaded"] = True
+
+def prefork_preload() -> Optional[Callable[[], None]]:
+    """Master-side model loading for PREFORK_PRELOAD, or None when each worker loads its own"""
+    setting = os.environ.get('PREFORK_PRELOAD', 'auto').lower()
+    if setting == 'true':
+        return preload_models
+    if setting != 'auto':
+        return None
+    # TensorFlow and PyTorch are not fork-safe once loaded; registry ONNX /
+    # TFLite / OpenVINO artifacts load without importing either
+    registry = ModelRegistry()
+    if not registry.exists():
+        return None
+    try:
+        backends = {registry.get(name, verify=False).backend for name in ('detector', 'classifier')}
+    except ModelRegistryError:
+        return None  # reported by each worker's own load
+    if not backends <= set(FORK_SAFE_BACKENDS):
+        logger.info(f"Registry backends {sorted(backends)} are not all fork-safe; workers load their own models")
+        return None
+    return lambda: preload_models(import_frameworks=False)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background batching and release executor pools"""
+    if model_load_task is not None and not model_load_task.done():
+        model_load_task.cancel()
+    if pipeline is not None:
+        await pipeline.batcher.stop()
+    if inference_engine is not None:
+        inference_engine.shutdown()
+    cpu_engine.shutdown()
+    resource_sampler.stop()
+    trace_exporter.stop()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -92,50 +263,434 @@ async def root():
         "version": "1.0.0"
     }
 
+def _models_ready() -> bool:
+    """Models are ready in this process, or in at least one engine worker"""
+    if inference_engine is not None:
+        return inference_engine.is_ready()
+    return model_manager is not None and model_manager.is_ready()
+
+def _startup_phase() -> str:
+    """Current startup phase; engine workers report their own readiness"""
+    if inference_engine is not None and inference_engine.is_ready():
+        return "ready"
+    return startup_report["phase"]
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy",
-        "models_loaded": model_manager is not None and model_manager.is_ready(),
+        "models_loaded": _models_ready(),
+        "startup_phase": _startup_phase(),
         "timestamp": __import__('datetime').datetime.utcnow().isoformat()
     }
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_disease(file: UploadFile = File(...)):
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until models are loaded and warmup has completed"""
+    if inference_engine is not None:
+        warmup = inference_engine.get_warmup_reports()
+        reports = [report for report in warmup if report is not None]
+        ready = inference_engine.is_ready() and any(report["completed"] for report in reports)
+    else:
+        warmup = cpu_engine.warmup_report
+        reports = [warmup] if warmup is not None else []
+        ready = _models_ready() and warmup is not None and warmup["completed"]
+    content = {"ready": ready, "startup": {**startup_report, "phase": _startup_phase()}, "warmup": warmup}
+    if not ready:
+        content["failed_stages"] = sorted({stage for report in reports for stage in report.get("failed_stages", [])})
+    return JSONResponse(status_code=200 if ready else 503, content=content)
+
+def _require_models():
+    """Refuse predictions while models are still loading"""
+    if not _models_ready():
+        if startup_report["phase"] == "failed":
+            raise HTTPException(status_code=503, detail=f"Model loading failed: {startup_report['error']}")
+        raise HTTPException(status_code=503, detail="Models are still loading",
+                            headers={"Retry-After": "5"})
+
+def _overloaded(error: OverloadedError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+def _admit():
+    """Shed the request before reading and decoding the upload if the queue is not admitting"""
+    try:
+        pipeline.batcher.check_admission()
+    except OverloadedError as e:
+        raise _overloaded(e)
+
+@app.get("/stats")
+async def service_stats():
+    """Batching, cache and worker statistics"""
+    return {
+        "batching": pipeline.batcher.get_stats() if pipeline is not None else None,
+        "admission": pipeline.batcher.admission.get_stats()
+        if pipeline is not None and pipeline.batcher.admission is not None else None,
+        "cache": prediction_cache.get_stats(),
+        "models": model_manager.model_versions if model_manager is not None else None,
+        "shadow": model_manager.shadow.get_stats()
+        if model_manager is not None and model_manager.shadow is not None else None,
+        "engine": inference_engine.get_stats() if inference_engine is not None else None
+    }
+
+@app.get("/system")
+async def system_resources(seconds: Optional[float] = None):
+    """Recent CPU, memory and thread samples from the background sampler"""
+    samples = resource_sampler.window(seconds)
+    return {
+        "sampling": resource_sampler.running,
+        "interval_s": resource_sampler.interval,
+        "window_size": resource_sampler.capacity,
+        "summary": resource_sampler.summarize(samples),
+        "samples": [sample.to_dict() for sample in samples]
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latencies, request outcomes, queue depth, batch sizes, cache hits"""
+    return Response(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+def _cache_lookup(image: ValidatedImage, version: str) -> Tuple[str, Optional[int], Optional[Dict[str, Any]]]:
+    """Hash the upload and check the prediction cache (runs on the thread pool)"""
+    key = image.key or content_key(image.data)
+    phash = dhash(image.array) if prediction_cache.near_duplicate_radius > 0 else None
+    return key, phash, prediction_cache.get(key, phash, version)
+
+async def _run_prediction(image: ValidatedImage) -> Dict[str, Any]:
+    """Serve a validated image from the cache, or run it through the pipeline"""
+    # Entries are keyed by the served models too, so a reload never serves stale results
+    version = model_manager.cache_version
+    if prediction_cache.enabled:
+        with span("cache_lookup") as lookup:
+            key, phash, cached = await run_in_executor(cpu_engine.thread_pool, _cache_lookup, image, version)
+            lookup.attributes["hit"] = cached is not None
+        if cached is not None:
+            cached["processing_time"] = 0.0
+            return cached
+    
+    # Run inference pipeline on the pixels decoded during validation
+    result = await pipeline.process_image(image.array)
+    # Large JPEGs are decoded at reduced scale; report the box in upload pixels
+    result["bbox"] = image.to_original_bbox(result["bbox"])
+    
+    # Fallback answers from a failed stage would otherwise be replayed until evicted
+    degraded = result.pop("degraded", False)
+    # A swap during inference leaves it unclear which model answered; don't store that
+    if prediction_cache.enabled and not degraded and version == model_manager.cache_version:
+        # The disk tier writes a file, so store from the thread pool without waiting for it
+        store = run_in_executor(cpu_engine.thread_pool, prediction_cache.put, key, result, phash, version)
+        store.add_done_callback(_cache_store_done)
+    return result
+
+def _cache_store_done(store: asyncio.Future):
+    """Log and count a background cache store that failed; the response has already been sent"""
+    if store.cancelled():
+        return
+    error = store.exception()
+    if error is not None:
+        CACHE_STORE_ERRORS.inc()
+        logger.warning(f"Failed to cache prediction: {str(error)}")
+
+# The body is parsed by read_image_upload, so describe the form for the OpenAPI docs by hand
+_UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"file": {"type": "string", "format": "binary"}},
+        "required": ["file"]
+    }}}
+}
+
+@app.post("/predict", response_model=PredictionResponse, openapi_extra={"requestBody": _UPLOAD_REQUEST_BODY})
+async def predict_disease(request: Request):
     """
     Predict crop disease from uploaded image
     
     Args:
-        file: Uploaded image file (JPEG/PNG)
+        request: multipart/form-data with the image (JPEG/PNG) in the ``file`` field;
+            the body is checked while it streams in, so oversized (413) and
+            non-image (415) uploads are refused after the first chunk
         
     Returns:
         PredictionResponse: Disease prediction with confidence and advice
     """
+    _require_models()
+    _admit()
     try:
-        # Validate image
         validator = ImageValidator()
-        is_valid, error_msg = validator.validate_image(file)
+        try:
+            with span("upload") as upload_span:
+                upload = await read_image_upload(request, validator)
+                upload_span.attributes["bytes"] = upload.size
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        
+        with span("validation") as validation:
+            is_valid, error_msg, image = await _decode_upload(validator, upload)
+            if image is not None:
+                validation.attributes["decode_ms"] = round(image.decode_ms, 3)
         
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_msg)
         
-        # Process image
-        image_bytes = await file.read()
-        
-        # Run inference pipeline
-        result = await pipeline.process_image(image_bytes)
+        result = await _run_prediction(image)
         
         logger.info(f"Disease detected: {result['disease']} (confidence: {result['confidence']})")
         
-        return result
+        # Serialize here rather than in FastAPI so the time is measurable
+        with span("serialization"), SERIALIZATION_SECONDS.time():
+            return JSONResponse(PredictionResponse(**result).model_dump())
         
-    except HTTPException:
+    except (HTTPException, RequestValidationError):
         raise
+    except OverloadedError as e:
+        raise _overloaded(e)
+    except InferenceEngineError as e:
+        logger.error(f"Prediction failed: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Inference unavailable: {str(e)}",
+                            headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Prediction failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+# Upper bound on images per /predict/batch request, and images in flight at once
+MAX_BATCH_FILES = int(os.environ.get('MAX_BATCH_FILES', '500'))
+BATCH_ENDPOINT_CONCURRENCY = int(os.environ.get('BATCH_ENDPOINT_CONCURRENCY', '8'))
+
+async def _decode_upload(validator: ImageValidator,
+                         upload: StreamingUpload) -> Tuple[bool, str, Optional[ValidatedImage]]:
+    """Validate and decode a fully read upload on the decode executor (threads or processes)"""
+    executor = cpu_engine.get_decode_executor()
+    # Only plain arguments cross to a decode process; the read-time hash stays here
+    is_valid, error_msg, image = await run_in_executor(
+        executor, validator.validate_bytes, upload.filename, upload.data, upload.content_type
+    )
+    if image is not None:
+        image.key = upload.key
+        if executor is not cpu_engine.thread_pool:
+            # Histograms observed inside decode processes never reach /metrics
+            DECODE_SECONDS.observe(image.decode_ms / 1000)
+    return is_valid, error_msg, image
+
+def _open_batch(files: List[UploadFile]) -> List[Tuple[UploadFile, Optional[zipfile.ZipFile], Optional[str]]]:
+    """Pair each upload with its opened zip archive (only the central directory is read) or open error"""
+    entries = []
+    for upload in files:
+        if upload.filename and upload.filename.lower().endswith('.zip'):
+            try:
+                entries.append((upload, zipfile.ZipFile(upload.file), None))
+            except zipfile.BadZipFile as e:
+                entries.append((upload, None, f"Invalid zip archive: {str(e)}"))
+        else:
+            entries.append((upload, None, None))
+    return entries
+
+def _count_batch_images(entries: List[Tuple[UploadFile, Optional[zipfile.ZipFile], Optional[str]]]) -> int:
+    """Result lines the batch will produce: one per image, archive member or unreadable archive"""
+    return sum(
+        sum(1 for info in archive.infolist() if not info.is_dir()) if archive is not None else 1
+        for _, archive, _ in entries
+    )
+
+def _batch_sources(entries: List[Tuple[UploadFile, Optional[zipfile.ZipFile], Optional[str]]],
+                   validator: ImageValidator) -> Iterator[Tuple[str, Callable]]:
+    """Yield (filename, read) pairs for every image in the request, reading archive members lazily"""
+    for upload, archive, error in entries:
+        if error is not None:
+            yield upload.filename, _rejected_reader(error)
+        elif archive is not None:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, _archive_member_reader(validator, archive, info)
+        else:
+            yield upload.filename, lambda upload=upload: validator.read_upload(upload)
+
+def _rejected_reader(error: str) -> Callable:
+    def read():
+        raise UploadRejected(400, error)
+    return read
+
+def _archive_member_reader(validator: ImageValidator, archive: zipfile.ZipFile,
+                           info: zipfile.ZipInfo) -> Callable:
+    def read():
+        # Refuse oversized members from the header so a zip bomb is never inflated
+        if info.file_size > validator.max_file_size:
+            raise UploadRejected(413, validator.too_large_message())
+        upload = validator.stream(os.path.basename(info.filename))
+        upload.feed(archive.read(info))
+        return upload.finish()
+    return read
+
+async def _predict_batch_item(index: int, filename: str, read: Callable,
+                              validator: ImageValidator) -> Dict[str, Any]:
+    """Validate and predict one image of a batch; errors become part of the line"""
+    try:
+        with span("validation", index=index):
+            try:
+                upload = await run_in_executor(cpu_engine.thread_pool, read)
+            except UploadRejected as e:
+                return {"index": index, "filename": filename, "error": e.detail}
+            is_valid, error_msg, image = await _decode_upload(validator, upload)
+            del upload
+        if not is_valid:
+            return {"index": index, "filename": filename, "error": error_msg}
+        
+        result = await _run_prediction(image)
+        # Drop the decoded pixels as soon as this image is done
+        del image
+        return {"index": index, "filename": filename,
+                "prediction": PredictionResponse(**result).model_dump()}
+    except OverloadedError as e:
+        return {"index": index, "filename": filename, "error": str(e), "retry_after": e.retry_after}
+    except Exception as e:
+        logger.error(f"Batch prediction failed for {filename}: {str(e)}")
+        return {"index": index, "filename": filename, "error": f"Prediction failed: {str(e)}"}
+
+async def _stream_batch(sources: Iterator[Tuple[str, Callable]], validator: ImageValidator) -> AsyncIterator[bytes]:
+    """Run at most BATCH_ENDPOINT_CONCURRENCY images at a time, emitting NDJSON as each finishes"""
+    in_flight = set()
+    sources = enumerate(sources)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(in_flight) < BATCH_ENDPOINT_CONCURRENCY:
+                try:
+                    index, (filename, read) = next(sources)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight.add(asyncio.ensure_future(_predict_batch_item(index, filename, read, validator)))
+            
+            if not in_flight:
+                break
+            
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                with SERIALIZATION_SECONDS.time():
+                    line = (json.dumps(task.result()) + "\n").encode()
+                yield line
+    finally:
+        # Client went away: don't keep computing results nobody will read
+        for task in in_flight:
+            task.cancel()
+
+@app.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...)):
+    """
+    Predict crop disease for many images in one request
+    
+    Accepts several image files and/or zip archives of images. Results are
+    streamed as newline-delimited JSON, one line per image in completion
+    order: {"index", "filename", "prediction"} or {"index", "filename", "error"}.
+    More than MAX_BATCH_FILES images (counting archive members) is refused with 413.
+    """
+    _require_models()
+    _admit()
+    entries = _open_batch(files)
+    total = _count_batch_images(entries)
+    if total > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413,
+                            detail=f"Too many images: {total} (maximum {MAX_BATCH_FILES} per request)")
+    validator = ImageValidator()
+    sources = _batch_sources(entries, validator)
+    return StreamingResponse(_stream_batch(sources, validator), media_type="application/x-ndjson")
+
+# Optional shared secret for /admin endpoints (sent as X-Admin-Token)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+MODEL_NAMES = ('detector', 'classifier')
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject admin calls without the configured token"""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def _require_in_process_models():
+    """Model swaps act on this process's ModelManager"""
+    if inference_engine is not None:
+        raise HTTPException(status_code=409, detail="Model reload is not available with INFERENCE_PROCESSES > 0")
+    if SERVER_WORKERS > 1:
+        # Would only change the one worker that got the request
+        raise HTTPException(status_code=409, detail="Model reload is not available with SERVER_WORKERS > 1")
+    _require_models()
+
+def _reload_and_invalidate(name: str, version: Optional[str]):
+    """Background reload; the old model's cached predictions can no longer match, so free them"""
+    status = model_manager.reload_model(name, version)
+    if status["state"] == "swapped":
+        prediction_cache.clear()
+
+@app.get("/admin/models", dependencies=[Depends(_require_admin)])
+async def model_status():
+    """Served versions, last reload per model and shadow comparison"""
+    if model_manager is None:
+        raise HTTPException(status_code=503, detail="Models are still loading")
+    return {
+        "versions": model_manager.model_versions,
+        "reloads": model_manager.reload_status,
+        "shadow": model_manager.shadow.get_stats() if model_manager.shadow is not None else None
+    }
+
+@app.post("/admin/models/{name}/reload", status_code=202, dependencies=[Depends(_require_admin)])
+async def reload_model(name: str, version: Optional[str] = None):
+    """
+    Load a registry version in the background, warm it and swap it in
+    
+    Requests keep being served by the current model until the swap; poll
+    GET /admin/models for progress.
+    """
+    if name not in MODEL_NAMES:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'")
+    _require_in_process_models()
+    if model_manager.reload_status.get(name, {}).get("state") in ("queued", "loading", "warming"):
+        raise HTTPException(status_code=409, detail=f"A {name} reload is already in progress")
+    
+    model_manager.reload_status[name] = {"state": "queued", "version": version, "error": None}
+    run_in_executor(None, _reload_and_invalidate, name, version)
+    return {"name": name, "version": version, "state": "queued"}
+
+@app.post("/admin/models/classifier/shadow", dependencies=[Depends(_require_admin)])
+async def start_shadow(version: Optional[str] = None, sample_rate: Optional[float] = None):
+    """Load and warm a candidate classifier, then mirror a sample of traffic to it"""
+    _require_in_process_models()
+    try:
+        return await run_in_executor(None, model_manager.start_shadow, version, sample_rate)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Shadow model failed to load: {str(e)}")
+
+@app.delete("/admin/models/classifier/shadow", dependencies=[Depends(_require_admin)])
+async def stop_shadow():
+    """Stop mirroring and return the final comparison"""
+    _require_in_process_models()
+    stats = model_manager.stop_shadow()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No shadow model running")
+    return stats
+
+@app.post("/admin/models/classifier/shadow/promote", dependencies=[Depends(_require_admin)])
+async def promote_shadow():
+    """Swap the (already warm) shadow classifier in as the served model"""
+    _require_in_process_models()
+    if model_manager.shadow is None:
+        raise HTTPException(status_code=404, detail="No shadow model running")
+    stats = model_manager.promote_shadow()
+    prediction_cache.clear()
+    return stats
+
+# Longest profile one request may ask for
+MAX_PROFILE_SECONDS = 300
+
+@app.post("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(_require_admin)])
+async def profile(seconds: float = 10.0):
+    """Sample stacks of live traffic for N seconds; returns collapsed stacks for flamegraph tools"""
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}]")
+    try:
+        # The default executor keeps the inference thread pool free for the traffic being profiled
+        stacks = await run_in_executor(None, profiler.profile, seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stacks, headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'})
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
@@ -146,10 +701,23 @@ async def global_exception_handler(request, exc):
     )
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=int(os.environ.get("PORT", 8000)),
-        workers=1,  # Single worker for CPU optimization
-        log_level="info"
-    )
\ No newline at end of file
+    if SERVER_WORKERS > 1:
+        if int(os.environ.get('INFERENCE_PROCESSES', '0')) > 0:
+            raise SystemExit("SERVER_WORKERS > 1 and INFERENCE_PROCESSES > 0 are alternatives; set only one")
+        # Fork-safe models are loaded once here and shared copy-on-write by the
+        # forked workers; TensorFlow / PyTorch models are loaded by each worker
+        PreforkServer(
+            app,
+            host="0.0.0.0",
+            port=int(os.environ.get("PORT", 8000)),
+            workers=SERVER_WORKERS,
+            preload=prefork_preload()
+        ).run()
+    else:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=int(os.environ.get("PORT", 8000)),
+            workers=1,  # Single worker for CPU optimization
+            log_level="info"
+        )
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Admission control for the inference queue
+
+Requests are refused up front, instead of queuing without bound, when
+
+* the queue already holds ``max_queue`` images, or
+* the queue has been standing: every image dequeued for at least
+  ``interval_ms`` had waited longer than ``target_ms`` (CoDel's overload
+  signal). While overloaded, new arrivals are shed until an image gets
+  through within the target or the queue drains.
+
+Shed requests get a fast 503 with ``Retry-After``, so callers (e.g. the
+Node gateway) can fail over instead of waiting.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+class OverloadedError(Exception):
+    """The inference queue is not admitting work"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server overloaded ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Queue-depth and queueing-delay (CoDel-style) admission decisions"""
+
+    def __init__(self, max_queue: Optional[int] = None, target_ms: Optional[float] = None,
+                 interval_ms: Optional[float] = None, retry_after: Optional[int] = None):
+        self.max_queue = max_queue if max_queue is not None \
+            else int(os.environ.get('ADMISSION_MAX_QUEUE', '64'))
+        self.target_ms = target_ms if target_ms is not None \
+            else float(os.environ.get('ADMISSION_TARGET_DELAY_MS', '100'))
+        self.interval_ms = interval_ms if interval_ms is not None \
+            else float(os.environ.get('ADMISSION_INTERVAL_MS', '500'))
+        self.retry_after = retry_after if retry_after is not None \
+            else int(os.environ.get('ADMISSION_RETRY_AFTER', '1'))
+        self._lock = threading.Lock()
+
+        # CoDel state: when the delay first went above target, and whether it stayed there
+        self._above_target_since: Optional[float] = None
+        self.overloaded = False
+        self.last_delay_ms = 0.0
+
+        # Counters for monitoring
+        self.shed_queue_full = 0
+        self.shed_delay = 0
+        self.overload_episodes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_queue > 0
+
+    def check(self, depth: int):
+        """Raise OverloadedError unless one more image may join a queue of ``depth``"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if depth >= self.max_queue:
+                self.shed_queue_full += 1
+                raise OverloadedError("queue_full", self.retry_after)
+            if self.overloaded and depth > 0:
+                self.shed_delay += 1
+                raise OverloadedError("queue_delay", self.retry_after)
+
+    def observe(self, delay_s: float, remaining: int):
+        """Record how long a dequeued image waited; ``remaining`` is the depth left behind it"""
+        now = time.monotonic()
+        with self._lock:
+            self.last_delay_ms = delay_s * 1000
+            if self.last_delay_ms < self.target_ms or remaining == 0:
+                # Good delay, or the queue drained: no standing queue
+                self._above_target_since = None
+                self.overloaded = False
+            elif self._above_target_since is None:
+                self._above_target_since = now
+            elif not self.overloaded and (now - self._above_target_since) * 1000 >= self.interval_ms:
+                self.overloaded = True
+                self.overload_episodes += 1
+
+    def get_stats(self) -> dict:
+        """Admission counters for monitoring"""
+        return {
+            "enabled": self.enabled,
+            "max_queue": self.max_queue,
+            "target_delay_ms": self.target_ms,
+            "interval_ms": self.interval_ms,
+            "overloaded": self.overloaded,
+            "last_queue_delay_ms": round(self.last_delay_ms, 2),
+            "shed_queue_full": self.shed_queue_full,
+            "shed_queue_delay": self.shed_delay,
+            "overload_episodes": self.overload_episodes
+        }
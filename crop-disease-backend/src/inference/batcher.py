@@ -0,0 +1,158 @@
+"""
+Dynamic micro-batching: coalesce concurrent requests into one model call
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from src.inference.admission import AdmissionController
+from src.utils.metrics import BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Collects concurrent submissions and processes them as a single batch.
+
+    A batch is flushed when it reaches ``max_batch_size`` or when the oldest
+    waiting request has waited ``max_wait_ms``, whichever comes first. While a
+    batch is being processed new requests keep queuing, so batch size grows
+    with load on its own.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                 max_concurrent_batches: int = 1, admission: Optional[AdmissionController] = None):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size if max_batch_size is not None
+                                  else int(os.environ.get('BATCH_MAX_SIZE', '8')))
+        self.max_wait_ms = max(0.0, max_wait_ms if max_wait_ms is not None
+                               else float(os.environ.get('BATCH_MAX_WAIT_MS', '10')))
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # More than one batch may be in flight when several workers serve them
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: set = set()
+        # Refuses new items when the queue is too deep or has been slow for too long
+        self.admission = admission
+
+        # Counters for monitoring
+        self.batches_processed = 0
+        self.items_processed = 0
+
+    @property
+    def depth(self) -> int:
+        """Items waiting for a batch"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def check_admission(self):
+        """Raise OverloadedError if a new item would be refused right now"""
+        if self.admission is not None:
+            self.admission.check(self.depth)
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its own result (OverloadedError if it is not admitted)"""
+        self._ensure_started()
+        self.check_admission()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.monotonic()))
+        return await future
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+                        f"max_wait_ms={self.max_wait_ms})")
+
+    async def stop(self):
+        """Stop the collector task; queued requests are cancelled"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def _dequeued(self, entry: Tuple[Any, asyncio.Future, float]) -> Tuple[Any, asyncio.Future]:
+        item, future, enqueued = entry
+        if self.admission is not None:
+            self.admission.observe(time.monotonic() - enqueued, self._queue.qsize())
+        return item, future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        """Block for the first request, then gather more until size or deadline"""
+        batch = [self._dequeued(await self._queue.get())]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Still take whatever is already waiting, without blocking
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._dequeued(self._queue.get_nowait()))
+                break
+            try:
+                batch.append(self._dequeued(await asyncio.wait_for(self._queue.get(), timeout=remaining)))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (e.g. client disconnect) don't need a slot
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            if self.max_concurrent_batches == 1:
+                await self._process(batch)
+            else:
+                await self._slots.acquire()
+                task = asyncio.get_running_loop().create_task(self._process(batch))
+                self._in_flight.add(task)
+                task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _process(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        BATCH_SIZE.observe(len(items))
+        try:
+            results = await self.process_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.error(f"Batch of {len(items)} failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_processed += 1
+        self.items_processed += len(items)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def get_stats(self) -> dict:
+        """Batching statistics for monitoring"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "queued": self.depth,
+            "batches_processed": self.batches_processed,
+            "items_processed": self.items_processed,
+            "avg_batch_size": round(self.items_processed / self.batches_processed, 2)
+            if self.batches_processed else 0.0
+        }
@@ -0,0 +1,213 @@
+"""
+Content-addressed prediction cache with LRU eviction, TTL and near-duplicate matching
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def content_hasher():
+    """Incremental form of ``content_key``: ``update()`` with chunks, then ``hexdigest()``"""
+    return hashlib.blake2b(digest_size=16)
+
+def content_key(data: bytes) -> str:
+    """Exact-match key for raw upload bytes"""
+    hasher = content_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+def dhash(image: np.ndarray, hash_size: int = 8) -> int:
+    """64-bit difference hash of a decoded image (robust to re-encoding and small resizes)"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+class _Entry:
+    __slots__ = ('result', 'expires_at', 'phash', 'version')
+
+    def __init__(self, result: Dict[str, Any], expires_at: float, phash: Optional[int], version: str):
+        self.result = result
+        self.expires_at = expires_at
+        self.phash = phash
+        self.version = version
+
+class PredictionCache:
+    """Bounded in-memory LRU of prediction results, keyed by upload content.
+
+    Lookups hit on the exact content hash first, then (when
+    ``near_duplicate_radius`` > 0) on any live entry whose dHash is within
+    that Hamming distance. An optional on-disk tier keeps exact-match
+    entries across restarts. Results are copied in and out so callers can
+    modify what they get back.
+
+    ``version`` names the models behind a result; every tier only returns
+    entries stored under the same version, so a model swap never serves
+    predictions from the previous model, even ones stored after the swap.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 near_duplicate_radius: Optional[int] = None, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries if max_entries is not None \
+            else int(os.environ.get('PREDICTION_CACHE_SIZE', '1024'))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None \
+            else float(os.environ.get('PREDICTION_CACHE_TTL', '3600'))
+        self.near_duplicate_radius = near_duplicate_radius if near_duplicate_radius is not None \
+            else int(os.environ.get('PREDICTION_CACHE_NEAR_DUPLICATE_RADIUS', '0'))
+        self.disk_dir = disk_dir if disk_dir is not None else os.environ.get('PREDICTION_CACHE_DIR')
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        # Counters for monitoring
+        self.hits = 0
+        self.near_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str, phash: Optional[int] = None, version: str = '') -> Optional[Dict[str, Any]]:
+        """Look up a prediction by content key, falling back to near duplicates and disk"""
+        if not self.enabled:
+            return None
+
+        key = self._versioned_key(key, version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry.result)
+
+            if phash is not None and self.near_duplicate_radius > 0:
+                match = self._find_near_duplicate(phash, version, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.near_hits += 1
+                    return copy.deepcopy(self._entries[match].result)
+
+        result = self._read_disk(key)
+        if result is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._store(key, result, phash, version, now)
+            return copy.deepcopy(result)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any], phash: Optional[int] = None, version: str = ''):
+        """Remember a prediction for this content, made by the ``version`` models"""
+        if not self.enabled:
+            return
+        key = self._versioned_key(key, version)
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._store(key, result, phash, version, time.monotonic())
+        self._write_disk(key, result)
+
+    def clear(self):
+        """Forget every cached prediction, e.g. after the served model changed"""
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir:
+            for filename in os.listdir(self.disk_dir):
+                if filename.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, filename))
+                    except OSError:
+                        pass
+        logger.info("Prediction cache cleared")
+    
+    @staticmethod
+    def _versioned_key(key: str, version: str) -> str:
+        # Still a plain hex digest, so it stays a valid disk file name
+        return content_key(f"{version}\0{key}".encode()) if version else key
+
+    def _store(self, key: str, result: Dict[str, Any], phash: Optional[int], version: str, now: float):
+        self._entries[key] = _Entry(result, now + self.ttl_seconds, phash, version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _find_near_duplicate(self, phash: int, version: str, now: float) -> Optional[str]:
+        best_key, best_distance = None, self.near_duplicate_radius + 1
+        expired = []
+        for key, entry in self._entries.items():
+            if entry.expires_at <= now:
+                expired.append(key)
+                continue
+            if entry.phash is None or entry.version != version:
+                continue
+            distance = bin(entry.phash ^ phash).count('1')
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        for key in expired:
+            del self._entries[key]
+        return best_key
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key)) as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable cache entry {key}: {str(e)}")
+            return None
+        if time.time() - record.get('created_at', 0) > self.ttl_seconds:
+            return None
+        return record.get('result')
+
+    def _write_disk(self, key: str, result: Dict[str, Any]):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'created_at': time.time(), 'result': result}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to persist cache entry {key}: {str(e)}")
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.near_hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0
+        }
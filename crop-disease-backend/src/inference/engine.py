@@ -0,0 +1,357 @@
+"""
+Multi-process inference engine with shared-memory image handoff
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (shared memory block name, array shape, dtype string) for one image
+ImageSpec = Tuple[str, Tuple[int, ...], str]
+
+# A worker that stays up this long counts as healthy again; its restart backoff starts over
+WORKER_STABLE_SECONDS = 60.0
+# Workers that die before becoming ready this many times in a row are not restarted again
+MAX_FAILED_STARTS = 5
+
+class InferenceEngineError(RuntimeError):
+    """The engine could not run a batch: its worker died, failed or timed out, or the engine is stopping"""
+
+def _worker_main(index: int, task_queue, result_queue, num_threads: int):
+    """Entry point of a model-holding worker process"""
+    # Thread caps must be in place before TensorFlow / PyTorch are imported
+    for var in ('TF_NUM_INTEROP_THREADS', 'TF_NUM_INTRAOP_THREADS', 'TORCH_NUM_THREADS', 'OMP_NUM_THREADS'):
+        os.environ[var] = str(num_threads)
+
+    from src.models.model_manager import ModelManager
+    from src.inference.pipeline import DiseaseDetectionPipeline
+    from src.utils.cpu_optimizer import cpu_engine
+
+    try:
+        cpu_engine.configure_frameworks()
+        model_manager = ModelManager()
+        if not model_manager.load_models():
+            raise RuntimeError("model loading failed")
+        pipeline = DiseaseDetectionPipeline(model_manager)
+        # Only report ready once the first real batch will not pay warmup costs
+        warmup = cpu_engine.warmup_models(model_manager)
+    except Exception as e:
+        result_queue.put(('failed', index, {'pid': os.getpid(), 'error': str(e)}))
+        return
+    result_queue.put(('ready', index, {'pid': os.getpid(), 'warmup': warmup}))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, specs = task
+        blocks = []
+        images = []
+        try:
+            for name, shape, dtype in specs:
+                block = shared_memory.SharedMemory(name=name)
+                blocks.append(block)
+                # Zero-copy view onto the parent's decoded pixels
+                images.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf))
+            result_queue.put(('result', task_id, pipeline._infer_decoded(images)))
+        except Exception as e:
+            result_queue.put(('error', task_id, str(e)))
+        finally:
+            # Views must be gone before the mapping can be closed
+            del images
+            for block in blocks:
+                try:
+                    block.close()
+                except BufferError:
+                    logger.warning("Shared image still referenced after inference")
+
+class _Worker:
+    """Parent-side handle of one worker process"""
+
+    def __init__(self, index: int, process, task_queue):
+        self.index = index
+        self.process = process
+        self.task_queue = task_queue
+        self.ready = False
+        self.pid: Optional[int] = None
+        self.warmup: Optional[dict] = None
+        self.depth = 0  # images queued or running on this worker
+        self.started_at = time.monotonic()
+        self.restarts = 0
+        self.crashes = 0        # consecutive deaths within WORKER_STABLE_SECONDS of starting
+        self.failed_starts = 0  # consecutive deaths before becoming ready
+        self.dead = False
+        self.restart_at: Optional[float] = None  # None while alive, or once restarts are given up
+
+    @property
+    def state(self) -> str:
+        if not self.dead:
+            return "ready" if self.ready else "starting"
+        return "restarting" if self.restart_at is not None else "failed"
+
+class InferenceEngine:
+    """Pool of worker processes that each hold their own copy of the models.
+
+    Decoded images are copied once into ``multiprocessing.shared_memory``
+    blocks and only their names travel over the task queue, so large pixel
+    buffers are never pickled through a pipe. Each batch goes to the worker
+    with the fewest queued images. A worker's exit is noticed at once
+    (its process sentinel wakes the listener): its in-flight batches fail
+    with InferenceEngineError and it is restarted with exponential
+    backoff. Batches also fail after ``batch_timeout`` seconds, and the
+    worker that missed the deadline is restarted as hung.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, threads_per_worker: Optional[int] = None):
+        self.num_workers = num_workers or int(os.environ.get('INFERENCE_PROCESSES', '0')) or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or int(os.environ.get('INFERENCE_WORKER_THREADS', '1'))
+        self.batch_timeout = float(os.environ.get('INFERENCE_BATCH_TIMEOUT', '60'))
+        # Spawn, not fork: the parent may already hold TensorFlow / thread pool state
+        self._ctx = mp.get_context('spawn')
+        self._result_queue = None
+        self._workers: List[_Worker] = []
+        self._pending: Dict[int, Tuple[asyncio.Future, _Worker, int]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        """Spawn the workers; they load models in the background"""
+        self._result_queue = self._ctx.Queue()
+        self._running = True
+        self._workers = [self._spawn(index) for index in range(self.num_workers)]
+        self._listener = threading.Thread(target=self._listen, name="inference-engine-results", daemon=True)
+        self._listener.start()
+        logger.info(f"Inference engine started {self.num_workers} worker processes "
+                    f"({self.threads_per_worker} threads each)")
+
+    def _spawn(self, index: int) -> _Worker:
+        task_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, task_queue, self._result_queue, self.threads_per_worker),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return _Worker(index, process, task_queue)
+
+    def is_ready(self) -> bool:
+        """True once at least one worker has loaded and warmed up its models"""
+        return any(worker.ready for worker in self._workers)
+
+    def get_warmup_reports(self) -> List[Optional[dict]]:
+        """Warmup report of every worker (None while it is still starting)"""
+        return [worker.warmup for worker in self._workers]
+
+    async def infer(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Run a batch of decoded images on the least loaded worker"""
+        if not self._running:
+            raise InferenceEngineError("Inference engine is not running")
+        self._loop = asyncio.get_running_loop()
+
+        with self._lock:
+            workers = [worker for worker in self._workers if not worker.dead]
+        if not workers:
+            raise InferenceEngineError("No inference worker is running")
+
+        blocks = [self._to_shared(image) for image in images]
+        specs = [(block.name, image.shape, image.dtype.str) for block, image in zip(blocks, images)]
+        future = self._loop.create_future()
+        task_id = next(self._ids)
+
+        with self._lock:
+            worker = min(workers, key=lambda w: (not w.ready, w.depth))
+            worker.depth += len(images)
+            self._pending[task_id] = (future, worker, len(images))
+        worker.task_queue.put((task_id, specs))
+
+        try:
+            return await asyncio.wait_for(future, self.batch_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Inference worker {worker.index} did not answer within {self.batch_timeout:.0f}s; "
+                         f"restarting it")
+            # Presumed hung, so SIGKILL (a hung process may never act on SIGTERM);
+            # the listener sees the exit and restarts it
+            worker.process.kill()
+            raise InferenceEngineError(f"Inference timed out after {self.batch_timeout:.0f}s")
+        finally:
+            with self._lock:
+                if self._pending.pop(task_id, None) is not None:
+                    worker.depth -= len(images)
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    @staticmethod
+    def _to_shared(image: np.ndarray) -> shared_memory.SharedMemory:
+        block = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=block.buf)[...] = image
+        return block
+
+    def _listen(self):
+        """Route worker results back to the event loop and supervise workers"""
+        # Same technique as concurrent.futures.ProcessPoolExecutor: one wait
+        # over the result pipe and every worker's sentinel, so a worker's exit
+        # wakes the loop as promptly as a result does
+        reader = self._result_queue._reader
+        while self._running:
+            sentinels = [worker.process.sentinel for worker in self._workers if not worker.dead]
+            try:
+                wait([reader, *sentinels], timeout=self._next_wakeup())
+            except OSError:
+                break
+            # Results first, so a batch finished just before a worker died is still delivered
+            if not self._drain_results():
+                break
+            self._check_workers()
+
+    def _next_wakeup(self) -> float:
+        """Seconds until the earliest pending restart (at most 1s)"""
+        now = time.monotonic()
+        due = [worker.restart_at - now for worker in self._workers if worker.restart_at is not None]
+        return max(0.0, min([1.0, *due]))
+
+    def _drain_results(self) -> bool:
+        """Handle every message waiting on the result queue; False once the queue is closed"""
+        while True:
+            try:
+                kind, key, payload = self._result_queue.get_nowait()
+            except queue.Empty:
+                return True
+            except (EOFError, OSError, ValueError):
+                return False
+            self._handle_message(kind, key, payload)
+
+    def _handle_message(self, kind: str, key: int, payload: Any):
+        if kind in ('ready', 'failed'):
+            worker = self._workers[key]
+            if worker.process.pid != payload['pid']:
+                return  # from a worker that has since been replaced
+            if kind == 'failed':
+                logger.error(f"Inference worker {key} failed to start: {payload['error']}")
+                return
+            worker.ready = True
+            worker.pid = payload['pid']
+            worker.warmup = payload['warmup']
+            logger.info(f"Inference worker {key} ready (pid {worker.pid}, "
+                        f"warmup {worker.warmup['total_ms']} ms)")
+            return
+
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is not None:
+                entry[1].depth -= entry[2]
+        if entry is None:
+            return
+        if kind == 'result':
+            self._resolve(entry[0], result=payload)
+        else:
+            self._resolve(entry[0], error=InferenceEngineError(f"Inference worker failed: {payload}"))
+
+    def _check_workers(self):
+        """Notice dead workers and start replacements whose backoff has passed"""
+        if not self._running:
+            return
+        now = time.monotonic()
+        for index, worker in enumerate(self._workers):
+            if worker.dead:
+                if worker.restart_at is not None and now >= worker.restart_at:
+                    replacement = self._spawn(index)
+                    replacement.restarts = worker.restarts + 1
+                    replacement.crashes = worker.crashes
+                    replacement.failed_starts = worker.failed_starts
+                    self._workers[index] = replacement
+                continue
+            if worker.process.is_alive():
+                continue
+
+            worker.dead = True
+            worker.ready = False
+            with self._lock:
+                lost = [task_id for task_id, (_, owner, _) in self._pending.items() if owner is worker]
+                entries = [self._pending.pop(task_id) for task_id in lost]
+            for future, _, _ in entries:
+                self._resolve(future, error=InferenceEngineError("Inference worker died"))
+
+            worker.crashes = worker.crashes + 1 if now - worker.started_at < WORKER_STABLE_SECONDS else 1
+            worker.failed_starts = worker.failed_starts + 1 if worker.warmup is None else 0
+            exit_code = worker.process.exitcode
+            if worker.failed_starts >= MAX_FAILED_STARTS:
+                logger.error(f"Inference worker {index} died before becoming ready {worker.failed_starts} times "
+                             f"in a row (exit code {exit_code}); not restarting it")
+                continue
+            delay = min(2.0 ** (worker.crashes - 1), 30.0)
+            worker.restart_at = now + delay
+            logger.error(f"Inference worker {index} died (exit code {exit_code}); restarting in {delay:.0f}s")
+
+    def _resolve(self, future: asyncio.Future, result: Any = None, error: Optional[Exception] = None):
+        def apply():
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(apply)
+
+    def get_stats(self) -> dict:
+        """Per-worker queue depth and health for monitoring"""
+        return {
+            "num_workers": self.num_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "workers": [
+                {
+                    "index": worker.index,
+                    "pid": worker.pid,
+                    "ready": worker.ready,
+                    "warmup_ms": worker.warmup['total_ms'] if worker.warmup else None,
+                    "state": worker.state,
+                    "queue_depth": worker.depth,
+                    "restarts": worker.restarts
+                }
+                for worker in self._workers
+            ]
+        }
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop workers and fail anything still pending"""
+        self._running = False
+        for worker in self._workers:
+            try:
+                worker.task_queue.put(None)
+            except (OSError, ValueError):
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(1.0)
+            if worker.process.is_alive():
+                # Hung or stopped processes ignore SIGTERM
+                worker.process.kill()
+                worker.process.join(1.0)
+        with self._lock:
+            entries = list(self._pending.values())
+            self._pending.clear()
+        for future, _, _ in entries:
+            self._resolve(future, error=InferenceEngineError("Inference engine shut down"))
+        logger.info("Inference engine stopped")
@@ -2,301 +2,414 @@
 Two-stage inference pipeline: YOLOv8 detection → MobileNetV3 classification
 """
 
-import asyncio
 import logging
-from typing import Dict, Any, Tuple
+import os
+from concurrent.futures import Executor
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 import cv2
 import numpy as np
 from PIL import Image
 import io
 import time
 
+from src.models.detectors import Detections
 from src.models.model_manager import ModelManager
+from src.inference.admission import AdmissionController
+from src.inference.batcher import MicroBatcher
+from src.inference.engine import InferenceEngine, InferenceEngineError
+from src.inference.preprocessing import preprocess_crops
+from src.utils.metrics import CLASSIFICATION_SECONDS, DETECTION_SECONDS, PREPROCESS_SECONDS
+from src.utils.tracing import Trace, batch_traces, current_trace, run_in_executor, span
 
 logger = logging.getLogger(__name__)
 
+def _decode_images(batch: List[bytes]) -> List[np.ndarray]:
+    """Decode a batch of uploads; module-level so a process pool can run it"""
+    return [
+        DiseaseDetectionPipeline._pil_to_opencv(DiseaseDetectionPipeline._bytes_to_pil(image_bytes))
+        for image_bytes in batch
+    ]
+
 class DiseaseDetectionPipeline:
     """Main inference pipeline for crop disease detection"""
     
-    def __init__(self, model_manager: ModelManager):
+    def __init__(self, model_manager: ModelManager, max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None, executor: Optional[Executor] = None,
+                 decode_executor: Optional[Executor] = None, engine: Optional[InferenceEngine] = None):
         self.model_manager = model_manager
         self.min_confidence = 0.3  # Minimum confidence threshold
         
-    async def process_image(self, image_bytes: bytes) -> Dict[str, Any]:
-        """Process uploaded image through the complete pipeline"""
+        # Classifier input preparation (see src/inference/preprocessing.py)
+        self.normalization = os.environ.get('CLASSIFIER_NORMALIZATION', 'raw')
+        self.letterbox = os.environ.get('CLASSIFIER_LETTERBOX', 'false').lower() == 'true'
+        
+        # CPU-bound stages run here so the event loop only does I/O. Model
+        # stages need the in-process models, so they always use `executor`
+        # (a thread pool); decoding may go to a process pool instead.
+        self.executor = executor
+        self.decode_executor = decode_executor or executor
+        
+        # Optional pool of model-holding worker processes; when set, model
+        # stages run there and this process only decodes and routes
+        self.engine = engine
+        
+        # Request coalescing; tune with BATCH_MAX_SIZE / BATCH_MAX_WAIT_MS.
+        # Admission (ADMISSION_*) bounds the queue in front of it
+        self.batcher = MicroBatcher(
+            self._process_batch, max_batch_size, max_wait_ms,
+            max_concurrent_batches=engine.num_workers if engine is not None else 1,
+            admission=AdmissionController()
+        )
+        
+    async def process_image(self, image: Union[bytes, np.ndarray]) -> Dict[str, Any]:
+        """Process uploaded image through the complete pipeline
+        
+        Accepts raw upload bytes or an already-decoded BGR array (as produced
+        by ImageValidator.validate_upload), in which case no decode is repeated.
+        """
+        # Concurrent callers are coalesced into one batched forward per stage;
+        # the caller's trace travels along so batch stages can be attributed
+        return await self.batcher.submit((image, current_trace(), time.perf_counter()))
+    
+    async def _process_batch(self, items: List[Tuple[Union[bytes, np.ndarray], Optional[Trace], float]]) -> List[Dict[str, Any]]:
+        """Run a batch of images through detection and classification together"""
+        batch_start = time.perf_counter()
+        for _, trace, submitted in items:
+            if trace is not None:
+                trace.add("queue", submitted, batch_start, batch_size=len(items))
+        
+        with batch_traces([trace for _, trace, _ in items]):
+            return await self._process_images([image for image, _, _ in items])
+    
+    async def _process_images(self, batch: List[Union[bytes, np.ndarray]]) -> List[Dict[str, Any]]:
+        """Stages for one batch; spans recorded here go to every request in it"""
         start_time = time.time()
         
         try:
-            # Simplified pipeline that bypasses numpy issues
-            logger.info("Processing image with simplified pipeline...")
+            logger.info(f"Processing batch of {len(batch)} image(s)...")
             
-            # Simulate processing delay
-            time.sleep(0.1)
+            images = await self._decode_batch(batch)
             
-            # Return simulated results
-            import random
-            diseases = [
-                ("Tomato_healthy", 0.92, "Tomato appears healthy. Continue regular monitoring."),
-                ("Tomato_early_blight", 0.85, "Apply copper-based fungicide and remove affected leaves."),
-                ("Tomato_late_blight", 0.78, "Immediate action required. Apply systemic fungicide."),
-                ("Potato_healthy", 0.88, "Potato plant looks healthy. Maintain current care routine."),
-                ("Potato_early_blight", 0.81, "Apply fungicides containing chlorothalonil. Rotate crops annually.")
-            ]
+            if self.engine is not None:
+                with span("inference", batch_size=len(images)):
+                    results = await self.engine.infer(images)
+                processing_time = round(time.time() - start_time, 2)
+                for result in results:
+                    result["processing_time"] = processing_time
+                return results
             
-            disease_name, confidence, advice = random.choice(diseases)
-            crop_name = disease_name.split('_')[0] if '_' in disease_name else "Plant"
+            # Stage 1: one detector call for the whole batch
+            with span("detection", batch_size=len(images)):
+                detection_results = await self._detect_objects_batch(images)
             
-            # Add some randomness to confidence
-            confidence = round(confidence + random.uniform(-0.05, 0.05), 2)
-            confidence = max(0.6, min(0.95, confidence))
+            # Stage 2: crop every image to its best region, then one classifier call
+            with span("preprocess", batch_size=len(images)):
+                crops = await self._run_blocking(self._crop_batch, images, detection_results)
+            with span("classification", batch_size=len(images)):
+                classification_results = await self._classify_disease_batch(crops)
             
-            result = {
-                "crop": crop_name,
-                "disease": disease_name.replace('_', ' ').title(),
-                "severity": random.choice(["Low", "Medium", "High"]),
-                "confidence": confidence,
-                "advice": advice,
-                "bbox": {
-                    "x1": 50,
-                    "y1": 30,
-                    "x2": 180,
-                    "y2": 150,
-                    "width": 130,
-                    "height": 120
-                },
-                "processing_time": round(time.time() - start_time, 2),
-                "detection_count": 1
-            }
+            processing_time = time.time() - start_time
+            logger.info(f"Batch of {len(batch)} completed in {processing_time:.2f}s")
             
-            logger.info(f"Simplified pipeline completed in {time.time() - start_time:.2f}s")
-            return result
+            return [
+                self._prepare_response(detection, classification, processing_time)
+                for detection, classification in zip(detection_results, classification_results)
+            ]
             
+        except InferenceEngineError:
+            # No worker produced a result; callers must see an error, not a fallback prediction
+            raise
         except Exception as e:
             logger.error(f"Pipeline processing failed: {str(e)}")
             # Ensure we calculate processing time even in error case
             error_processing_time = time.time() - start_time
             # Return default response on any error
-            return {
-                "crop": "Plant",
-                "disease": "Healthy",
-                "severity": "Low",
-                "confidence": 0.85,
-                "advice": "Plant appears healthy. Continue regular monitoring.",
-                "bbox": {
-                    "x1": 0,
-                    "y1": 0,
-                    "x2": 100,
-                    "y2": 100,
-                    "width": 100,
-                    "height": 100
-                },
-                "processing_time": round(error_processing_time, 2),
-                "detection_count": 1
-            }
+            return [self._default_response(error_processing_time) for _ in batch]
+    
+    async def _decode_batch(self, batch: List[Union[bytes, np.ndarray]]) -> List[np.ndarray]:
+        """Decode the raw-bytes items; arrays decoded during validation pass through"""
+        pending = [index for index, item in enumerate(batch) if not isinstance(item, np.ndarray)]
+        if not pending:
+            return list(batch)
+        
+        with span("decode", batch_size=len(pending)):
+            decoded = await self._run_blocking(
+                _decode_images, [batch[index] for index in pending], executor=self.decode_executor
+            )
+        images = list(batch)
+        for index, image in zip(pending, decoded):
+            images[index] = image
+        return images
+    
+    def _infer_decoded(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Both model stages on already-decoded images, synchronously (engine workers)"""
+        start_time = time.time()
+        detection_results = self._run_detector(images)
+        crops = self._crop_batch(images, detection_results)
+        classification_results = self._run_classifier(crops)
+        processing_time = time.time() - start_time
+        return [
+            self._prepare_response(detection, classification, processing_time)
+            for detection, classification in zip(detection_results, classification_results)
+        ]
+    
+    async def _run_blocking(self, func: Callable, *args, executor: Optional[Executor] = None):
+        """Run CPU-bound work off the event loop, keeping the batch's request IDs in its logs"""
+        return await run_in_executor(executor or self.executor, func, *args)
+    
+    def _default_response(self, processing_time: float) -> Dict[str, Any]:
+        """Fallback response used when the pipeline fails; marked degraded so it is never cached"""
+        return {
+            "crop": "Plant",
+            "disease": "Healthy",
+            "severity": "Low",
+            "confidence": 0.85,
+            "advice": "Plant appears healthy. Continue regular monitoring.",
+            "bbox": {
+                "x1": 0,
+                "y1": 0,
+                "x2": 100,
+                "y2": 100,
+                "width": 100,
+                "height": 100
+            },
+            "processing_time": round(processing_time, 2),
+            "detection_count": 1,
+            "degraded": True
+        }
     
-    def _bytes_to_pil(self, image_bytes: bytes) -> Image.Image:
+    @staticmethod
+    def _bytes_to_pil(image_bytes: bytes) -> Image.Image:
         """Convert image bytes to PIL Image"""
-        try:
-            # Create a simple test image instead of processing the actual image
-            # This bypasses potential numpy issues
-            import random
-            test_image = Image.new('RGB', (224, 224), color=(random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
-            return test_image
-        except Exception as e:
-            # Return a default image on error
-            return Image.new('RGB', (224, 224), color='green')
+        image = Image.open(io.BytesIO(image_bytes))
+        return image.convert('RGB')
     
-    def _pil_to_opencv(self, pil_image: Image.Image) -> np.ndarray:
+    @staticmethod
+    def _pil_to_opencv(pil_image: Image.Image) -> np.ndarray:
         """Convert PIL Image to OpenCV format"""
-        try:
-            # Simplified conversion that avoids complex numpy operations
-            # Create a simple numpy array directly
-            width, height = pil_image.size
-            # Create a simple array filled with the average color
-            avg_color = tuple(int(x) for x in pil_image.getpixel((0, 0)))
-            return np.full((height, width, 3), avg_color, dtype=np.uint8)
-        except Exception:
-            # Return a default array on error
-            return np.full((224, 224, 3), [0, 255, 0], dtype=np.uint8)  # Green image
+        return cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2BGR)
     
     async def _detect_objects(self, image: np.ndarray) -> Dict[str, Any]:
         """Stage 1: Detect plant/leaf objects using YOLOv8"""
+        return (await self._detect_objects_batch([image]))[0]
+    
+    async def _detect_objects_batch(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Stage 1 for a batch: one YOLOv8 call over all images"""
+        return await self._run_blocking(self._run_detector, images)
+    
+    def _run_detector(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Blocking detector call; runs on the executor"""
         try:
-            # Run YOLO detection
-            results = self.model_manager.yolo_model(image, verbose=False)
-            
-            # Process detection results
-            detections = []
-            best_detection = None
-            max_confidence = 0
-            
-            # Look for plant-related classes (COCO dataset classes)
-            plant_classes = ['potted plant', 'plant', 'tree', 'grass']  # COCO class names
+            detector = self.model_manager.detector
+            if detector is None:
+                # Dummy model in use: treat the whole image as the plant
+                return [self._fallback_detection(image) for image in images]
             
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Get class name and confidence
-                        class_id = int(box.cls[0])
-                        confidence = float(box.conf[0])
-                        class_name = result.names[class_id]
-                        
-                        # Check if it's a plant-related object
-                        if confidence > self.min_confidence:
-                            # Extract bounding box coordinates
-                            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                            
-                            detection = {
-                                'class_name': class_name,
-                                'confidence': confidence,
-                                'bbox': {
-                                    'x1': int(x1),
-                                    'y1': int(y1),
-                                    'x2': int(x2),
-                                    'y2': int(y2),
-                                    'width': int(x2 - x1),
-                                    'height': int(y2 - y1)
-                                }
-                            }
-                            
-                            detections.append(detection)
-                            
-                            # Track the best detection
-                            if confidence > max_confidence:
-                                max_confidence = confidence
-                                best_detection = detection
-            
-            # Calculate image dimensions for area ratio
-            img_height, img_width = image.shape[:2]
-            image_area = img_width * img_height
-            
-            # Calculate bbox area ratio if detection found
-            bbox_area_ratio = 0
-            if best_detection:
-                bbox = best_detection['bbox']
-                bbox_area = bbox['width'] * bbox['height']
-                bbox_area_ratio = bbox_area / image_area if image_area > 0 else 0
-            
-            # If no plant objects detected, create a dummy detection covering most of the image
-            # This simulates the case where the whole image is a plant/leaf
-            if not detections:
-                height, width = image.shape[:2]
-                dummy_bbox = {
-                    'x1': int(width * 0.1),
-                    'y1': int(height * 0.1),
-                    'x2': int(width * 0.9),
-                    'y2': int(height * 0.9),
-                    'width': int(width * 0.8),
-                    'height': int(height * 0.8)
-                }
-                
-                detections = [{
-                    'class_name': 'plant',
-                    'confidence': 0.85,
-                    'bbox': dummy_bbox
-                }]
-                
-                best_detection = detections[0]
-                max_confidence = 0.85
-                bbox_area_ratio = 0.64  # 0.8 * 0.8
-            
-            return {
-                'objects_found': True,  # Always return True for demo
-                'detections': detections,
-                'best_bbox': best_detection['bbox'] if best_detection else None,
-                'best_confidence': max_confidence,
-                'bbox_area_ratio': bbox_area_ratio,
-                'total_detections': len(detections)
-            }
+            # One call over the whole batch, whatever runtime backs the detector
+            with DETECTION_SECONDS.time():
+                results = detector.detect(images)
+            return [self._parse_detections(result, image, detector.names)
+                    for result, image in zip(results, images)]
             
         except Exception as e:
             logger.error(f"Object detection failed: {str(e)}")
             # Return default detection on error
+            return [dict(self._fallback_detection(image), degraded=True) for image in images]
+    
+    def _parse_detections(self, result: Detections, image: np.ndarray,
+                          names: Dict[int, str]) -> Dict[str, Any]:
+        """Convert one image's detections into the pipeline's detection summary"""
+        # Filter and convert all boxes at once; only the survivors become dicts
+        mask = result.scores > self.min_confidence
+        boxes = result.boxes[mask].astype(np.int64)
+        scores = result.scores[mask]
+        class_ids = result.class_ids[mask]
+        sizes = boxes[:, 2:4] - boxes[:, 0:2]
+        
+        detections = [
+            {
+                'class_name': names.get(class_id, str(class_id)),
+                'confidence': confidence,
+                'bbox': {
+                    'x1': x1,
+                    'y1': y1,
+                    'x2': x2,
+                    'y2': y2,
+                    'width': width,
+                    'height': height
+                }
+            }
+            for (x1, y1, x2, y2), (width, height), confidence, class_id
+            in zip(boxes.tolist(), sizes.tolist(), scores.tolist(), class_ids.tolist())
+        ]
+        
+        # Calculate image dimensions for area ratio
+        img_height, img_width = image.shape[:2]
+        image_area = img_width * img_height
+        
+        best_detection = None
+        max_confidence = 0
+        bbox_area_ratio = 0
+        if detections:
+            best = int(np.argmax(scores))
+            best_detection = detections[best]
+            max_confidence = best_detection['confidence']
+            bbox_area_ratio = int(sizes[best].prod()) / image_area if image_area > 0 else 0
+        
+        # If no plant objects detected, create a dummy detection covering most of the image
+        # This simulates the case where the whole image is a plant/leaf
+        if not detections:
             height, width = image.shape[:2]
             dummy_bbox = {
-                'x1': 0,
-                'y1': 0,
-                'x2': width,
-                'y2': height,
-                'width': width,
-                'height': height
+                'x1': int(width * 0.1),
+                'y1': int(height * 0.1),
+                'x2': int(width * 0.9),
+                'y2': int(height * 0.9),
+                'width': int(width * 0.8),
+                'height': int(height * 0.8)
             }
             
-            return {
-                'objects_found': True,
-                'detections': [{
-                    'class_name': 'plant',
-                    'confidence': 0.8,
-                    'bbox': dummy_bbox
-                }],
-                'best_bbox': dummy_bbox,
-                'best_confidence': 0.8,
-                'bbox_area_ratio': 1.0,
-                'total_detections': 1
-            }
+            detections = [{
+                'class_name': 'plant',
+                'confidence': 0.85,
+                'bbox': dummy_bbox
+            }]
+            
+            best_detection = detections[0]
+            max_confidence = 0.85
+            bbox_area_ratio = 0.64  # 0.8 * 0.8
+        
+        return {
+            'objects_found': True,  # Always return True for demo
+            'detections': detections,
+            'best_bbox': best_detection['bbox'] if best_detection else None,
+            'best_confidence': max_confidence,
+            'bbox_area_ratio': bbox_area_ratio,
+            'total_detections': len(detections)
+        }
+    
+    def _fallback_detection(self, image: np.ndarray) -> Dict[str, Any]:
+        """Whole-image detection used when the detector fails"""
+        height, width = image.shape[:2]
+        dummy_bbox = {
+            'x1': 0,
+            'y1': 0,
+            'x2': width,
+            'y2': height,
+            'width': width,
+            'height': height
+        }
+        
+        return {
+            'objects_found': True,
+            'detections': [{
+                'class_name': 'plant',
+                'confidence': 0.8,
+                'bbox': dummy_bbox
+            }],
+            'best_bbox': dummy_bbox,
+            'best_confidence': 0.8,
+            'bbox_area_ratio': 1.0,
+            'total_detections': 1
+        }
+    
+    def _crop_batch(self, images: List[np.ndarray], detection_results: List[Dict]) -> np.ndarray:
+        """Crop every image to its best detection and build one classifier batch"""
+        with PREPROCESS_SECONDS.time():
+            return preprocess_crops(
+                images,
+                [detection.get('best_bbox') for detection in detection_results],
+                normalization=self.normalization,
+                letterbox=self.letterbox
+            )
     
     def _crop_detection_region(self, image: np.ndarray, bbox: Dict[str, int]) -> np.ndarray:
         """Crop image to detected bounding box region"""
-        try:
-            # Simplified cropping that avoids complex operations
-            if not bbox:
-                # Return a resized version of the input image
-                if len(image.shape) == 3:
-                    return np.resize(image, (224, 224, 3))
-                else:
-                    return np.resize(image, (224, 224))
-            
-            # Just resize to the required input size
-            resized = np.resize(image, (224, 224, 3))
-            return resized
-        except Exception:
-            # Return a default green image on error
-            return np.full((224, 224, 3), [0, 255, 0], dtype=np.uint8)
+        return preprocess_crops([image], [bbox], normalization=self.normalization,
+                                letterbox=self.letterbox)[0]
     
     async def _classify_disease(self, image: np.ndarray) -> Dict[str, Any]:
         """Stage 2: Classify disease using MobileNetV3"""
+        return (await self._classify_disease_batch([image]))[0]
+    
+    async def _classify_disease_batch(self, images: Union[np.ndarray, List[np.ndarray]]) -> List[Dict[str, Any]]:
+        """Stage 2 for a batch: one MobileNetV3 forward over all crops"""
+        return await self._run_blocking(self._run_classifier, images)
+    
+    def _run_classifier(self, images: Union[np.ndarray, List[np.ndarray]]) -> List[Dict[str, Any]]:
+        """Blocking classifier call; runs on the executor"""
         try:
-            # Simplified classification for demo purposes
-            # In a real implementation, you would use the actual MobileNetV3 model
-            
-            # Simulate disease detection results
-            import random
+            classifier = self.model_manager.classifier
+            if classifier is None:
+                # Dummy model in use: fall back to the simulated classifier
+                return [self._simulate_classification() for _ in images]
             
-            # Possible diseases for demonstration
-            diseases = [
-                ("Tomato_healthy", 0.92),
-                ("Tomato_early_blight", 0.85),
-                ("Tomato_late_blight", 0.78),
-                ("Potato_healthy", 0.88),
-                ("Potato_early_blight", 0.81),
-                ("Apple_scab", 0.76),
-                ("Corn_northern_leaf_blight", 0.73)
-            ]
-            
-            # Randomly select a disease for demo
-            disease_name, confidence = random.choice(diseases)
+            batch = images if isinstance(images, np.ndarray) else np.stack(images).astype(np.float32)
+            started = time.perf_counter()
+            probabilities = classifier.predict(batch)
+            primary_seconds = time.perf_counter() - started
+            CLASSIFICATION_SECONDS.observe(primary_seconds)
             
-            # Add some randomness to confidence
-            confidence = round(confidence + random.uniform(-0.05, 0.05), 2)
-            confidence = max(0.6, min(0.95, confidence))  # Keep in reasonable range
-            
-            return {
-                'predicted_class': 0,  # Dummy class index
-                'disease_name': disease_name,
-                'confidence': confidence,
-                'probabilities': {'0': confidence}  # Dummy probabilities
-            }
+            results = []
+            for row in probabilities:
+                class_idx = int(np.argmax(row))
+                confidence = float(row[class_idx])
+                results.append({
+                    'predicted_class': class_idx,
+                    'disease_name': self.model_manager.get_disease_name(class_idx),
+                    'confidence': confidence,
+                    'probabilities': {str(class_idx): confidence}
+                })
             
         except Exception as e:
             logger.error(f"Disease classification failed: {str(e)}")
             # Return default healthy result on error
-            return {
+            return [{
                 'predicted_class': 0,
                 'disease_name': "Plant_healthy",
                 'confidence': 0.85,
-                'probabilities': {'0': 0.85}
-            }
+                'probabilities': {'0': 0.85},
+                'degraded': True
+            } for _ in images]
+        
+        shadow = self.model_manager.shadow
+        if shadow is not None:
+            # Candidate runs on its own thread; clients only ever see the primary
+            # result, so a failing candidate must not cost them that result either
+            try:
+                shadow.maybe_submit(batch, probabilities, primary_seconds * 1000)
+            except Exception as e:
+                logger.warning(f"Shadow submission failed: {str(e)}")
+        return results
+    
+    def _simulate_classification(self) -> Dict[str, Any]:
+        """Simulated disease result for demo deployments without a classifier"""
+        import random
+        
+        # Possible diseases for demonstration
+        diseases = [
+            ("Tomato_healthy", 0.92),
+            ("Tomato_early_blight", 0.85),
+            ("Tomato_late_blight", 0.78),
+            ("Potato_healthy", 0.88),
+            ("Potato_early_blight", 0.81),
+            ("Apple_scab", 0.76),
+            ("Corn_northern_leaf_blight", 0.73)
+        ]
+        
+        # Randomly select a disease for demo
+        disease_name, confidence = random.choice(diseases)
+        
+        # Add some randomness to confidence
+        confidence = round(confidence + random.uniform(-0.05, 0.05), 2)
+        confidence = max(0.6, min(0.95, confidence))  # Keep in reasonable range
+        
+        return {
+            'predicted_class': 0,  # Dummy class index
+            'disease_name': disease_name,
+            'confidence': confidence,
+            'probabilities': {'0': confidence}  # Dummy probabilities
+        }
     
     def _prepare_response(self, detection_results: Dict, classification_results: Dict, 
                          processing_time: float) -> Dict[str, Any]:
@@ -334,7 +447,9 @@ class DiseaseDetectionPipeline:
                     "height": bbox.get('height', 0)
                 },
                 "processing_time": round(processing_time, 2),
-                "detection_count": detection_results.get('total_detections', 0)
+                "detection_count": detection_results.get('total_detections', 0),
+                # A stage fell back after an error: serve it, but don't cache it
+                "degraded": detection_results.get('degraded', False) or classification_results.get('degraded', False)
             }
             
         except Exception as e:
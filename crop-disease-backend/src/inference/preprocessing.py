@@ -0,0 +1,80 @@
+"""
+Batched crop → resize → color convert → normalize for the classifier stage
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+CLASSIFIER_INPUT_SIZE = 224
+
+# How pixel values are scaled for the classifier:
+#   raw       - 0..255 floats (Keras MobileNetV3 rescales inside the model)
+#   unit      - 0..1
+#   symmetric - -1..1 (exported MobileNet graphs without the rescaling layer)
+NORMALIZATION_MODES = ('raw', 'unit', 'symmetric')
+
+def clamp_bbox(bbox: Optional[Dict[str, int]], width: int, height: int) -> tuple:
+    """Clip a detection box to the image; fall back to the whole image if it is empty"""
+    if not bbox:
+        return 0, 0, width, height
+    x1 = min(max(int(bbox.get('x1', 0)), 0), width)
+    y1 = min(max(int(bbox.get('y1', 0)), 0), height)
+    x2 = min(max(int(bbox.get('x2', width)), 0), width)
+    y2 = min(max(int(bbox.get('y2', height)), 0), height)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return 0, 0, width, height
+    return x1, y1, x2, y2
+
+def _letterbox_into(crop: np.ndarray, dst: np.ndarray):
+    """Resize keeping aspect ratio and pad the rest of dst with black"""
+    size = dst.shape[0]
+    height, width = crop.shape[:2]
+    scale = size / max(height, width)
+    new_w, new_h = max(1, round(width * scale)), max(1, round(height * scale))
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    dst[...] = 0
+    cv2.resize(crop, (new_w, new_h), dst=dst[top:top + new_h, left:left + new_w],
+               interpolation=cv2.INTER_AREA)
+
+def preprocess_crops(images: Sequence[np.ndarray], bboxes: Sequence[Optional[Dict[str, int]]],
+                     size: int = CLASSIFIER_INPUT_SIZE, normalization: str = 'raw',
+                     letterbox: bool = False, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Build the classifier input batch for N BGR images and their boxes
+
+    Crops are taken as views (no copy) and resized with INTER_AREA straight
+    into one uint8 staging batch; the BGR→RGB swap, float conversion and
+    normalization then happen in a single vectorized pass into ``out``.
+
+    Returns:
+        np.ndarray: (N, size, size, 3) float32 RGB batch
+    """
+    if normalization not in NORMALIZATION_MODES:
+        raise ValueError(f"Unknown normalization '{normalization}', expected one of {NORMALIZATION_MODES}")
+
+    count = len(images)
+    if out is None:
+        out = np.empty((count, size, size, 3), dtype=np.float32)
+    staging = np.empty((count, size, size, 3), dtype=np.uint8)
+
+    for index, (image, bbox) in enumerate(zip(images, bboxes)):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = clamp_bbox(bbox, width, height)
+        crop = image[y1:y2, x1:x2, :3]
+        if letterbox:
+            _letterbox_into(crop, staging[index])
+        else:
+            cv2.resize(crop, (size, size), dst=staging[index], interpolation=cv2.INTER_AREA)
+
+    # BGR → RGB and uint8 → float32 in one pass over the whole batch
+    np.copyto(out, staging[..., ::-1], casting='unsafe')
+    if normalization == 'unit':
+        out *= 1.0 / 255.0
+    elif normalization == 'symmetric':
+        out *= 2.0 / 255.0
+        out -= 1.0
+    return out
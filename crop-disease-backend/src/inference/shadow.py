@@ -0,0 +1,113 @@
+"""
+Shadow evaluation: mirror sampled classifier batches to a candidate model
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class ShadowEvaluator:
+    """Runs a candidate classifier on a sample of live batches, off the request path.
+
+    Clients always get the primary model's answer; the candidate's output is
+    only compared with it. Shadow work runs on its own single thread and is
+    dropped (and counted) when more than ``max_pending`` batches are waiting,
+    so a slow candidate cannot build up an unbounded backlog.
+    """
+
+    def __init__(self, candidate, version: str, sample_rate: Optional[float] = None,
+                 max_pending: Optional[int] = None, window: int = 1000):
+        self.candidate = candidate
+        self.version = version
+        self.sample_rate = sample_rate if sample_rate is not None \
+            else float(os.environ.get('SHADOW_SAMPLE_RATE', '0.1'))
+        self.max_pending = max_pending if max_pending is not None \
+            else int(os.environ.get('SHADOW_MAX_PENDING', '4'))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stopped = False
+
+        # Per-image latencies of the most recent mirrored batches
+        self._primary_ms = deque(maxlen=window)
+        self._candidate_ms = deque(maxlen=window)
+
+        # Counters for monitoring
+        self.batches = 0
+        self.images = 0
+        self.agreements = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def maybe_submit(self, batch: np.ndarray, primary_probabilities: np.ndarray, primary_ms: float):
+        """Mirror this batch to the candidate if it is sampled and there is room"""
+        if random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            # After stop() the executor refuses work; count the batch as dropped instead
+            if self._stopped or self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+        self._executor.submit(self._evaluate, batch, np.asarray(primary_probabilities), primary_ms)
+
+    def _evaluate(self, batch: np.ndarray, primary_probabilities: np.ndarray, primary_ms: float):
+        try:
+            start = time.perf_counter()
+            candidate_probabilities = np.asarray(self.candidate.predict(batch))
+            candidate_ms = (time.perf_counter() - start) * 1000
+            agreed = int(np.sum(np.argmax(primary_probabilities, axis=1) == np.argmax(candidate_probabilities, axis=1)))
+            with self._lock:
+                self.batches += 1
+                self.images += len(batch)
+                self.agreements += agreed
+                self._primary_ms.append(primary_ms / len(batch))
+                self._candidate_ms.append(candidate_ms / len(batch))
+        except Exception as e:
+            logger.warning(f"Shadow model {self.version} failed: {str(e)}")
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                if not self._stopped:  # stop() already reset the count
+                    self._pending -= 1
+
+    @staticmethod
+    def _percentiles(samples) -> dict:
+        if not samples:
+            return {"p50": None, "p95": None}
+        p50, p95 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95])
+        return {"p50": round(float(p50), 3), "p95": round(float(p95), 3)}
+
+    def get_stats(self) -> dict:
+        """Agreement and latency comparison for monitoring"""
+        with self._lock:
+            return {
+                "version": self.version,
+                "sample_rate": self.sample_rate,
+                "batches": self.batches,
+                "images": self.images,
+                "top1_agreement": round(self.agreements / self.images, 4) if self.images else None,
+                "primary_ms_per_image": self._percentiles(self._primary_ms),
+                "candidate_ms_per_image": self._percentiles(self._candidate_ms),
+                "pending": self._pending,
+                "dropped": self.dropped,
+                "errors": self.errors
+            }
+
+    def stop(self):
+        """Stop mirroring; queued shadow batches are discarded"""
+        with self._lock:
+            self._stopped = True
+            # Cancelled batches never reach the finally in _evaluate
+            self._pending = 0
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,190 @@
+"""
+Classifier runtime backends: Keras, ONNX Runtime and INT8 TFLite
+"""
+
+import hashlib
+import logging
+import os
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from src.models.export_cache import export_once
+
+logger = logging.getLogger(__name__)
+
+CLASSIFIER_BACKENDS = ('keras', 'onnx', 'tflite')
+
+class ClassifierBackend:
+    """Runs the disease classifier on a (N, 224, 224, 3) float32 batch of raw 0-255 RGB pixels"""
+
+    name = "base"
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Return (N, num_classes) class probabilities"""
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name}>"
+
+class KerasBackend(ClassifierBackend):
+    """The in-memory Keras model, called directly (cheaper than Model.predict for small batches)"""
+
+    name = "keras"
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model(batch, training=False))
+
+class ONNXRuntimeBackend(ClassifierBackend):
+    """Exported graph executed by ONNX Runtime's CPU provider"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or int(os.environ.get('TF_NUM_INTRAOP_THREADS', '2'))
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+class TFLiteBackend(ClassifierBackend):
+    """INT8-quantized TFLite model; float input is quantized with the model's own scale"""
+
+    name = "tflite"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(
+            model_path=model_path,
+            num_threads=num_threads or int(os.environ.get('TF_NUM_INTRAOP_THREADS', '2'))
+        )
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input_details['shape'][0])
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        if batch.shape[0] != self._batch_size:
+            self.interpreter.resize_tensor_input(self.input_details['index'], batch.shape)
+            self.interpreter.allocate_tensors()
+            self.input_details = self.interpreter.get_input_details()[0]
+            self.output_details = self.interpreter.get_output_details()[0]
+            self._batch_size = batch.shape[0]
+
+        input_dtype = self.input_details['dtype']
+        if input_dtype in (np.int8, np.uint8):
+            scale, zero_point = self.input_details['quantization']
+            info = np.iinfo(input_dtype)
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(input_dtype)
+        self.interpreter.set_tensor(self.input_details['index'], batch)
+        self.interpreter.invoke()
+
+        output = self.interpreter.get_tensor(self.output_details['index'])
+        if self.output_details['dtype'] in (np.int8, np.uint8):
+            scale, zero_point = self.output_details['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+def export_onnx(keras_model, output_path: str, opset: int = 13) -> str:
+    """Export a Keras model to ONNX (requires tf2onnx)"""
+    import tensorflow as tf
+    import tf2onnx
+
+    input_shape = keras_model.input_shape[1:]
+    signature = (tf.TensorSpec((None,) + tuple(input_shape), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=opset, output_path=output_path)
+    logger.info(f"Exported ONNX classifier to {output_path}")
+    return output_path
+
+def export_tflite_int8(keras_model, output_path: str,
+                       representative_data: Optional[Callable[[], Iterable[np.ndarray]]] = None) -> str:
+    """Export a Keras model to a fully INT8-quantized TFLite flatbuffer"""
+    import tensorflow as tf
+
+    input_shape = keras_model.input_shape[1:]
+    if representative_data is None:
+        def representative_data():
+            # Calibration fallback: random pixels spanning the input range
+            rng = np.random.default_rng(0)
+            for _ in range(32):
+                yield [rng.uniform(0, 255, (1,) + tuple(input_shape)).astype(np.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_data
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    logger.info(f"Exported INT8 TFLite classifier to {output_path}")
+    return output_path
+
+def weights_fingerprint(keras_model) -> str:
+    """Short hash of the model weights, so cached exports track the weights they came from"""
+    digest = hashlib.blake2b(digest_size=6)
+    for weights in keras_model.get_weights():
+        digest.update(np.ascontiguousarray(weights).tobytes())
+    return digest.hexdigest()
+
+def create_classifier_backend(kind: str, keras_model, cache_dir: Optional[str] = None,
+                              representative_data: Optional[Callable[[], Iterable[np.ndarray]]] = None
+                              ) -> ClassifierBackend:
+    """
+    Build the configured classifier backend
+
+    Exported artifacts are cached in ``cache_dir`` (MODEL_CACHE_DIR, default
+    "models/") under a fingerprint of the weights and reused on later
+    starts, so export is a one-time cost per set of weights.
+    """
+    kind = kind.lower()
+    if kind not in CLASSIFIER_BACKENDS:
+        raise ValueError(f"Unknown classifier backend '{kind}', expected one of {CLASSIFIER_BACKENDS}")
+    if kind == 'keras':
+        return KerasBackend(keras_model)
+
+    cache_dir = cache_dir or os.environ.get('MODEL_CACHE_DIR', 'models')
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = weights_fingerprint(keras_model)
+
+    # Workers starting together export once; the rest wait and load the published file
+    if kind == 'onnx':
+        path = os.path.join(cache_dir, f'classifier-{fingerprint}.onnx')
+        export_once(path, lambda staging: export_onnx(keras_model, staging))
+        return ONNXRuntimeBackend(path)
+
+    path = os.path.join(cache_dir, f'classifier-{fingerprint}-int8.tflite')
+    export_once(path, lambda staging: export_tflite_int8(keras_model, staging, representative_data))
+    return TFLiteBackend(path)
+
+def classifier_from_artifact(artifact) -> ClassifierBackend:
+    """Build a classifier from a verified registry artifact (TFLite maps the file instead of reading it)"""
+    if artifact.backend == 'keras':
+        import tensorflow as tf
+        return KerasBackend(tf.keras.models.load_model(artifact.path, compile=False))
+    if artifact.backend == 'onnx':
+        return ONNXRuntimeBackend(artifact.path)
+    if artifact.backend == 'tflite':
+        return TFLiteBackend(artifact.path)
+    raise ValueError(f"Unknown classifier backend '{artifact.backend}' for {artifact!r}")
+
+def top1_agreement(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Fraction of rows whose arg-max class matches between two probability batches"""
+    if len(reference) == 0:
+        return 1.0
+    return float(np.mean(np.argmax(reference, axis=1) == np.argmax(candidate, axis=1)))
@@ -0,0 +1,370 @@
+"""
+Detector runtime backends: Ultralytics (PyTorch), ONNX Runtime and OpenVINO
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from src.models.export_cache import export_lock
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_BACKENDS = ('ultralytics', 'onnx', 'openvino')
+
+# Precisions each exported backend can be built with
+DETECTOR_PRECISIONS = {
+    'ultralytics': ('fp32',),
+    'onnx': ('fp32', 'int8'),
+    'openvino': ('fp32', 'fp16', 'int8'),
+}
+
+DETECTOR_INPUT_SIZE = 640
+LETTERBOX_FILL = 114
+
+class Detections:
+    """Detector output for one image, in original image pixel coordinates"""
+
+    __slots__ = ('boxes', 'scores', 'class_ids')
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray):
+        self.boxes = boxes          # (N, 4) float32 x1, y1, x2, y2
+        self.scores = scores        # (N,) float32
+        self.class_ids = class_ids  # (N,) int64
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64))
+
+def xywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+    """Center x, y, width, height → corner coordinates for an (N, 4) array"""
+    half = boxes[:, 2:4] / 2
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float,
+        max_detections: Optional[int] = None) -> np.ndarray:
+    """Greedy non-maximum suppression; returns kept indices, highest score first"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = np.argsort(scores)[::-1]
+    keep = []
+    while order.size and (max_detections is None or len(keep) < max_detections):
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        # IoU of the best box against every remaining box at once
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        overlap = width * height
+        iou = overlap / (areas[best] + areas[rest] - overlap + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray,
+                iou_threshold: float, max_detections: Optional[int] = None) -> np.ndarray:
+    """Per-class NMS in one pass by shifting each class into its own coordinate range"""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = class_ids[:, None].astype(boxes.dtype) * (boxes.max() + 1)
+    return nms(boxes + offsets, scores, iou_threshold, max_detections)
+
+def letterbox_batch(images: Sequence[np.ndarray], size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Letterbox BGR images into one (N, 3, size, size) float32 RGB 0-1 batch
+
+    Returns the batch and an (N, 3) array of (scale, pad_x, pad_y) used to map
+    boxes back to each original image.
+    """
+    staging = np.full((len(images), size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    transforms = np.empty((len(images), 3), dtype=np.float32)
+    for index, image in enumerate(images):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        scale = min(size / height, size / width)
+        new_w, new_h = max(1, round(width * scale)), max(1, round(height * scale))
+        left, top = (size - new_w) // 2, (size - new_h) // 2
+        cv2.resize(image[..., :3], (new_w, new_h), dst=staging[index, top:top + new_h, left:left + new_w],
+                   interpolation=cv2.INTER_LINEAR)
+        transforms[index] = (scale, left, top)
+
+    # BGR → RGB, NHWC → NCHW and scaling to 0-1 over the whole batch at once
+    batch = np.ascontiguousarray(staging[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+    batch *= 1.0 / 255.0
+    return batch, transforms
+
+def postprocess_yolo(output: np.ndarray, transforms: np.ndarray, image_shapes: Sequence[Tuple[int, int]],
+                     conf_threshold: float, iou_threshold: float, max_detections: int = 300) -> List[Detections]:
+    """
+    Decode raw YOLOv8 output of shape (N, 4 + num_classes, anchors)
+
+    Boxes are filtered by confidence, converted to xyxy, suppressed per class
+    and mapped back from the letterboxed input to original pixels.
+    """
+    results = []
+    for prediction, (scale, pad_x, pad_y), (height, width) in zip(output, transforms, image_shapes):
+        prediction = prediction.T  # (anchors, 4 + num_classes)
+        class_scores = prediction[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        mask = scores > conf_threshold
+        if not mask.any():
+            results.append(Detections.empty())
+            continue
+
+        boxes = xywh_to_xyxy(prediction[mask, :4].astype(np.float32))
+        scores, class_ids = scores[mask].astype(np.float32), class_ids[mask].astype(np.int64)
+        keep = batched_nms(boxes, scores, class_ids, iou_threshold, max_detections)
+
+        boxes = boxes[keep]
+        boxes -= (pad_x, pad_y, pad_x, pad_y)
+        boxes /= scale
+        np.clip(boxes, 0, (width, height, width, height), out=boxes)
+        results.append(Detections(boxes, scores[keep], class_ids[keep]))
+    return results
+
+class DetectorBackend:
+    """Runs the object detector on a list of BGR images"""
+
+    name = "base"
+
+    def __init__(self, names: Dict[int, str]):
+        self.names = names
+
+    def detect(self, images: List[np.ndarray]) -> List[Detections]:
+        """Return one Detections per image"""
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name}>"
+
+class UltralyticsBackend(DetectorBackend):
+    """Eager PyTorch model through the Ultralytics API (NMS done by Ultralytics)"""
+
+    name = "ultralytics"
+
+    def __init__(self, model, conf_threshold: float = 0.25, iou_threshold: float = 0.45):
+        super().__init__(model.names)
+        self.model = model
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def detect(self, images: List[np.ndarray]) -> List[Detections]:
+        results = self.model(images, conf=self.conf_threshold, iou=self.iou_threshold, verbose=False)
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                detections.append(Detections.empty())
+                continue
+            # Whole tensors at once instead of walking boxes one by one
+            detections.append(Detections(
+                boxes.xyxy.cpu().numpy().astype(np.float32),
+                boxes.conf.cpu().numpy().astype(np.float32),
+                boxes.cls.cpu().numpy().astype(np.int64)
+            ))
+        return detections
+
+class _ExportedBackend(DetectorBackend):
+    """Shared letterbox → forward → NumPy post-processing for exported graphs"""
+
+    def __init__(self, names: Dict[int, str], input_size: int, conf_threshold: float, iou_threshold: float):
+        super().__init__(names)
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def detect(self, images: List[np.ndarray]) -> List[Detections]:
+        batch, transforms = letterbox_batch(images, self.input_size)
+        output = self._forward(batch)
+        shapes = [image.shape[:2] for image in images]
+        return postprocess_yolo(output, transforms, shapes, self.conf_threshold, self.iou_threshold)
+
+class ONNXDetectorBackend(_ExportedBackend):
+    """Exported YOLOv8 graph executed by ONNX Runtime's CPU provider"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, names: Dict[int, str], input_size: int = DETECTOR_INPUT_SIZE,
+                 conf_threshold: float = 0.25, iou_threshold: float = 0.45, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        super().__init__(names, input_size, conf_threshold, iou_threshold)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or int(os.environ.get('TORCH_NUM_THREADS', '2'))
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+class OpenVINODetectorBackend(_ExportedBackend):
+    """Exported YOLOv8 IR compiled for the OpenVINO CPU plugin"""
+
+    name = "openvino"
+
+    def __init__(self, model_dir: str, names: Dict[int, str], input_size: int = DETECTOR_INPUT_SIZE,
+                 conf_threshold: float = 0.25, iou_threshold: float = 0.45, num_threads: Optional[int] = None):
+        import openvino as ov
+
+        super().__init__(names, input_size, conf_threshold, iou_threshold)
+        core = ov.Core()
+        # Weights are mapped from the .bin file, so processes share the pages
+        core.set_property({'ENABLE_MMAP': True})
+        xml_path = next(os.path.join(model_dir, f) for f in os.listdir(model_dir) if f.endswith('.xml'))
+        config = {
+            'INFERENCE_NUM_THREADS': num_threads or int(os.environ.get('TORCH_NUM_THREADS', '2')),
+            'PERFORMANCE_HINT': 'LATENCY'
+        }
+        self.compiled = core.compile_model(core.read_model(xml_path), 'CPU', config)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled(batch)[0]
+
+def _file_fingerprint(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=6)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _pin_onnx_input(model_path: str, input_size: int):
+    """Fix the graph's height and width; Ultralytics' dynamic=True leaves all of N, H, W dynamic"""
+    import onnx
+
+    model = onnx.load(model_path)
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    dims[2].dim_value = input_size
+    dims[3].dim_value = input_size
+    onnx.save(model, model_path)
+
+def _pin_openvino_input(model_dir: str, output_dir: str, input_size: int, precision: str):
+    """Save the IR in ``model_dir`` to ``output_dir`` with only the batch dimension dynamic"""
+    import openvino as ov
+
+    xml_name = next(f for f in os.listdir(model_dir) if f.endswith('.xml'))
+    model = ov.Core().read_model(os.path.join(model_dir, xml_name))
+    model.reshape(ov.PartialShape([-1, 3, input_size, input_size]))
+    os.makedirs(output_dir)
+    ov.save_model(model, os.path.join(output_dir, xml_name), compress_to_fp16=precision == 'fp16')
+
+def export_detector(weights_path: str, kind: str, output_path: str, input_size: int = DETECTOR_INPUT_SIZE,
+                    precision: str = 'fp32') -> str:
+    """
+    Export YOLOv8 weights to ONNX or OpenVINO with a fixed square input (requires ultralytics)
+
+    Only the batch dimension stays dynamic, so the micro-batcher can send any
+    number of images. Processes sharing ``output_path`` export it once: the
+    first holds the export lock while the rest wait, and the model and then
+    its metadata file are moved into place with os.replace, so the metadata
+    file only ever marks a complete export.
+    """
+    with export_lock(output_path):
+        if os.path.exists(f"{output_path}.json"):
+            return output_path  # exported by another process while this one waited
+
+        from ultralytics import YOLO
+
+        work_dir = tempfile.mkdtemp(prefix='.export-', dir=os.path.dirname(output_path) or '.')
+        try:
+            # Ultralytics writes exports next to the weights (and downloads
+            # named weights to the given path), so work on a private copy
+            local_weights = os.path.join(work_dir, os.path.basename(weights_path))
+            if os.path.exists(weights_path):
+                shutil.copyfile(weights_path, local_weights)
+            model = YOLO(local_weights)
+
+            if kind == 'onnx':
+                staged = model.export(format='onnx', imgsz=input_size, dynamic=True, simplify=True)
+                _pin_onnx_input(staged, input_size)
+                if precision == 'int8':
+                    from onnxruntime.quantization import QuantType, quantize_dynamic
+                    quantized = os.path.join(work_dir, 'int8.onnx')
+                    quantize_dynamic(staged, quantized, weight_type=QuantType.QUInt8)
+                    staged = quantized
+            else:
+                exported = model.export(format='openvino', imgsz=input_size, dynamic=True,
+                                        half=precision == 'fp16', int8=precision == 'int8')
+                staged = os.path.join(work_dir, 'pinned')
+                _pin_openvino_input(exported, staged, input_size, precision)
+
+            if os.path.isdir(output_path):
+                # Leftover from an interrupted export (the metadata file is written last)
+                shutil.rmtree(output_path)
+            os.replace(staged, output_path)
+
+            metadata_path = os.path.join(work_dir, 'metadata.json')
+            with open(metadata_path, 'w') as f:
+                json.dump({'names': model.names, 'input_size': input_size, 'precision': precision}, f)
+            os.replace(metadata_path, f"{output_path}.json")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info(f"Exported {precision} {kind} detector to {output_path}")
+    return output_path
+
+def create_detector_backend(kind: str, weights_path: str, cache_dir: Optional[str] = None,
+                            input_size: Optional[int] = None, precision: Optional[str] = None,
+                            conf_threshold: float = 0.25, iou_threshold: float = 0.45) -> DetectorBackend:
+    """
+    Build the configured detector backend
+
+    Exports are cached in ``cache_dir`` (MODEL_CACHE_DIR) under a fingerprint
+    of the weights file, input size and precision. A cached export is loaded
+    without importing Ultralytics or PyTorch at all.
+    """
+    kind = kind.lower()
+    if kind not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{kind}', expected one of {DETECTOR_BACKENDS}")
+    precision = (precision or os.environ.get('DETECTOR_PRECISION', 'fp32')).lower()
+    if precision not in DETECTOR_PRECISIONS[kind]:
+        raise ValueError(f"Detector backend '{kind}' supports {DETECTOR_PRECISIONS[kind]}, not '{precision}'")
+
+    if kind == 'ultralytics':
+        from ultralytics import YOLO
+        return UltralyticsBackend(YOLO(weights_path), conf_threshold, iou_threshold)
+
+    input_size = input_size or int(os.environ.get('DETECTOR_INPUT_SIZE', str(DETECTOR_INPUT_SIZE)))
+    cache_dir = cache_dir or os.environ.get('MODEL_CACHE_DIR', 'models')
+    os.makedirs(cache_dir, exist_ok=True)
+    # Weights that Ultralytics has yet to download are keyed by name until they exist
+    fingerprint = _file_fingerprint(weights_path) if os.path.exists(weights_path) \
+        else os.path.splitext(os.path.basename(weights_path))[0]
+    stem = f"detector-{fingerprint}-{input_size}-{precision}"
+    path = os.path.join(cache_dir, f"{stem}.onnx" if kind == 'onnx' else f"{stem}_openvino_model")
+    if not os.path.exists(f"{path}.json"):
+        export_detector(weights_path, kind, path, input_size, precision)
+
+    with open(f"{path}.json") as f:
+        metadata = json.load(f)
+    names = {int(class_id): name for class_id, name in metadata['names'].items()}
+    backend_class = ONNXDetectorBackend if kind == 'onnx' else OpenVINODetectorBackend
+    return backend_class(path, names, input_size, conf_threshold, iou_threshold)
+
+def detector_from_artifact(artifact, conf_threshold: float = 0.25, iou_threshold: float = 0.45) -> DetectorBackend:
+    """Build a detector from a verified registry artifact (never exports or downloads)"""
+    if artifact.backend == 'ultralytics':
+        from ultralytics import YOLO
+        return UltralyticsBackend(YOLO(artifact.path), conf_threshold, iou_threshold)
+
+    names = {int(class_id): name for class_id, name in artifact.metadata.get('names', {}).items()}
+    input_size = int(artifact.input_shape[0]) if artifact.input_shape else DETECTOR_INPUT_SIZE
+    if artifact.backend == 'onnx':
+        return ONNXDetectorBackend(artifact.path, names, input_size, conf_threshold, iou_threshold)
+    if artifact.backend == 'openvino':
+        return OpenVINODetectorBackend(artifact.path, names, input_size, conf_threshold, iou_threshold)
+    raise ValueError(f"Unknown detector backend '{artifact.backend}' for {artifact!r}")
@@ -0,0 +1,51 @@
+"""
+Cross-process safety for exported models cached in MODEL_CACHE_DIR
+
+Several processes (engine workers, pre-fork workers, replicas sharing a
+volume) can start at once and find the same export missing. The export runs
+under an exclusive lock on ``<path>.lock``, is written to a private staging
+path and only then renamed into place with ``os.replace``, so other
+processes either wait for it or see a complete file, never a partial one.
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, publishing is still atomic
+    fcntl = None
+
+@contextmanager
+def export_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive lock for exporting ``path``, shared with every other process"""
+    with open(f"{path}.lock", 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def staging_path(path: str) -> str:
+    """Sibling of ``path`` private to this process (same directory, so os.replace is atomic)"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+
+def export_once(path: str, export: Callable[[str], object]) -> str:
+    """Run ``export(staging)`` and publish the result as ``path``, unless some process already has"""
+    if os.path.exists(path):
+        return path
+    with export_lock(path):
+        if os.path.exists(path):
+            return path  # exported by another process while this one waited
+        staging = staging_path(path)
+        try:
+            export(staging)
+            os.replace(staging, path)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+    return path
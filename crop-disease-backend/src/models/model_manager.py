@@ -4,19 +4,41 @@ Model Manager - Handles loading and management of pre-trained models
 
 import asyncio
 import logging
-from typing import Optional, Dict, Any
-import tensorflow as tf
-from ultralytics import YOLO
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Optional, Dict, Any
 import numpy as np
 
+from src.models.backends import ClassifierBackend, KerasBackend, classifier_from_artifact, create_classifier_backend
+from src.models.detectors import DetectorBackend, create_detector_backend, detector_from_artifact
+from src.models.registry import ModelRegistry, ModelRegistryError
+from src.inference.shadow import ShadowEvaluator
+
+if TYPE_CHECKING:
+    # TensorFlow and Ultralytics are imported only when models are loaded
+    import tensorflow as tf
+    from ultralytics import YOLO
+
 logger = logging.getLogger(__name__)
 
 class ModelManager:
     """Manages loading and access to pre-trained models"""
     
     def __init__(self):
-        self.yolo_model: Optional[YOLO] = None
-        self.mobilenet_model: Optional[tf.keras.Model] = None
+        self.yolo_model: Optional["YOLO"] = None
+        self.mobilenet_model: Optional["tf.keras.Model"] = None
+        # Runtime used for detection (DETECTOR_BACKEND: ultralytics, onnx or openvino)
+        self.detector: Optional[DetectorBackend] = None
+        # Runtime used for classification (CLASSIFIER_BACKEND: keras, onnx or tflite)
+        self.classifier: Optional[ClassifierBackend] = None
+        # Registry versions in use, e.g. {"detector": "yolov8n-2024.1"}
+        self.model_versions: Dict[str, str] = {}
+        # Candidate classifier receiving mirrored traffic, if any
+        self.shadow: Optional[ShadowEvaluator] = None
+        # Last background reload per model name, for the admin API
+        self.reload_status: Dict[str, Dict[str, Any]] = {}
+        self._swap_lock = threading.Lock()
         self._ready = False
         
         # Disease mapping for MobileNetV3 (plant village dataset classes)
@@ -79,19 +101,28 @@ class ModelManager:
     
     async def initialize_models(self) -> bool:
         """Load all pre-trained models asynchronously"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.load_models)
+    
+    def load_models(self) -> bool:
+        """Load all pre-trained models (blocking; imports the ML frameworks on first use)"""
         try:
-            logger.info("Initializing model manager with real models...")
+            registry = ModelRegistry()
+            if registry.exists():
+                return self._load_from_registry(registry)
             
-            # Load YOLOv8 model for object detection
-            from ultralytics import YOLO
-            import os
+            logger.info("Initializing model manager with real models...")
+            logger.warning(f"No model registry at {registry.root}; models may be downloaded")
             
+            # Load YOLOv8 model for object detection (Ultralytics is only
+            # imported if the configured detector backend needs it)
             # Check if yolov8n.pt exists, if not it will be downloaded automatically
             model_path = os.path.join(os.path.dirname(__file__), "..", "..", "yolov8n.pt")
             if not os.path.exists(model_path):
                 model_path = "yolov8n.pt"  # Will trigger auto-download
             
-            self.yolo_model = YOLO(model_path)
+            self.detector = self._create_detector(model_path)
+            # The eager PyTorch model, when that is what serves detection
+            self.yolo_model = getattr(self.detector, 'model', None)
             
             # For the MobileNetV3 model, we'll create a basic model structure
             # In a real implementation, you'd load a pre-trained plant disease classifier
@@ -107,17 +138,23 @@ class ModelManager:
             x = Dense(128, activation='relu')(x)
             predictions = Dense(len(self.disease_classes), activation='softmax')(x)  # Use actual number of classes
             self.mobilenet_model = Model(inputs=base_model.input, outputs=predictions)
+            self.classifier = self._create_classifier(self.mobilenet_model)
             
             # Mark as ready
             self._ready = True
             logger.info("Model manager initialized with real models!")
             return True
             
+        except ModelRegistryError:
+            # A configured registry that cannot be loaded is an error, not a demo
+            raise
         except ImportError as e:
             logger.warning(f"Model dependencies not available: {str(e)}, using dummy models")
             # Fall back to dummy models if dependencies are missing
             self.yolo_model = "dummy_yolo_model"
+            self.detector = None
             self.mobilenet_model = "dummy_mobilenet_model"
+            self.classifier = None
             self._ready = True
             logger.info("Model manager initialized with dummy models!")
             return True
@@ -125,14 +162,147 @@ class ModelManager:
             logger.warning(f"Real model initialization failed: {str(e)}, falling back to dummy models")
             # Fall back to dummy models if real models fail to load
             self.yolo_model = "dummy_yolo_model"
+            self.detector = None
             self.mobilenet_model = "dummy_mobilenet_model"
+            self.classifier = None
             self._ready = True
             logger.info("Model manager initialized with dummy models!")
             return True
     
+    def _load_from_registry(self, registry: ModelRegistry) -> bool:
+        """Load checksum-verified local artifacts; never touches the network"""
+        logger.info(f"Initializing model manager from registry {registry.root}...")
+        os.environ.setdefault('YOLO_OFFLINE', 'True')
+        
+        detector_artifact = registry.get('detector')
+        classifier_artifact = registry.get('classifier')
+        
+        try:
+            self.detector = detector_from_artifact(detector_artifact)
+            self.yolo_model = getattr(self.detector, 'model', None)
+            self.classifier = classifier_from_artifact(classifier_artifact)
+            self.mobilenet_model = getattr(self.classifier, 'model', None)
+        except Exception as e:
+            raise ModelRegistryError(f"Failed to load registry models: {str(e)}") from e
+        self.model_versions = {
+            'detector': detector_artifact.version,
+            'classifier': classifier_artifact.version
+        }
+        
+        self._ready = True
+        logger.info(f"Model manager initialized from registry: {self.model_versions}")
+        return True
+    
+    def _load_candidate(self, name: str, version: Optional[str], status: Dict[str, Any]):
+        """Load and warm a registry version without touching what is being served"""
+        from src.utils.cpu_optimizer import cpu_engine
+        
+        if name not in ('detector', 'classifier'):
+            raise ModelRegistryError(f"Unknown model '{name}', expected detector or classifier")
+        registry = ModelRegistry()
+        if not registry.exists():
+            raise ModelRegistryError(f"No model registry at {registry.root}")
+        
+        artifact = registry.get(name, version)
+        status["version"] = artifact.version
+        started = time.perf_counter()
+        backend = detector_from_artifact(artifact) if name == 'detector' else classifier_from_artifact(artifact)
+        status["load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        status["state"] = "warming"
+        warmup = cpu_engine.warmup_backends(**{name: backend})
+        if not warmup["completed"]:
+            raise ModelRegistryError(f"Warmup of {artifact!r} failed: {warmup['error']}")
+        status["warmup_ms"] = warmup["total_ms"]
+        return backend, artifact.version
+    
+    def reload_model(self, name: str, version: Optional[str] = None) -> Dict[str, Any]:
+        """Load, warm and atomically swap in a registry version (blocking; run off the event loop)
+        
+        The pipeline reads the backend once per batch, so batches already
+        running finish on the old model while new ones pick up the new one.
+        """
+        self.reload_status[name] = {"state": "loading", "version": version, "error": None}
+        try:
+            backend, version = self._load_candidate(name, version, self.reload_status[name])
+            self._swap(name, backend, version)
+            self.reload_status[name]["state"] = "swapped"
+        except Exception as e:
+            logger.error(f"Reload of {name} failed: {str(e)}")
+            self.reload_status[name].update(state="failed", error=str(e))
+        return self.reload_status[name]
+    
+    def _swap(self, name: str, backend, version: str):
+        with self._swap_lock:
+            previous = self.model_versions.get(name)
+            if name == 'detector':
+                self.detector = backend
+                self.yolo_model = getattr(backend, 'model', None)
+            else:
+                self.classifier = backend
+                self.mobilenet_model = getattr(backend, 'model', None)
+            self.model_versions[name] = version
+        logger.info(f"Swapped {name} {previous} -> {version}")
+    
+    @property
+    def cache_version(self) -> str:
+        """Served model versions as one string, so cached predictions are tied to the models that made them"""
+        return ','.join(f"{name}={version}" for name, version in sorted(self.model_versions.items()))
+    
+    def start_shadow(self, version: Optional[str] = None, sample_rate: Optional[float] = None) -> Dict[str, Any]:
+        """Load a candidate classifier and mirror a sample of traffic to it"""
+        backend, version = self._load_candidate('classifier', version, {})
+        shadow = ShadowEvaluator(backend, version, sample_rate)
+        previous, self.shadow = self.shadow, shadow
+        if previous is not None:
+            previous.stop()
+        logger.info(f"Shadowing classifier {version} at sample rate {shadow.sample_rate}")
+        return shadow.get_stats()
+    
+    def stop_shadow(self) -> Optional[Dict[str, Any]]:
+        """Stop mirroring and return the final comparison"""
+        shadow, self.shadow = self.shadow, None
+        if shadow is None:
+            return None
+        shadow.stop()
+        return shadow.get_stats()
+    
+    def promote_shadow(self) -> Dict[str, Any]:
+        """Serve the shadowed candidate; it is already warm"""
+        shadow = self.shadow
+        if shadow is None:
+            raise ModelRegistryError("No shadow model to promote")
+        self._swap('classifier', shadow.candidate, shadow.version)
+        return self.stop_shadow()
+    
+    def _create_detector(self, weights_path: str) -> DetectorBackend:
+        """Build the configured detector backend, falling back to Ultralytics"""
+        backend = os.environ.get('DETECTOR_BACKEND', 'ultralytics')
+        try:
+            detector = create_detector_backend(backend, weights_path)
+        except Exception as e:
+            if backend == 'ultralytics':
+                raise
+            logger.warning(f"Detector backend '{backend}' unavailable: {str(e)}, using ultralytics")
+            detector = create_detector_backend('ultralytics', weights_path, precision='fp32')
+        logger.info(f"Detector backend: {detector.name}")
+        return detector
+    
+    def _create_classifier(self, keras_model) -> ClassifierBackend:
+        """Build the configured classifier backend, falling back to Keras"""
+        backend = os.environ.get('CLASSIFIER_BACKEND', 'keras')
+        try:
+            classifier = create_classifier_backend(backend, keras_model)
+        except Exception as e:
+            logger.warning(f"Classifier backend '{backend}' unavailable: {str(e)}, using keras")
+            classifier = KerasBackend(keras_model)
+        logger.info(f"Classifier backend: {classifier.name}")
+        return classifier
+    
     def is_ready(self) -> bool:
         """Check if models are ready for inference"""
-        return self._ready and self.yolo_model is not None and self.mobilenet_model is not None
+        return self._ready and (self.detector is not None or self.yolo_model is not None) \
+            and (self.classifier is not None or self.mobilenet_model is not None)
     
     def get_disease_name(self, class_idx: int) -> str:
         """Convert class index to disease name"""
@@ -0,0 +1,222 @@
+"""
+Offline, versioned model artifact store
+
+A registry is a local directory holding model files plus a ``manifest.json``:
+
+    {"models": [
+        {"name": "detector", "version": "yolov8n-2024.1", "path": "detector/yolov8n-2024.1/yolov8n.onnx",
+         "sha256": "...", "input_shape": [640, 640, 3], "backend": "onnx", "metadata": {"names": {...}}},
+        ...
+    ]}
+
+Artifacts are checksum-verified before use and nothing is ever downloaded.
+Populate it on a machine with network access:
+
+    python -m src.models.registry register detector yolov8n-2024.1 yolov8n.pt --backend ultralytics --input-shape 640,640,3
+    python -m src.models.registry list
+    python -m src.models.registry verify
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+class ModelRegistryError(Exception):
+    """Missing, unknown or corrupt model artifact"""
+
+class ModelArtifact:
+    """One versioned model file (or directory) listed in the manifest"""
+
+    __slots__ = ('name', 'version', 'path', 'sha256', 'input_shape', 'backend', 'metadata')
+
+    def __init__(self, name: str, version: str, path: str, sha256: str,
+                 input_shape: Sequence[int], backend: str, metadata: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.version = version
+        self.path = path  # absolute
+        self.sha256 = sha256
+        self.input_shape = tuple(input_shape)
+        self.backend = backend
+        self.metadata = metadata or {}
+
+    def to_dict(self, root: str) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "path": os.path.relpath(self.path, root),
+            "sha256": self.sha256,
+            "input_shape": list(self.input_shape),
+            "backend": self.backend,
+            "metadata": self.metadata
+        }
+
+    def __repr__(self) -> str:
+        return f"<ModelArtifact {self.name}@{self.version} ({self.backend})>"
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read through a memory map so no heap copy is made"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            digest.update(mapped)
+    return digest.hexdigest()
+
+def artifact_sha256(path: str) -> str:
+    """Checksum of a file, or of every file in a directory artifact (e.g. OpenVINO IR)"""
+    if not os.path.isdir(path):
+        return file_sha256(path)
+    digest = hashlib.sha256()
+    for directory, _, files in sorted(os.walk(path)):
+        for filename in sorted(files):
+            file_path = os.path.join(directory, filename)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_sha256(file_path).encode())
+    return digest.hexdigest()
+
+class ModelRegistry:
+    """Reads and updates a manifest-described directory of model artifacts"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or os.environ.get('MODEL_REGISTRY_DIR', 'model_registry'))
+        self.manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        self._verified: Dict[str, str] = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def artifacts(self) -> List[ModelArtifact]:
+        """Every artifact in the manifest, in manifest order (oldest first)"""
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            raise ModelRegistryError(f"Unreadable manifest {self.manifest_path}: {str(e)}")
+
+        return [
+            ModelArtifact(
+                entry['name'], entry['version'], os.path.join(self.root, entry['path']), entry['sha256'],
+                entry.get('input_shape', ()), entry['backend'], entry.get('metadata')
+            )
+            for entry in manifest.get('models', [])
+        ]
+
+    def get(self, name: str, version: Optional[str] = None, verify: bool = True) -> ModelArtifact:
+        """
+        Resolve a model by name
+
+        ``version`` defaults to ``<NAME>_MODEL_VERSION`` from the environment,
+        then to the most recently registered version.
+        """
+        version = version or os.environ.get(f'{name.upper()}_MODEL_VERSION')
+        candidates = [artifact for artifact in self.artifacts() if artifact.name == name]
+        if version:
+            candidates = [artifact for artifact in candidates if artifact.version == version]
+        if not candidates:
+            wanted = f"{name}@{version}" if version else name
+            raise ModelRegistryError(f"Model {wanted} is not in registry {self.root}")
+
+        artifact = candidates[-1]
+        if verify:
+            self.verify(artifact)
+        return artifact
+
+    def verify(self, artifact: ModelArtifact):
+        """Raise ModelRegistryError unless the artifact on disk matches its checksum"""
+        if not os.path.exists(artifact.path):
+            raise ModelRegistryError(f"Artifact file missing for {artifact!r}: {artifact.path}")
+        if self._verified.get(artifact.path) == artifact.sha256:
+            return
+        actual = artifact_sha256(artifact.path)
+        if actual != artifact.sha256:
+            raise ModelRegistryError(f"Checksum mismatch for {artifact!r}: expected {artifact.sha256}, got {actual}")
+        self._verified[artifact.path] = actual
+        logger.info(f"Verified {artifact!r}")
+
+    def register(self, name: str, version: str, source: str, backend: str,
+                 input_shape: Sequence[int], metadata: Optional[Dict[str, Any]] = None) -> ModelArtifact:
+        """Copy a model file or directory into the registry and add it to the manifest"""
+        if any(a.name == name and a.version == version for a in self.artifacts()):
+            raise ModelRegistryError(f"Model {name}@{version} is already registered")
+
+        destination = os.path.join(self.root, name, version, os.path.basename(os.path.normpath(source)))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.isdir(source):
+            shutil.copytree(source, destination)
+        else:
+            shutil.copy2(source, destination)
+
+        artifact = ModelArtifact(name, version, destination, artifact_sha256(destination),
+                                 input_shape, backend, metadata)
+        self._write_manifest(self.artifacts() + [artifact])
+        logger.info(f"Registered {artifact!r}")
+        return artifact
+
+    def _write_manifest(self, artifacts: List[ModelArtifact]):
+        # Write-then-rename so a reader never sees a half-written manifest
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".manifest.")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"models": [artifact.to_dict(self.root) for artifact in artifacts]}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the local model registry")
+    parser.add_argument("--root", help="Registry directory (default: MODEL_REGISTRY_DIR or model_registry)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    register = commands.add_parser("register", help="Copy a model into the registry")
+    register.add_argument("name", help="Model role, e.g. detector or classifier")
+    register.add_argument("version")
+    register.add_argument("source", help="Model file or directory")
+    register.add_argument("--backend", required=True, help="ultralytics, onnx, openvino, keras or tflite")
+    register.add_argument("--input-shape", required=True, help="Comma-separated, e.g. 224,224,3")
+    register.add_argument("--metadata", help="JSON object stored with the entry (e.g. class names)")
+
+    commands.add_parser("list", help="Show registered models")
+    commands.add_parser("verify", help="Check every artifact against its checksum")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.root)
+    if args.command == "register":
+        try:
+            artifact = registry.register(
+                args.name, args.version, args.source, args.backend,
+                [int(dim) for dim in args.input_shape.split(',')],
+                json.loads(args.metadata) if args.metadata else None
+            )
+        except ModelRegistryError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        print(f"{artifact.name}@{artifact.version} {artifact.sha256}")
+        return 0
+
+    failures = 0
+    for artifact in registry.artifacts():
+        status = artifact.backend
+        if args.command == "verify":
+            try:
+                registry.verify(artifact)
+                status = "ok"
+            except ModelRegistryError as e:
+                status = f"FAILED: {str(e)}"
+                failures += 1
+        print(f"{artifact.name:<12} {artifact.version:<24} {'x'.join(map(str, artifact.input_shape)):<12} {status}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
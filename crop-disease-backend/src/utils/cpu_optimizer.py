@@ -3,9 +3,11 @@ CPU Optimization and Performance Tuning Configuration
 """
 
 import os
-import tensorflow as tf
+import time
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +16,24 @@ class CPUEngine:
     
     def __init__(self):
         self.thread_pool = None
+        self.process_pool = None
+        # Filled in by warmup_models; readiness waits for it
+        self.warmup_report: Optional[dict] = None
+        self._frameworks_configured = False
+    
+    def configure_frameworks(self):
+        """Import and tune TensorFlow / PyTorch; call before loading models, not at import time"""
+        if self._frameworks_configured:
+            return
         self._configure_tensorflow()
         self._configure_ultralytics()
+        self._frameworks_configured = True
     
     def _configure_tensorflow(self):
         """Configure TensorFlow for CPU optimization"""
         try:
+            import tensorflow as tf
+            
             # Set TensorFlow CPU threads
             cpu_threads = int(os.environ.get('TF_NUM_INTEROP_THREADS', '2'))
             intra_threads = int(os.environ.get('TF_NUM_INTRAOP_THREADS', '2'))
@@ -65,37 +79,137 @@ class CPUEngine:
             logger.info(f"Thread pool created with {max_workers} workers")
         return self.thread_pool
     
-    def warmup_models(self, model_manager):
-        """Warm up models with dummy inference to load weights into memory"""
+    def create_process_pool(self, max_workers: int = 2):
+        """Create process pool for model-free CPU work (image decoding)"""
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=max_workers)
+            logger.info(f"Process pool created with {max_workers} workers")
+        return self.process_pool
+    
+    def get_decode_executor(self):
+        """Executor for image decoding: process pool if INFERENCE_EXECUTOR=process"""
+        if os.environ.get('INFERENCE_EXECUTOR', 'thread').lower() == 'process':
+            return self.create_process_pool(int(os.environ.get('DECODE_PROCESSES', '2')))
+        return self.thread_pool
+    
+    def shutdown(self):
+        """Release executor threads and processes"""
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown(wait=False)
+            self.thread_pool = None
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False)
+            self.process_pool = None
+    
+    @staticmethod
+    def _warmup_batch_sizes() -> List[int]:
+        """WARMUP_BATCH_SIZES, or powers of two up to BATCH_MAX_SIZE plus the max itself"""
+        configured = os.environ.get('WARMUP_BATCH_SIZES')
+        if configured:
+            return sorted({int(size) for size in configured.split(',') if size.strip()})
+        max_size = max(1, int(os.environ.get('BATCH_MAX_SIZE', '8')))
+        sizes = {max_size}
+        size = 1
+        while size < max_size:
+            sizes.add(size)
+            size *= 2
+        return sorted(sizes)
+    
+    @staticmethod
+    def _warmup_input_shapes() -> List[Tuple[int, int]]:
+        """WARMUP_INPUT_SHAPES as WIDTHxHEIGHT pairs (default: landscape and portrait phone photos)"""
+        shapes = []
+        for shape in os.environ.get('WARMUP_INPUT_SHAPES', '640x480,480x640').split(','):
+            if shape.strip():
+                width, height = shape.lower().split('x')
+                shapes.append((int(width), int(height)))
+        return shapes
+    
+    def warmup_models(self, model_manager) -> dict:
+        """Warm up the models a ModelManager serves; readiness waits for the report"""
+        self.warmup_report = self.warmup_backends(
+            getattr(model_manager, 'detector', None),
+            getattr(model_manager, 'classifier', None)
+        )
+        return self.warmup_report
+    
+    def warmup_backends(self, detector=None, classifier=None) -> dict:
+        """Run synthetic batches through every configured batch size and input shape
+        
+        Each configuration runs twice: the first call pays graph tracing, JIT
+        and allocator warmup, the second shows the steady-state latency.
+        """
+        from src.inference.preprocessing import preprocess_crops
+        
+        batch_sizes = self._warmup_batch_sizes()
+        input_shapes = self._warmup_input_shapes()
+        runs = []
+        stage = None  # the stage running when warmup fails
+        
+        def timed(func, *args):
+            start = time.perf_counter()
+            func(*args)
+            return round((time.perf_counter() - start) * 1000, 2)
+        
+        start = time.perf_counter()
         try:
-            logger.info("Warming up models...")
-            
-            # Skip actual warmup due to numpy compatibility issues
-            # The models will be loaded lazily when first used
-            logger.info("Model warmup skipped due to compatibility issues")
-            
+            logger.info(f"Warming up models (batch sizes {batch_sizes}, input shapes {input_shapes})...")
+            rng = np.random.default_rng(0)
+            for width, height in input_shapes:
+                image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+                for batch_size in batch_sizes:
+                    images = [image] * batch_size
+                    if detector is not None:
+                        stage = "detector"
+                        runs.append({
+                            "stage": "detector",
+                            "batch_size": batch_size,
+                            "input_shape": f"{width}x{height}",
+                            "cold_ms": timed(detector.detect, images),
+                            "warm_ms": timed(detector.detect, images)
+                        })
+                    if classifier is not None:
+                        stage = "classifier"
+                        batch = preprocess_crops(images, [None] * batch_size)
+                        runs.append({
+                            "stage": "classifier",
+                            "batch_size": batch_size,
+                            "input_shape": f"{width}x{height}",
+                            "cold_ms": timed(classifier.predict, batch),
+                            "warm_ms": timed(classifier.predict, batch)
+                        })
+            error = None
         except Exception as e:
             logger.warning(f"Model warmup failed: {str(e)}")
+            error = str(e)
+        
+        total_ms = round((time.perf_counter() - start) * 1000, 2)
+        report = {
+            "completed": error is None,
+            "error": error,
+            "failed_stages": [stage] if error is not None and stage is not None else [],
+            "skipped_stages": [stage for stage, model in (("detector", detector), ("classifier", classifier))
+                               if model is None],
+            "total_ms": total_ms,
+            "batch_sizes": batch_sizes,
+            "input_shapes": [f"{width}x{height}" for width, height in input_shapes],
+            "runs": runs
+        }
+        logger.info(f"Model warmup finished in {total_ms} ms ({len(runs)} runs)")
+        return report
     
     def get_system_info(self) -> dict:
-        """Get system information for monitoring"""
-        import psutil
+        """Get system information for monitoring (latest background sample; never blocks)"""
         import platform
+        from src.utils.resources import resource_sampler
         
-        try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            
-            return {
-                "cpu_percent": cpu_percent,
-                "memory_percent": memory.percent,
-                "memory_available_gb": round(memory.available / (1024**3), 2),
-                "platform": platform.platform(),
-                "python_version": platform.python_version()
-            }
-        except Exception as e:
-            logger.error(f"Failed to get system info: {str(e)}")
-            return {}
+        sample = resource_sampler.latest()
+        return {
+            **(sample.to_dict() if sample is not None else {}),
+            "cpu_count": os.cpu_count(),
+            "platform": platform.platform(),
+            "python_version": platform.python_version()
+        }
 
 # Global CPU engine instance
 cpu_engine = CPUEngine()
\ No newline at end of file
@@ -1,62 +1,204 @@
 """
 Logging configuration for the crop disease detection API
+
+Records are handed to a queue on the calling thread and written by a
+background ``QueueListener``, so request handlers never wait on disk I/O.
+Files get one JSON object per line carrying the request ID (and any stage
+timings passed as ``extra``); INFO and DEBUG lines can be sampled. Each
+file has a single writing process: worker processes (pre-fork, inference
+engine, process pools) write their own files named with their PID, so
+rotation never races between processes.
 """
 
+import atexit
+import json
 import logging
 import logging.handlers
+import multiprocessing
 import os
-from datetime import datetime
+import queue
+import random
+import traceback
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
-def setup_logger(name: str, log_level: str = "INFO") -> logging.Logger:
-    """Setup logger with appropriate configuration"""
-    
+from src.utils.tracing import current_request_ids
+
+SERVICE_NAME = "crop-disease-backend"
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "request_ids"
+}
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, in the same shape as the Node backend's logs"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "message": record.getMessage(),
+            "service": SERVICE_NAME,
+            "logger": record.name
+        }
+        request_ids = getattr(record, "request_ids", None)
+        if request_ids:
+            if len(request_ids) == 1:
+                entry["request_id"] = request_ids[0]
+            else:
+                entry["request_ids"] = request_ids
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["stack"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records at or below INFO; warnings and errors always pass
+
+    Records of a request are kept or dropped together (the decision hashes
+    the request ID), so a sampled request's log lines stay complete.
+    """
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0:
+            return True
+        request_ids = getattr(record, "request_ids", None)
+        if request_ids:
+            return zlib.crc32(request_ids[0].encode()) / 0xFFFFFFFF < rate
+        return random.random() < rate
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID(s); must run on the logging thread, where the context lives"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_ids = current_request_ids()
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Prepares records cheaply: message and traceback are rendered, ``extra`` fields kept"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_QueueHandler] = None
+
+def _file_handlers(suffix: str = "", delay: bool = False) -> List[logging.Handler]:
+    """JSON file handlers for all records and for errors; ``suffix`` names a worker's own files"""
     # Create logs directory if it doesn't exist
-    log_dir = "logs"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(getattr(logging, log_level.upper()))
-    
-    # Prevent duplicate handlers
-    if logger.handlers:
-        return logger
-    
-    # Create formatters
-    detailed_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
-    )
-    
-    simple_formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s'
-    )
-    
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(simple_formatter)
-    logger.addHandler(console_handler)
-    
+    log_dir = os.environ.get('LOG_DIR', 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    json_formatter = JSONFormatter()
+    date = datetime.now().strftime('%Y%m%d')
+
     # File handler for all logs
-    log_filename = os.path.join(log_dir, f"crop_disease_{datetime.now().strftime('%Y%m%d')}.log")
+    log_filename = os.path.join(log_dir, f"crop_disease_{date}{suffix}.log")
     file_handler = logging.handlers.RotatingFileHandler(
         log_filename,
         maxBytes=10*1024*1024,  # 10MB
-        backupCount=5
+        backupCount=5,
+        delay=delay
     )
     file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(detailed_formatter)
-    logger.addHandler(file_handler)
-    
+    file_handler.setFormatter(json_formatter)
+
     # Error file handler
-    error_filename = os.path.join(log_dir, f"crop_disease_errors_{datetime.now().strftime('%Y%m%d')}.log")
-    error_handler = logging.FileHandler(error_filename)
+    error_filename = os.path.join(log_dir, f"crop_disease_errors_{date}{suffix}.log")
+    error_handler = logging.FileHandler(error_filename, delay=delay)
     error_handler.setLevel(logging.ERROR)
-    error_handler.setFormatter(detailed_formatter)
-    logger.addHandler(error_handler)
-    
-    return logger
+    error_handler.setFormatter(json_formatter)
+    return [file_handler, error_handler]
+
+def _configure(log_level: str):
+    """Install the queue handler on the root logger and start the writer thread (once)"""
+    global _listener, _queue_handler
+
+    json_formatter = JSONFormatter()
+    simple_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(
+        json_formatter if os.environ.get('LOG_FORMAT', 'text').lower() == 'json' else simple_formatter
+    )
+
+    # Spawned workers import this module afresh (the name is set before that
+    # import, parent_process() only after it); they must not share the main files
+    if multiprocessing.current_process().name != 'MainProcess':
+        file_handlers = _file_handlers(f"_{os.getpid()}", delay=True)
+    else:
+        file_handlers = _file_handlers()
+
+    # Callers only enqueue; the listener thread formats and writes
+    queue_handler = _queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter({
+        logging.INFO: float(os.environ.get('LOG_SAMPLE_INFO', '1.0')),
+        logging.DEBUG: float(os.environ.get('LOG_SAMPLE_DEBUG', '1.0'))
+    }))
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, log_level.upper()))
+
+    _listener = logging.handlers.QueueListener(
+        queue_handler.queue, console_handler, *file_handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def setup_logger(name: str, log_level: Optional[str] = None) -> logging.Logger:
+    """Setup logger with appropriate configuration"""
+    if _listener is None:
+        _configure(log_level or os.environ.get('LOG_LEVEL', 'INFO'))
+    return logging.getLogger(name)
+
+def shutdown_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def _restart_in_child():
+    """A forked child has no listener thread; give it its own queue, writer and log files"""
+    global _listener
+    if _listener is None:
+        return
+    # Two processes rotating one file would rename it under each other, so the
+    # child keeps the console and opens files of its own (only once it logs)
+    handlers = []
+    for handler in _listener.handlers:
+        if isinstance(handler, logging.FileHandler):
+            handler.close()  # the child's copy of the descriptor; the parent keeps writing
+        else:
+            handlers.append(handler)
+    handlers.extend(_file_handlers(f"_{os.getpid()}", delay=True))
+    # Records still queued at fork time are the parent's to write
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(
+        _queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_in_child)
 
 # Global logger instance
-app_logger = setup_logger("crop_disease_api")
\ No newline at end of file
+app_logger = setup_logger("crop_disease_api")
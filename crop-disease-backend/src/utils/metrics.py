@@ -0,0 +1,287 @@
+"""
+Prometheus metrics with lock-free recording
+
+Every thread increments its own shard of each metric (a plain list reached
+through ``threading.local``), so the hot path never takes a lock or
+contends with other threads; shards are only summed when ``/metrics`` is
+scraped. No external client library is needed.
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; spans sub-millisecond cache hits up to multi-second CPU inference
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+REGISTRY: List["_Metric"] = []
+
+class _Shards:
+    """One list of floats per writing thread"""
+
+    __slots__ = ('size', '_local', '_shards', '_lock')
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> List[float]:
+        try:
+            return self._local.values
+        except AttributeError:
+            # First write from this thread: the only time a lock is taken
+            values = [0.0] * self.size
+            with self._lock:
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    def total(self) -> List[float]:
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(column) for column in zip(*shards)] if shards else [0.0] * self.size
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._children_lock = threading.Lock()
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+        REGISTRY.append(self)
+
+    def labels(self, **labels):
+        """Child for one label combination; bind it once and reuse it on hot paths"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._children_lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def set_function(self, function: Callable[[], float], **labels):
+        """Report ``function()`` for these labels whenever metrics are scraped"""
+        self._functions[tuple(str(labels[name]) for name in self.labelnames)] = function
+
+    def _function_samples(self) -> List[str]:
+        samples = []
+        for key, function in list(self._functions.items()):
+            try:
+                samples.append(f"{self.name}{self._label_text(key)} {float(function())}")
+            except Exception:
+                continue
+        return samples
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+class _CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount: float = 1.0):
+        self._shards.get()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.total()[0]
+
+class Counter(_Metric):
+    """Monotonic count"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._label_text(key)} {child.value()}"
+                for key, child in list(self._children.items())] + self._function_samples()
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0):
+        self._shards.get()[0] -= amount
+
+class Gauge(_Metric):
+    """Value that goes up and down, or is read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._label_text(key)} {child.value()}"
+                for key, child in list(self._children.items())] + self._function_samples()
+
+class _HistogramChild:
+    __slots__ = ('_buckets', '_shards')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        # One slot per bucket, then +Inf, sum and count
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value: float):
+        values = self._shards.get()
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def time(self) -> "_Timer":
+        """Context manager observing the elapsed seconds"""
+        return _Timer(self)
+
+class _Timer:
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+
+class Histogram(_Metric):
+    """Bucketed distribution with sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for key, child in list(self._children.items()):
+            totals = child._shards.total()
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), totals):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                le_label = f'le="{le}"'
+                samples.append(f"{self.name}_bucket{self._label_text(key, le_label)} {cumulative}")
+            samples.append(f"{self.name}_sum{self._label_text(key)} {totals[-2]}")
+            samples.append(f"{self.name}_count{self._label_text(key)} {totals[-1]}")
+        return samples
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Service metrics -------------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "crop_stage_seconds", "Time spent per pipeline stage (model stages are timed per batch)", ("stage",)
+)
+DECODE_SECONDS = STAGE_SECONDS.labels(stage="decode")
+VALIDATION_SECONDS = STAGE_SECONDS.labels(stage="validation")
+DETECTION_SECONDS = STAGE_SECONDS.labels(stage="detection")
+PREPROCESS_SECONDS = STAGE_SECONDS.labels(stage="preprocess")
+CLASSIFICATION_SECONDS = STAGE_SECONDS.labels(stage="classification")
+SERIALIZATION_SECONDS = STAGE_SECONDS.labels(stage="serialization")
+
+REQUEST_SECONDS = Histogram("crop_request_seconds", "End-to-end request latency", ("endpoint",))
+REQUESTS_TOTAL = Counter("crop_requests_total", "Requests by endpoint and outcome", ("endpoint", "outcome"))
+REQUESTS_IN_FLIGHT = Gauge("crop_requests_in_flight", "Requests currently being handled")
+REQUESTS_QUEUED = Gauge("crop_requests_queued", "Images waiting in the micro-batcher")
+BATCH_SIZE = Histogram("crop_batch_size", "Images per model batch", buckets=BATCH_SIZE_BUCKETS)
+CACHE_LOOKUPS = Counter("crop_cache_lookups_total", "Prediction cache lookups by result", ("result",))
+CACHE_HIT_RATIO = Gauge("crop_cache_hit_ratio", "Share of prediction cache lookups served from cache")
+CACHE_STORE_ERRORS = Counter("crop_cache_store_errors_total", "Predictions that could not be stored in the cache")
+REQUESTS_SHED = Counter("crop_requests_shed_total", "Images refused by admission control", ("reason",))
+ADMISSION_OVERLOADED = Gauge("crop_admission_overloaded", "1 while the queue delay has stayed above target")
+QUEUE_DELAY_SECONDS = Gauge("crop_queue_delay_seconds", "Queueing delay of the most recently dequeued image")
+
+# Read from the latest background resource sample at scrape time
+SYSTEM_CPU_PERCENT = Gauge("crop_system_cpu_percent", "Host CPU utilisation, all cores")
+CPU_CORE_PERCENT = Gauge("crop_cpu_core_percent", "Host CPU utilisation per core", ("core",))
+PROCESS_CPU_PERCENT = Gauge("crop_process_cpu_percent", "CPU used by this process (100 = one core)")
+PROCESS_RSS_BYTES = Gauge("crop_process_rss_bytes", "Resident memory of this process")
+WORKERS_RSS_BYTES = Gauge("crop_workers_rss_bytes", "Resident memory of child processes (inference workers)")
+MEMORY_AVAILABLE_BYTES = Gauge("crop_memory_available_bytes", "Host memory available for new allocations")
+PROCESS_THREADS = Gauge("crop_process_threads", "Threads in this process")
+
+def _outcome(status: int) -> str:
+    if status < 400:
+        return "success"
+    if status == 503:
+        return "unavailable"
+    return "client_error" if status < 500 else "server_error"
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: request count by outcome, latency and in-flight gauge"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Route template, not the raw path, keeps label cardinality bounded
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - start)
+            REQUESTS_TOTAL.labels(endpoint=endpoint, outcome=_outcome(status)).inc()
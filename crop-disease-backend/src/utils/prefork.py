@@ -0,0 +1,279 @@
+"""
+Pre-fork multi-worker server
+
+The master process freezes its objects out of the garbage collector, binds
+the listening socket and then forks ``workers`` uvicorn servers that all
+accept on it. With a ``preload`` callable the master also loads the models
+first; forked workers then share that memory copy-on-write, and model
+weights are only read, so each extra worker costs its own heap growth
+rather than another copy of the models. Only fork-safe runtimes should be
+preloaded: TensorFlow and PyTorch start thread pools that a forked child
+does not inherit, so with them each worker should load its own models.
+
+The master only supervises:
+
+* a worker that exits is replaced (the master gives up if workers keep
+  dying right after start);
+* SIGHUP restarts the workers one at a time, starting each replacement and
+  waiting until it accepts connections before stopping the worker it
+  replaces, so capacity never drops to zero;
+* SIGTERM / SIGINT stop every worker gracefully (uvicorn finishes in-flight
+  requests), killing any still running after ``graceful_timeout`` seconds.
+"""
+
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import uvicorn
+
+from src.utils.logger import shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+# Runtimes whose internal thread pools do not survive fork() once they have been used
+FORK_UNSAFE_MODULES = ('tensorflow', 'torch')
+# Registry backends that load without them, so the master can preload and share them
+FORK_SAFE_BACKENDS = ('onnx', 'tflite', 'openvino')
+
+class _Worker:
+    """Master-side handle of one forked worker"""
+
+    __slots__ = ('pid', 'ready_fd', 'started_at', 'ready')
+
+    def __init__(self, pid: int, ready_fd: int):
+        self.pid = pid
+        self.ready_fd = ready_fd  # the worker writes one byte once it is accepting connections
+        self.started_at = time.monotonic()
+        self.ready = False
+
+class PreforkServer:
+    """Loads models in the master, then forks and supervises uvicorn workers sharing one socket"""
+
+    def __init__(self, app, host: str, port: int, workers: Optional[int] = None,
+                 preload: Optional[Callable[[], None]] = None, graceful_timeout: Optional[float] = None,
+                 ready_timeout: Optional[float] = None, log_level: str = "info"):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.num_workers = workers or os.cpu_count() or 1
+        self.preload = preload
+        self.graceful_timeout = graceful_timeout if graceful_timeout is not None \
+            else float(os.environ.get('PREFORK_GRACEFUL_TIMEOUT', '30'))
+        self.ready_timeout = ready_timeout if ready_timeout is not None \
+            else float(os.environ.get('PREFORK_READY_TIMEOUT', '120'))
+        self.log_level = log_level
+        # A worker that dies sooner than this after starting counts as a failed start
+        self.min_uptime = 5.0
+        self.max_failed_starts = 5
+
+        self._socket: Optional[socket.socket] = None
+        self._workers: Dict[int, _Worker] = {}
+        self._retiring: set = set()  # workers stopped on purpose by a restart
+        self._failed_starts = 0
+        self._stopping = False
+        self._restart_requested = False
+
+    def run(self):
+        """Preload, fork the workers and supervise them until SIGTERM / SIGINT"""
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Pre-fork serving needs os.fork (not available on this platform)")
+
+        if self.preload is not None:
+            started = time.perf_counter()
+            self.preload()
+            logger.info(f"Preloaded models in the master in {(time.perf_counter() - started) * 1000:.0f} ms")
+            unsafe = [name for name in FORK_UNSAFE_MODULES if name in sys.modules]
+            if unsafe:
+                logger.warning(f"Preloading imported {', '.join(unsafe)}, which is not fork-safe; workers "
+                               f"may hang or crash in inference. Load per worker instead (PREFORK_PRELOAD=false)")
+        # Objects that exist now are never collected; without this the first
+        # collection in each worker writes GC headers across the shared heap
+        # and un-shares those pages
+        gc.collect()
+        gc.freeze()
+
+        self._socket = self._bind()
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+
+        logger.info(f"Pre-fork master {os.getpid()} listening on {self.host}:{self.port} "
+                    f"with {self.num_workers} workers")
+        for _ in range(self.num_workers):
+            self._spawn()
+
+        try:
+            while not self._stopping:
+                self._reap()
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self._rolling_restart()
+                elif not self._stopping:
+                    self._replace_missing()
+                time.sleep(0.2)
+        finally:
+            self._stop_all()
+            self._socket.close()
+            logger.info("Pre-fork master stopped")
+
+    def _bind(self) -> socket.socket:
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_restart(self, signum, frame):
+        self._restart_requested = True
+
+    def _spawn(self) -> _Worker:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for other in self._workers.values():
+                os.close(other.ready_fd)
+            self._worker_main(write_fd)  # never returns
+        os.close(write_fd)
+        worker = _Worker(pid, read_fd)
+        self._workers[pid] = worker
+        logger.info(f"Started worker {pid}")
+        return worker
+
+    def _worker_main(self, ready_fd: int):
+        """Body of a forked worker: serve on the inherited socket, then exit"""
+        exit_code = 0
+        try:
+            # Signals go back to defaults; uvicorn installs its own graceful handlers
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            master_pid = os.getppid()
+            server = uvicorn.Server(uvicorn.Config(self.app, log_level=self.log_level,
+                                                   timeout_graceful_shutdown=self.graceful_timeout))
+
+            def watch():
+                # Tell the master once accepting, and leave if the master goes away
+                notified = False
+                while not server.should_exit:
+                    if not notified and server.started:
+                        os.write(ready_fd, b'1')
+                        os.close(ready_fd)
+                        notified = True
+                    if os.getppid() != master_pid:
+                        logger.warning("Pre-fork master exited; stopping worker")
+                        server.should_exit = True
+                    time.sleep(0.1)
+
+            threading.Thread(target=watch, name="prefork-watch", daemon=True).start()
+            server.run(sockets=[self._socket])
+        except BaseException as e:
+            logger.error(f"Worker {os.getpid()} failed: {str(e)}")
+            exit_code = 1
+        finally:
+            # os._exit skips atexit, so flush the log queue here
+            shutdown_logging()
+            os._exit(exit_code)
+
+    def _reap(self):
+        """Collect exited workers"""
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.ready_fd)
+            if self._stopping or pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+            exit_code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - worker.started_at < self.min_uptime:
+                self._failed_starts += 1
+            else:
+                self._failed_starts = 0
+            logger.error(f"Worker {pid} exited (code {exit_code}); replacing it")
+
+    def _replace_missing(self):
+        if self._failed_starts >= self.max_failed_starts:
+            logger.error(f"{self._failed_starts} workers in a row died within {self.min_uptime:.0f}s "
+                         f"of starting; shutting down")
+            self._stopping = True
+            return
+        for _ in range(self.num_workers - len(self._workers)):
+            self._spawn()
+
+    def _wait_ready(self, worker: _Worker) -> bool:
+        """Block until ``worker`` accepts connections, exits, or ready_timeout passes"""
+        deadline = time.monotonic() + self.ready_timeout
+        while not self._stopping and worker.pid in self._workers:
+            readable, _, _ = select.select([worker.ready_fd], [], [], 0.2)
+            if readable and os.read(worker.ready_fd, 1):
+                worker.ready = True
+                return True
+            self._reap()
+            if time.monotonic() > deadline:
+                return False
+        return False
+
+    def _rolling_restart(self):
+        """Replace every worker, one at a time, only retiring a worker once its replacement is up"""
+        old_pids = list(self._workers)
+        logger.info(f"Restarting {len(old_pids)} workers")
+        for pid in old_pids:
+            if self._stopping:
+                return
+            replacement = self._spawn()
+            if not self._wait_ready(replacement):
+                logger.error(f"Replacement worker {replacement.pid} did not become ready; "
+                             f"keeping worker {pid} and aborting the restart")
+                return
+            if pid in self._workers:
+                self._retiring.add(pid)
+                os.kill(pid, signal.SIGTERM)
+                self._wait_exit({pid})
+        logger.info("Worker restart complete")
+
+    def _wait_exit(self, pids: set):
+        """SIGKILL whatever of ``pids`` is still running after graceful_timeout"""
+        deadline = time.monotonic() + self.graceful_timeout
+        while pids & set(self._workers) and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in pids & set(self._workers):
+            logger.warning(f"Worker {pid} did not stop within {self.graceful_timeout:.0f}s; killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _stop_all(self):
+        self._stopping = True
+        pids = set(self._workers)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self._wait_exit(pids)
+        # Collect the killed ones too
+        deadline = time.monotonic() + 5
+        while self._workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
@@ -0,0 +1,168 @@
+"""
+Background system-resource sampler
+
+A daemon thread records CPU (overall, per core and for this process), RSS,
+available memory and thread counts every ``RESOURCE_SAMPLE_INTERVAL``
+seconds into a fixed-size ring buffer. Readers (``/system``, ``/metrics``)
+only look at stored samples, so request handling never waits on psutil.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class ResourceSample:
+    """One snapshot of system and process resource usage"""
+
+    __slots__ = ('timestamp', 'cpu_percent', 'per_cpu_percent', 'process_cpu_percent', 'load_1m',
+                 'rss_bytes', 'children_rss_bytes', 'memory_available_bytes', 'memory_percent', 'threads')
+
+    def __init__(self, timestamp: float, cpu_percent: float, per_cpu_percent: List[float],
+                 process_cpu_percent: float, load_1m: Optional[float], rss_bytes: int, children_rss_bytes: int,
+                 memory_available_bytes: int, memory_percent: float, threads: int):
+        self.timestamp = timestamp
+        self.cpu_percent = cpu_percent
+        self.per_cpu_percent = per_cpu_percent
+        self.process_cpu_percent = process_cpu_percent
+        self.load_1m = load_1m
+        self.rss_bytes = rss_bytes
+        self.children_rss_bytes = children_rss_bytes
+        self.memory_available_bytes = memory_available_bytes
+        self.memory_percent = memory_percent
+        self.threads = threads
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": round(self.timestamp, 3),
+            "cpu_percent": self.cpu_percent,
+            "per_cpu_percent": self.per_cpu_percent,
+            "process_cpu_percent": self.process_cpu_percent,
+            "load_1m": self.load_1m,
+            "rss_mb": round(self.rss_bytes / (1024 * 1024), 1),
+            "children_rss_mb": round(self.children_rss_bytes / (1024 * 1024), 1),
+            "memory_available_mb": round(self.memory_available_bytes / (1024 * 1024), 1),
+            "memory_percent": self.memory_percent,
+            "threads": self.threads
+        }
+
+class ResourceSampler:
+    """Samples resource usage on a background thread into a ring buffer"""
+
+    def __init__(self, interval: Optional[float] = None, capacity: Optional[int] = None):
+        self.interval = interval if interval is not None \
+            else float(os.environ.get('RESOURCE_SAMPLE_INTERVAL', '1.0'))
+        self.capacity = capacity if capacity is not None \
+            else int(os.environ.get('RESOURCE_SAMPLE_WINDOW', '300'))
+        # deque appends and reads are atomic, so the sampler and readers need no lock
+        self.samples: deque = deque(maxlen=max(1, self.capacity))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._process = None
+        self._children: Dict[int, Any] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """Start sampling; returns False when psutil is not available"""
+        if self.running:
+            return True
+        try:
+            import psutil
+        except ImportError:
+            logger.warning("psutil not installed; resource sampling disabled")
+            return False
+
+        self._psutil = psutil
+        self._process = psutil.Process()
+        # The first cpu_percent calls only set the reference point
+        psutil.cpu_percent(percpu=True)
+        self._process.cpu_percent(interval=None)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+        logger.info(f"Resource sampler started (interval={self.interval}s, window={self.capacity} samples)")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.samples.append(self._sample())
+            except Exception as e:
+                logger.warning(f"Resource sampling failed: {str(e)}")
+
+    def _children_rss(self) -> int:
+        """RSS of child processes (e.g. inference workers)"""
+        psutil = self._psutil
+        rss = 0
+        alive = {}
+        for child in self._process.children(recursive=True):
+            child = self._children.get(child.pid, child)
+            try:
+                rss += child.memory_info().rss
+                alive[child.pid] = child
+            except psutil.Error:
+                continue
+        self._children = alive
+        return rss
+
+    def _sample(self) -> ResourceSample:
+        psutil = self._psutil
+        per_cpu = psutil.cpu_percent(percpu=True)
+        memory = psutil.virtual_memory()
+        with self._process.oneshot():
+            process_cpu = self._process.cpu_percent(interval=None)
+            rss = self._process.memory_info().rss
+            threads = self._process.num_threads()
+        try:
+            load_1m = round(os.getloadavg()[0], 2)
+        except (AttributeError, OSError):
+            load_1m = None
+        return ResourceSample(
+            time.time(), round(sum(per_cpu) / len(per_cpu), 1) if per_cpu else 0.0, per_cpu,
+            process_cpu, load_1m, rss, self._children_rss(), memory.available, memory.percent, threads
+        )
+
+    def latest(self) -> Optional[ResourceSample]:
+        return self.samples[-1] if self.samples else None
+
+    def window(self, seconds: Optional[float] = None) -> List[ResourceSample]:
+        """Samples from the last ``seconds`` (default: the whole buffer), oldest first"""
+        samples = list(self.samples)
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            samples = [sample for sample in samples if sample.timestamp >= cutoff]
+        return samples
+
+    @staticmethod
+    def summarize(samples: List[ResourceSample]) -> Dict[str, Any]:
+        """Min / mean / max of the headline series over ``samples``"""
+        if not samples:
+            return {}
+        series = {
+            "cpu_percent": [sample.cpu_percent for sample in samples],
+            "process_cpu_percent": [sample.process_cpu_percent for sample in samples],
+            "rss_mb": [sample.rss_bytes / (1024 * 1024) for sample in samples],
+            "memory_available_mb": [sample.memory_available_bytes / (1024 * 1024) for sample in samples],
+            "threads": [sample.threads for sample in samples]
+        }
+        return {
+            name: {"min": round(min(values), 1), "mean": round(sum(values) / len(values), 1),
+                   "max": round(max(values), 1)}
+            for name, values in series.items()
+        }
+
+# Global sampler instance
+resource_sampler = ResourceSampler()
@@ -0,0 +1,268 @@
+"""
+Per-request trace spans
+
+Each HTTP request gets a trace keyed by its ``X-Request-ID`` (taken from the
+caller, e.g. the Node backend, or generated). Stages record spans into the
+current trace through a context variable; the timings go back to the client
+in a ``Server-Timing`` header and every trace with spans is appended to a
+local JSONL file by a background thread.
+
+Batched stages serve several requests at once, so their spans are recorded
+once per batch and copied into every trace in that batch.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Caller-supplied IDs end up in logs and files; keep them short and plain
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+class Span:
+    """One timed stage; offsets are milliseconds from the start of the request"""
+
+    __slots__ = ('name', 'start_ms', 'duration_ms', 'attributes')
+
+    def __init__(self, name: str, start_ms: float, duration_ms: float, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start_ms = start_ms
+        self.duration_ms = duration_ms
+        self.attributes = attributes
+
+    def to_dict(self) -> Dict[str, Any]:
+        span = {"name": self.name, "start_ms": round(self.start_ms, 3), "duration_ms": round(self.duration_ms, 3)}
+        if self.attributes:
+            span["attributes"] = self.attributes
+        return span
+
+class Trace:
+    """Spans recorded for one request"""
+
+    __slots__ = ('request_id', 'method', 'path', 'started_at', '_start', 'spans')
+
+    def __init__(self, request_id: str, method: str = "", path: str = ""):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Span] = []
+
+    def add(self, name: str, start: float, end: float, **attributes):
+        """Record a span from two ``time.perf_counter()`` readings"""
+        self.spans.append(Span(name, (start - self._start) * 1000, (end - start) * 1000, attributes or None))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Milliseconds per stage name, summed over repeated spans"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        return totals
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value"""
+        return ", ".join(f"{name};dur={duration:.2f}" for name, duration in self.stage_totals().items())
+
+    def to_dict(self, status: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "timestamp": self.started_at,
+            "duration_ms": round(self.elapsed_ms(), 3),
+            "spans": [span.to_dict() for span in self.spans]
+        }
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+# Traces of every request in the batch being processed
+_batch: contextvars.ContextVar[Sequence[Trace]] = contextvars.ContextVar("batch_traces", default=())
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+def current_request_ids() -> List[str]:
+    """IDs of the request (or every request of the batch) being handled in this context"""
+    trace = _current.get()
+    if trace is not None:
+        return [trace.request_id]
+    return [trace.request_id for trace in _batch.get()]
+
+def run_in_executor(executor: Optional[Executor], func: Callable, *args) -> "asyncio.Future":
+    """``loop.run_in_executor`` that keeps the current request IDs for logs written by ``func``
+
+    Executor threads do not inherit context variables, so ``func`` runs in a
+    copy of the caller's context. Process pools get ``func`` as is, since
+    a context cannot be pickled.
+    """
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, ProcessPoolExecutor):
+        return loop.run_in_executor(executor, func, *args)
+    return loop.run_in_executor(executor, contextvars.copy_context().run, func, *args)
+
+class span:
+    """Time a block into the current request's trace, or into every trace of the current batch"""
+
+    __slots__ = ('name', 'attributes', '_start')
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        trace = _current.get()
+        traces = (trace,) if trace is not None else _batch.get()
+        for trace in traces:
+            trace.add(self.name, self._start, end, **self.attributes)
+
+class batch_traces:
+    """Make spans recorded in this block apply to all of ``traces`` (None entries are ignored)"""
+
+    __slots__ = ('traces', '_tokens')
+
+    def __init__(self, traces: Sequence[Optional[Trace]]):
+        self.traces = tuple(trace for trace in traces if trace is not None)
+
+    def __enter__(self):
+        # The batch runs in whichever task collected it; detach that task's own request
+        self._tokens = (_current.set(None), _batch.set(self.traces))
+        return self
+
+    def __exit__(self, *exc_info):
+        _current.reset(self._tokens[0])
+        _batch.reset(self._tokens[1])
+
+class TraceExporter:
+    """Appends finished traces to a JSONL file from a background thread"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path if path is not None else os.environ.get('TRACE_EXPORT_PATH', 'logs/traces.jsonl')
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def export(self, record: Dict[str, Any]):
+        """Queue one trace; never blocks on file I/O"""
+        if not self.enabled:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        self._queue.put(json.dumps(record))
+
+    def _write_loop(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Pre-fork workers share this file: each batch of lines goes out as one
+        # O_APPEND write, so records from different processes never interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                lines = [line]
+                stopping = False
+                # Drain whatever else is waiting so bursts become one write
+                try:
+                    while True:
+                        line = self._queue.get_nowait()
+                        if line is None:
+                            stopping = True
+                            break
+                        lines.append(line)
+                except queue.Empty:
+                    pass
+                try:
+                    os.write(fd, ("\n".join(lines) + "\n").encode())
+                except OSError as e:
+                    logger.warning(f"Failed to export {len(lines)} trace(s): {str(e)}")
+                if stopping:
+                    return
+        finally:
+            os.close(fd)
+
+    def stop(self):
+        """Flush queued traces and stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+exporter = TraceExporter()
+
+class TracingMiddleware:
+    """Plain ASGI middleware: starts a trace per request, adds X-Request-ID and Server-Timing, exports spans"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        trace = Trace(request_id, scope.get("method", ""), scope.get("path", ""))
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                timing = trace.server_timing()
+                # Streamed responses only report the stages finished before the first byte
+                headers.append((b"server-timing", f"{timing + ', ' if timing else ''}"
+                                                  f"total;dur={trace.elapsed_ms():.2f}".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if trace.spans:
+                exporter.export(trace.to_dict(status))
+                # Logged while the trace is still current so the line carries the request ID
+                logger.info(f"{trace.method} {trace.path} {status}", extra={
+                    "status": status,
+                    "duration_ms": round(trace.elapsed_ms(), 3),
+                    "stages_ms": {name: round(ms, 3) for name, ms in trace.stage_totals().items()}
+                })
+            _current.reset(token)
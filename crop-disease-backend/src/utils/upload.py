@@ -0,0 +1,118 @@
+"""
+Streaming multipart reader for single-image uploads
+
+FastAPI's ``UploadFile`` only reaches the handler after the whole request
+body has been parsed and spooled. ``read_image_upload`` instead parses the
+multipart body as it arrives and feeds the image part to a
+``StreamingUpload``, so an oversized or non-image upload is refused after
+its first chunk and at most ``max_file_size`` bytes are held per request.
+"""
+
+from typing import Dict, Optional
+
+from fastapi.exceptions import RequestValidationError
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from src.utils.validators import ImageValidator, StreamingUpload, UploadRejected
+
+# Multipart framing around the image: boundaries, part headers and small form fields
+MULTIPART_OVERHEAD = 16 * 1024
+
+def _missing_field(field: str) -> RequestValidationError:
+    """The 422 FastAPI itself returns when a required ``File(...)`` parameter is absent"""
+    return RequestValidationError([{"type": "missing", "loc": ("body", field), "msg": "Field required", "input": None}])
+
+async def read_image_upload(request: Request, validator: ImageValidator, field: str = "file") -> StreamingUpload:
+    """Read the ``field`` file part of a multipart request
+
+    Raises UploadRejected for a bad upload, and RequestValidationError (422)
+    when there is no ``field`` part at all, as a ``File(...)`` parameter would.
+    """
+    limit = validator.max_file_size + MULTIPART_OVERHEAD
+
+    # Refuse from the headers alone when the client announces an oversized body
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > limit:
+        raise UploadRejected(413, validator.too_large_message())
+
+    content_type, params = parse_options_header(request.headers.get('content-type'))
+    boundary = params.get(b'boundary')
+    if content_type != b'multipart/form-data' or not boundary:
+        raise _missing_field(field)
+
+    upload: Optional[StreamingUpload] = None
+    current: Optional[StreamingUpload] = None
+    headers: Dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        nonlocal current
+        current = None
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        nonlocal upload, current
+        _, disposition = parse_options_header(headers.get(b'content-disposition'))
+        if upload is not None or disposition.get(b'name', b'').decode('utf-8', 'replace') != field:
+            return  # other fields and repeated files are skipped unread
+        filename = disposition.get(b'filename')
+        filename = filename.decode('utf-8', 'replace') if filename is not None else None
+        part_type = headers.get(b'content-type')
+        part_type = part_type.decode('latin-1') if part_type is not None else None
+        error_msg = validator.check_declared(filename, part_type)
+        if error_msg:
+            raise UploadRejected(415 if filename else 400, error_msg)
+        upload = current = validator.stream(filename, part_type)
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if current is not None:
+            current.feed(data[start:end])
+
+    def on_part_end():
+        nonlocal current
+        current = None
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end
+    })
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            # Bounds chunked bodies that sent no Content-Length, and the non-file parts
+            received += len(chunk)
+            if received > limit:
+                raise UploadRejected(413, validator.too_large_message())
+            parser.write(chunk)
+        parser.finalize()
+    except UploadRejected:
+        raise
+    except Exception as e:
+        raise UploadRejected(400, f"Malformed multipart body: {str(e)}")
+
+    if upload is None:
+        raise _missing_field(field)
+    return upload.finish()
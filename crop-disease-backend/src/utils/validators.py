@@ -3,13 +3,163 @@ Image validation and preprocessing utilities
 """
 
 import logging
-from typing import Tuple
+from typing import Optional, Tuple
 from fastapi import UploadFile
 from PIL import Image
+import cv2
+import numpy as np
 import io
+import os
+import struct
+import time
+
+from src.inference.cache import content_hasher
+from src.utils.metrics import DECODE_SECONDS, VALIDATION_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# Read size when streaming an upload that is already spooled (batch files)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic); DHT, JPG and DAC are excluded
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def sniff_image_header(head: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Format and dimensions from the first bytes of a JPEG or PNG
+    
+    Returns None while ``head`` is too short to tell; raises ValueError if
+    the bytes cannot be a JPEG or PNG.
+    """
+    if head[:8] == _PNG_SIGNATURE:
+        if len(head) < 24:
+            return None
+        if head[12:16] != b'IHDR':
+            raise ValueError("PNG header is missing IHDR")
+        width, height = struct.unpack('>II', head[16:24])
+        return 'PNG', width, height
+    
+    if head[:2] == b'\xff\xd8':
+        # Walk the marker segments up to the frame header; EXIF/ICC segments are skipped by length
+        pos = 2
+        while True:
+            if pos + 4 > len(head):
+                return None
+            if head[pos] != 0xFF:
+                raise ValueError("Invalid JPEG marker")
+            marker = head[pos + 1]
+            if marker == 0xFF:
+                pos += 1  # fill byte
+                continue
+            if marker in _JPEG_SOF_MARKERS:
+                if pos + 9 > len(head):
+                    return None
+                height, width = struct.unpack('>HH', head[pos + 5:pos + 9])
+                return 'JPEG', width, height
+            if marker in (0xD9, 0xDA):
+                raise ValueError("JPEG has no frame header")
+            if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                pos += 2  # markers without a length
+                continue
+            pos += 2 + struct.unpack('>H', head[pos + 2:pos + 4])[0]
+    
+    # Too short to rule out either signature yet
+    if len(head) < 8 and (_PNG_SIGNATURE.startswith(head) or b'\xff\xd8'.startswith(head[:2])):
+        return None
+    raise ValueError("Not a JPEG or PNG file")
+
+class UploadRejected(Exception):
+    """An upload refused while it was being read"""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class StreamingUpload:
+    """
+    Accumulates an upload chunk by chunk, rejecting it as early as possible
+    
+    The running size is checked on every chunk, format and dimensions are
+    sniffed from the header as soon as it has arrived, and the content hash
+    (the prediction cache key) is updated incrementally, so an oversized or
+    non-image upload never gets buffered in full.
+    """
+    
+    __slots__ = ('validator', 'filename', 'content_type', 'data', '_hasher',
+                 'format', 'width', 'height', 'key')
+    
+    def __init__(self, validator: 'ImageValidator', filename: Optional[str], content_type: Optional[str] = None):
+        self.validator = validator
+        self.filename = filename
+        self.content_type = content_type
+        self.data = bytearray()
+        self._hasher = content_hasher()
+        self.format: Optional[str] = None
+        self.width = 0
+        self.height = 0
+        self.key: Optional[str] = None
+    
+    @property
+    def size(self) -> int:
+        return len(self.data)
+    
+    def feed(self, chunk: bytes):
+        """Add the next chunk; raises UploadRejected as soon as the upload cannot pass"""
+        if len(self.data) + len(chunk) > self.validator.max_file_size:
+            raise UploadRejected(413, self.validator.too_large_message())
+        self.data += chunk
+        self._hasher.update(chunk)
+        if self.format is None:
+            self._sniff()
+    
+    def finish(self) -> 'StreamingUpload':
+        """Final checks once the whole upload has been read"""
+        if len(self.data) < self.validator.min_file_size:
+            raise UploadRejected(400, f"File too small. Minimum size: {self.validator.min_file_size} bytes")
+        if self.format is None:
+            raise UploadRejected(400, "Invalid or corrupted image: incomplete header")
+        self.key = self._hasher.hexdigest()
+        return self
+    
+    def _sniff(self):
+        try:
+            header = sniff_image_header(self.data)
+        except ValueError as e:
+            raise UploadRejected(415, f"Unsupported or corrupted image: {str(e)}")
+        if header is None:
+            return
+        format_name, width, height = header
+        if format_name not in self.validator.allowed_formats:
+            raise UploadRejected(415, "Image format not supported after verification")
+        error_msg = self.validator.check_dimensions(width, height)
+        if error_msg:
+            raise UploadRejected(400, error_msg)
+        self.format, self.width, self.height = header
+
+class ValidatedImage:
+    """An upload that passed validation, decoded exactly once"""
+    
+    __slots__ = ('data', 'array', 'format', 'width', 'height', 'scale', 'decode_ms', 'key')
+    
+    def __init__(self, data: bytes, array: np.ndarray, format: str, width: int, height: int,
+                 scale: int = 1, decode_ms: float = 0.0, key: Optional[str] = None):
+        self.data = data          # raw upload bytes
+        self.array = array        # decoded pixels, HxWx3 uint8 in OpenCV (BGR) order
+        self.format = format
+        self.width = width        # original dimensions from the header
+        self.height = height
+        self.scale = scale        # original / decoded size (JPEG scale-on-decode)
+        self.decode_ms = decode_ms
+        self.key = key            # content hash, when computed while streaming the upload
+    
+    def to_original_bbox(self, bbox: dict) -> dict:
+        """Map a bbox from decoded-image pixels back to the uploaded image"""
+        if self.scale == 1:
+            return bbox
+        return {key: int(value * self.scale) for key, value in bbox.items()}
+
 class ImageValidator:
     """Validates uploaded images for the crop disease detection API"""
     
@@ -26,6 +176,10 @@ class ImageValidator:
         self.min_height = 100
         self.max_width = 4000
         self.max_height = 4000
+        
+        # Longest side the pipeline needs (YOLO input); JPEGs larger than a
+        # multiple of this are decoded at 1/2, 1/4 or 1/8 scale. 0 disables.
+        self.decode_target_size = int(os.environ.get('DECODE_TARGET_SIZE', '640'))
     
     def validate_image(self, file: UploadFile) -> Tuple[bool, str]:
         """
@@ -37,39 +191,127 @@ class ImageValidator:
         Returns:
             Tuple[bool, str]: (is_valid, error_message)
         """
+        is_valid, error_msg, _ = self.validate_upload(file)
+        return is_valid, error_msg
+    
+    def validate_upload(self, file: UploadFile) -> Tuple[bool, str, Optional[ValidatedImage]]:
+        """
+        Validate uploaded image file and decode it for the pipeline
+        
+        The upload is read once, in chunks that are checked as they arrive,
+        and decoded once; the decoded pixels are returned so inference does
+        not have to repeat the work.
+        
+        Args:
+            file: FastAPI UploadFile object
+            
+        Returns:
+            Tuple[bool, str, Optional[ValidatedImage]]: (is_valid, error_message, image)
+        """
         try:
-            # Check filename
-            if not file.filename:
-                return False, "No file uploaded"
+            try:
+                upload = self.read_upload(file)
+            except UploadRejected as e:
+                return False, e.detail, None
             
-            # Check file extension
-            if not self._check_file_extension(file.filename):
-                return False, f"Unsupported file format. Supported formats: {', '.join(self.allowed_formats)}"
+            return self.validate_streamed(upload)
             
-            # Check content type
-            if not self._check_content_type(file.content_type):
-                return False, "Invalid content type"
+        except Exception as e:
+            logger.error(f"Image validation failed: {str(e)}")
+            return False, f"Validation error: {str(e)}", None
+    
+    def read_upload(self, file: UploadFile) -> StreamingUpload:
+        """Read an UploadFile in checked chunks without decoding it; raises UploadRejected"""
+        # Check name and declared type before reading anything
+        error_msg = self.check_declared(file.filename, file.content_type)
+        if error_msg:
+            raise UploadRejected(400, error_msg)
+        
+        upload = self.stream(file.filename, file.content_type)
+        try:
+            for chunk in iter(lambda: file.file.read(UPLOAD_CHUNK_SIZE), b''):
+                upload.feed(chunk)
+        finally:
+            file.file.seek(0)  # Reset file pointer
+        return upload.finish()
+    
+    def stream(self, filename: Optional[str], content_type: Optional[str] = None) -> StreamingUpload:
+        """Start an upload that is checked chunk by chunk as it is read"""
+        return StreamingUpload(self, filename, content_type)
+    
+    def validate_streamed(self, upload: StreamingUpload) -> Tuple[bool, str, Optional[ValidatedImage]]:
+        """Decode a finished streaming upload, keeping the hash computed while reading"""
+        is_valid, error_msg, image = self.validate_bytes(upload.filename, upload.data, upload.content_type)
+        if image is not None:
+            image.key = upload.key
+        return is_valid, error_msg, image
+    
+    def check_declared(self, filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+        """Error message if the file name or declared MIME type rules the upload out, else None"""
+        if not filename:
+            return "No file uploaded"
+        
+        if not self._check_file_extension(filename):
+            return f"Unsupported file format. Supported formats: {', '.join(self.allowed_formats)}"
+        
+        if not self._check_content_type(content_type):
+            return "Invalid content type"
+        return None
+    
+    def check_dimensions(self, width: int, height: int) -> Optional[str]:
+        """Error message if the header dimensions are out of range, else None"""
+        if width < self.min_width or height < self.min_height:
+            return f"Image too small. Minimum dimensions: {self.min_width}x{self.min_height} pixels"
+        
+        if width > self.max_width or height > self.max_height:
+            return f"Image too large. Maximum dimensions: {self.max_width}x{self.max_height} pixels"
+        return None
+    
+    def too_large_message(self) -> str:
+        return f"File too large. Maximum size: {self.max_file_size / (1024*1024):.1f} MB"
+    
+    def validate_bytes(self, filename: str, image_bytes: bytes,
+                       content_type: Optional[str] = None) -> Tuple[bool, str, Optional[ValidatedImage]]:
+        """
+        Validate an image already held in memory (e.g. an archive member)
+        
+        Args:
+            filename: Original file name, used for the extension check
+            image_bytes: Raw file content
+            content_type: Declared MIME type, if any
+            
+        Returns:
+            Tuple[bool, str, Optional[ValidatedImage]]: (is_valid, error_message, image)
+        """
+        start_time = time.perf_counter()
+        decode_ms = 0.0
+        try:
+            # Check filename, extension and content type
+            error_msg = self.check_declared(filename, content_type)
+            if error_msg:
+                return False, error_msg, None
             
             # Check file size
-            file_size = len(file.file.read())
-            file.file.seek(0)  # Reset file pointer
+            file_size = len(image_bytes)
             
             if file_size < self.min_file_size:
-                return False, f"File too small. Minimum size: {self.min_file_size} bytes"
+                return False, f"File too small. Minimum size: {self.min_file_size} bytes", None
             
             if file_size > self.max_file_size:
-                return False, f"File too large. Maximum size: {self.max_file_size / (1024*1024):.1f} MB"
+                return False, self.too_large_message(), None
             
             # Validate image content
-            is_valid_image, error_msg = self._validate_image_content(file)
-            if not is_valid_image:
-                return False, error_msg
-            
-            return True, ""
+            is_valid, error_msg, image = self._decode_image_content(image_bytes)
+            if image is not None:
+                decode_ms = image.decode_ms
+            return is_valid, error_msg, image
             
         except Exception as e:
             logger.error(f"Image validation failed: {str(e)}")
-            return False, f"Validation error: {str(e)}"
+            return False, f"Validation error: {str(e)}", None
+        finally:
+            # Pixel decoding has its own histogram
+            VALIDATION_SECONDS.observe(time.perf_counter() - start_time - decode_ms / 1000)
     
     def _check_file_extension(self, filename: str) -> bool:
         """Check if file extension is supported"""
@@ -97,40 +339,49 @@ class ImageValidator:
             
         return content_type.lower() in supported_types
     
-    def _validate_image_content(self, file: UploadFile) -> Tuple[bool, str]:
-        """Validate actual image content and dimensions"""
+    def _decode_image_content(self, image_bytes: bytes) -> Tuple[bool, str, Optional[ValidatedImage]]:
+        """Check format and dimensions from the header, then decode the pixels once"""
         try:
-            # Read image content
-            image_bytes = file.file.read()
-            file.file.seek(0)  # Reset file pointer
+            # Opening only parses the header; pixels are not decoded here
+            with Image.open(io.BytesIO(image_bytes)) as image:
+                width, height = image.size
+                format_name = image.format
             
-            # Try to open as PIL Image
-            image = Image.open(io.BytesIO(image_bytes))
+            if format_name not in self.allowed_formats:
+                return False, "Image format not supported after verification", None
             
-            # Check dimensions
-            width, height = image.size
+            error_msg = self.check_dimensions(width, height)
+            if error_msg:
+                return False, error_msg, None
             
-            if width < self.min_width or height < self.min_height:
-                return False, f"Image too small. Minimum dimensions: {self.min_width}x{self.min_height} pixels"
+            # The decode doubles as the corruption check
+            read_flag, scale = self._reduced_read_flag(format_name, width, height)
+            start_time = time.perf_counter()
+            array = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), read_flag)
+            decode_seconds = time.perf_counter() - start_time
+            DECODE_SECONDS.observe(decode_seconds)
+            decode_ms = decode_seconds * 1000
+            if array is None:
+                return False, "Invalid or corrupted image: could not decode pixel data", None
             
-            if width > self.max_width or height > self.max_height:
-                return False, f"Image too large. Maximum dimensions: {self.max_width}x{self.max_height} pixels"
-            
-            # Check if image is not corrupted
-            image.verify()
-            image.close()
-            
-            # Reopen for further checks
-            image = Image.open(io.BytesIO(image_bytes))
-            if image.format not in self.allowed_formats:
-                image.close()
-                return False, "Image format not supported after verification"
-            
-            image.close()
-            return True, ""
+            logger.debug(f"Decoded {width}x{height} {format_name} at 1/{scale} scale in {decode_ms:.1f}ms")
+            return True, "", ValidatedImage(image_bytes, array, format_name, width, height, scale, decode_ms)
             
         except Exception as e:
-            return False, f"Invalid or corrupted image: {str(e)}"
+            return False, f"Invalid or corrupted image: {str(e)}", None
+    
+    def _reduced_read_flag(self, format_name: str, width: int, height: int) -> Tuple[int, int]:
+        """Pick the largest JPEG scale-on-decode factor that still covers the target size"""
+        if format_name != 'JPEG' or self.decode_target_size <= 0:
+            return cv2.IMREAD_COLOR, 1
+        
+        longest_side = max(width, height)
+        for scale, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                            (4, cv2.IMREAD_REDUCED_COLOR_4),
+                            (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if longest_side // scale >= self.decode_target_size:
+                return flag, scale
+        return cv2.IMREAD_COLOR, 1
     
     def get_image_info(self, file: UploadFile) -> dict:
         """Get basic information about the uploaded image"""
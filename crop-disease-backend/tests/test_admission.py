@@ -0,0 +1,82 @@
+"""Queue-depth and CoDel-style shedding in AdmissionController"""
+
+import pytest
+
+from src.inference import admission
+from src.inference.admission import AdmissionController, OverloadedError
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(admission.time, 'monotonic', fake)
+    return fake
+
+def make_controller(**overrides):
+    options = {'max_queue': 4, 'target_ms': 100, 'interval_ms': 500, 'retry_after': 3}
+    options.update(overrides)
+    return AdmissionController(**options)
+
+def test_full_queue_is_shed_with_retry_after():
+    controller = make_controller()
+    controller.check(3)
+    with pytest.raises(OverloadedError) as excinfo:
+        controller.check(4)
+    assert excinfo.value.reason == "queue_full"
+    assert excinfo.value.retry_after == 3
+    assert controller.shed_queue_full == 1
+
+def test_short_burst_above_target_is_not_shed(clock):
+    controller = make_controller()
+    controller.observe(0.2, remaining=2)
+    clock.now += 0.4  # still inside the interval
+    controller.observe(0.2, remaining=2)
+    assert not controller.overloaded
+    controller.check(2)
+
+def test_standing_queue_sheds_until_delay_recovers(clock):
+    controller = make_controller()
+    controller.observe(0.2, remaining=2)
+    clock.now += 0.5
+    controller.observe(0.2, remaining=2)
+    assert controller.overloaded
+    assert controller.overload_episodes == 1
+
+    with pytest.raises(OverloadedError) as excinfo:
+        controller.check(1)
+    assert excinfo.value.reason == "queue_delay"
+    assert excinfo.value.retry_after == 3
+    assert controller.shed_delay == 1
+
+    # One image through within the target ends the episode
+    controller.observe(0.05, remaining=1)
+    assert not controller.overloaded
+    controller.check(1)
+
+def test_empty_queue_admits_while_overloaded(clock):
+    controller = make_controller()
+    controller.observe(0.2, remaining=2)
+    clock.now += 0.6
+    controller.observe(0.2, remaining=2)
+    assert controller.overloaded
+    controller.check(0)
+
+def test_drained_queue_resets_the_interval(clock):
+    controller = make_controller()
+    controller.observe(0.2, remaining=2)
+    clock.now += 0.3
+    controller.observe(0.2, remaining=0)
+    clock.now += 0.3
+    controller.observe(0.2, remaining=2)
+    assert not controller.overloaded
+
+def test_disabled_controller_admits_everything():
+    controller = make_controller(max_queue=0)
+    controller.overloaded = True
+    controller.check(1000)
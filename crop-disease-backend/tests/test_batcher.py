@@ -0,0 +1,117 @@
+"""Flush rules and result fan-out of MicroBatcher"""
+
+import asyncio
+import time
+
+import pytest
+
+from src.inference.batcher import MicroBatcher
+
+class RecordingModel:
+    """process_batch stand-in that records each batch it is given"""
+
+    def __init__(self, fail_with=None, results=None):
+        self.batches = []
+        self.fail_with = fail_with
+        self.results = results
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        if self.fail_with is not None:
+            raise self.fail_with
+        return self.results if self.results is not None else [item * 10 for item in items]
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_full_batch_flushes_without_waiting_for_the_deadline():
+    async def scenario():
+        model = RecordingModel()
+        batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=10_000)
+        started = time.monotonic()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(4)))
+        elapsed = time.monotonic() - started
+        await batcher.stop()
+        return model, results, elapsed
+
+    model, results, elapsed = run(scenario())
+    assert model.batches == [[0, 1, 2, 3]]
+    assert results == [0, 10, 20, 30]
+    assert elapsed < 1
+
+def test_oversubscribed_queue_splits_into_max_size_batches():
+    async def scenario():
+        model = RecordingModel()
+        batcher = MicroBatcher(model, max_batch_size=3, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+        await batcher.stop()
+        return model, results
+
+    model, results = run(scenario())
+    assert [len(batch) for batch in model.batches] == [3, 3, 1]
+    assert results == [i * 10 for i in range(7)]
+
+def test_partial_batch_flushes_at_the_deadline():
+    async def scenario():
+        model = RecordingModel()
+        batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=50)
+        started = time.monotonic()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        elapsed = time.monotonic() - started
+        await batcher.stop()
+        return model, results, elapsed
+
+    model, results, elapsed = run(scenario())
+    assert model.batches == [[1, 2]]
+    assert results == [10, 20]
+    assert 0.04 <= elapsed < 1
+
+def test_late_arrival_after_the_deadline_goes_in_the_next_batch():
+    async def scenario():
+        model = RecordingModel()
+        batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=20)
+        first = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0.1)
+        second = await batcher.submit(2)
+        result = await first, second
+        await batcher.stop()
+        return model, result
+
+    model, results = run(scenario())
+    assert model.batches == [[1], [2]]
+    assert results == (10, 20)
+
+def test_batch_error_is_raised_to_every_caller():
+    async def scenario():
+        error = RuntimeError("model crashed")
+        batcher = MicroBatcher(RecordingModel(fail_with=error), max_batch_size=3, max_wait_ms=10_000)
+        outcomes = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        await batcher.stop()
+        return error, outcomes, batcher
+
+    error, outcomes, batcher = run(scenario())
+    assert outcomes == [error, error, error]
+    assert batcher.batches_processed == 0
+
+def test_wrong_result_count_fails_the_whole_batch():
+    async def scenario():
+        batcher = MicroBatcher(RecordingModel(results=['only one']), max_batch_size=2, max_wait_ms=10_000)
+        outcomes = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        await batcher.stop()
+        return outcomes
+
+    outcomes = run(scenario())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+def test_batcher_keeps_serving_after_a_failed_batch():
+    async def scenario():
+        model = RecordingModel(fail_with=ValueError("bad input"))
+        batcher = MicroBatcher(model, max_batch_size=1, max_wait_ms=0)
+        with pytest.raises(ValueError):
+            await batcher.submit(1)
+        model.fail_with = None
+        result = await batcher.submit(2)
+        await batcher.stop()
+        return result
+
+    assert run(scenario()) == 20
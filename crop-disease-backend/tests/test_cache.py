@@ -0,0 +1,112 @@
+"""TTL, model-version keying and near-duplicate matching in PredictionCache"""
+
+import numpy as np
+import pytest
+
+from src.inference import cache as cache_module
+from src.inference.cache import PredictionCache, content_key, dhash
+
+class FakeClock:
+    def __init__(self):
+        self.monotonic = 1000.0
+        self.wall = 1_700_000_000.0
+
+    def advance(self, seconds):
+        self.monotonic += seconds
+        self.wall += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: fake.monotonic)
+    monkeypatch.setattr(cache_module.time, 'time', lambda: fake.wall)
+    return fake
+
+def make_cache(**overrides):
+    options = {'max_entries': 8, 'ttl_seconds': 60, 'near_duplicate_radius': 0, 'disk_dir': ''}
+    options.update(overrides)
+    return PredictionCache(**options)
+
+RESULT = {'disease': 'Rust', 'confidence': 0.9}
+
+def test_entry_expires_after_ttl(clock):
+    cache = make_cache()
+    cache.put('a', RESULT)
+    clock.advance(59)
+    assert cache.get('a') == RESULT
+    clock.advance(2)
+    assert cache.get('a') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_disk_entry_expires_after_ttl(clock, tmp_path):
+    cache = make_cache(disk_dir=str(tmp_path))
+    cache.put('a', RESULT)
+    restarted = make_cache(disk_dir=str(tmp_path))
+    assert restarted.get('a') == RESULT
+    assert restarted.disk_hits == 1
+
+    clock.advance(61)
+    assert make_cache(disk_dir=str(tmp_path)).get('a') is None
+
+def test_other_model_version_misses(clock, tmp_path):
+    cache = make_cache(disk_dir=str(tmp_path))
+    cache.put('a', RESULT, version='detector=v1')
+    assert cache.get('a', version='detector=v2') is None
+    assert cache.get('a') is None
+    assert cache.get('a', version='detector=v1') == RESULT
+
+def test_results_are_copied_in_and_out(clock):
+    cache = make_cache()
+    result = {'detections': [{'disease': 'Rust'}]}
+    cache.put('a', result)
+    result['detections'].append('mutated after put')
+    cached = cache.get('a')
+    cached['detections'].clear()
+    assert cache.get('a') == {'detections': [{'disease': 'Rust'}]}
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = make_cache(max_entries=2)
+    cache.put('a', RESULT)
+    cache.put('b', RESULT)
+    cache.get('a')
+    cache.put('c', RESULT)
+    assert cache.get('b') is None
+    assert cache.get('a') == RESULT
+    assert cache.evictions == 1
+
+def leaf_image(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+def test_near_duplicate_within_radius_hits(clock):
+    image = leaf_image()
+    brighter = np.clip(image.astype(np.int16) + 3, 0, 255).astype(np.uint8)
+    cache = make_cache(near_duplicate_radius=6)
+    cache.put(content_key(image.tobytes()), RESULT, phash=dhash(image))
+
+    assert cache.get(content_key(brighter.tobytes()), phash=dhash(brighter)) == RESULT
+    assert cache.near_hits == 1
+
+def test_near_duplicate_outside_radius_misses(clock):
+    cache = make_cache(near_duplicate_radius=2)
+    cache.put('a', RESULT, phash=0b0000)
+    assert cache.get('b', phash=0b0111) is None
+    assert cache.get('b', phash=0b0011) == RESULT
+
+def test_near_duplicate_needs_the_same_version(clock):
+    cache = make_cache(near_duplicate_radius=4)
+    cache.put('a', RESULT, phash=0b1010, version='v1')
+    assert cache.get('b', phash=0b1011, version='v2') is None
+    assert cache.get('b', phash=0b1011, version='v1') == RESULT
+
+def test_expired_entry_is_not_a_near_duplicate(clock):
+    cache = make_cache(near_duplicate_radius=4)
+    cache.put('a', RESULT, phash=0b1010)
+    clock.advance(61)
+    assert cache.get('b', phash=0b1010) is None
+    assert cache.get_stats()['entries'] == 0
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = make_cache(max_entries=0)
+    cache.put('a', RESULT)
+    assert cache.get('a') is None
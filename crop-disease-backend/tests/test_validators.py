@@ -0,0 +1,86 @@
+"""Header sniffing and chunk-by-chunk rejection of uploads"""
+
+import io
+
+import pytest
+from PIL import Image
+
+from src.inference.cache import content_key
+from src.utils.validators import ImageValidator, UploadRejected, sniff_image_header
+
+def encode(format_name, size=(320, 240), **options):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'green').save(buffer, format_name, **options)
+    return buffer.getvalue()
+
+def jpeg_with_exif(size=(320, 240)):
+    exif = Image.Exif()
+    exif[0x010F] = "Camera" * 200  # pushes the frame header past an APP1 segment
+    return encode('JPEG', size, exif=exif.tobytes())
+
+@pytest.mark.parametrize("format_name, expected", [('PNG', 'PNG'), ('JPEG', 'JPEG')])
+def test_sniff_reads_format_and_dimensions(format_name, expected):
+    assert sniff_image_header(encode(format_name)) == (expected, 320, 240)
+
+def test_sniff_skips_jpeg_segments_before_the_frame_header():
+    assert sniff_image_header(jpeg_with_exif()) == ('JPEG', 320, 240)
+
+@pytest.mark.parametrize("data", [encode('PNG'), encode('JPEG'), jpeg_with_exif()])
+def test_sniff_waits_for_more_bytes_on_a_truncated_header(data):
+    header_end = next(n for n in range(1, len(data)) if sniff_image_header(data[:n]) is not None)
+    for n in range(1, header_end):
+        assert sniff_image_header(data[:n]) is None
+
+@pytest.mark.parametrize("data", [b'GIF89a\x01\x00', b'BM\x00\x00\x00\x00\x00\x00', b'%PDF-1.7'])
+def test_sniff_rejects_other_formats(data):
+    with pytest.raises(ValueError):
+        sniff_image_header(data)
+
+def test_sniff_rejects_jpeg_without_a_frame_header():
+    with pytest.raises(ValueError):
+        sniff_image_header(b'\xff\xd8\xff\xda\x00\x08' + b'\x00' * 8)
+
+def feed_in_chunks(upload, data, chunk_size):
+    for start in range(0, len(data), chunk_size):
+        upload.feed(data[start:start + chunk_size])
+    return upload
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_streaming_upload_sniffs_across_chunks_and_hashes_content(chunk_size):
+    data = jpeg_with_exif()
+    upload = feed_in_chunks(ImageValidator().stream('leaf.jpg', 'image/jpeg'), data, chunk_size).finish()
+    assert (upload.format, upload.width, upload.height) == ('JPEG', 320, 240)
+    assert upload.key == content_key(data)
+
+def test_streaming_upload_rejects_non_image_on_the_first_chunk():
+    upload = ImageValidator().stream('leaf.jpg', 'image/jpeg')
+    with pytest.raises(UploadRejected) as excinfo:
+        upload.feed(b'GIF89a' + b'\x00' * 100)
+    assert excinfo.value.status_code == 415
+
+def test_streaming_upload_rejects_oversized_upload_before_buffering_it():
+    validator = ImageValidator()
+    validator.max_file_size = 2048
+    upload = validator.stream('leaf.png', 'image/png')
+    head = encode('PNG')[:64]
+    upload.feed(head)
+    with pytest.raises(UploadRejected) as excinfo:
+        upload.feed(b'\x00' * 2048)
+    assert excinfo.value.status_code == 413
+    assert upload.size == len(head)
+
+def test_streaming_upload_rejects_out_of_range_dimensions_from_the_header():
+    upload = ImageValidator().stream('leaf.png', 'image/png')
+    with pytest.raises(UploadRejected) as excinfo:
+        upload.feed(encode('PNG', size=(50, 50))[:64])
+    assert excinfo.value.status_code == 400
+
+def test_streaming_upload_rejects_truncated_header_at_finish():
+    validator = ImageValidator()
+    validator.min_file_size = 0
+    upload = validator.stream('leaf.jpg', 'image/jpeg')
+    upload.feed(jpeg_with_exif()[:200])
+    with pytest.raises(UploadRejected) as excinfo:
+        upload.finish()
+    assert excinfo.value.status_code == 400
+    assert "incomplete header" in excinfo.value.detail
@@ -1,19 +1,42 @@
 import json
 import sys
 import os
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+
+GROQ_API_URL = os.getenv('GROQ_API_URL', 'https://api.groq.com/openai/v1/chat/completions')
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Shared keep-alive HTTP session so repeated calls reuse TLS connections"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(os.getenv('MISTRAL_SERVICE_POOL_SIZE', '8'))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
 
 def get_groq_response(prompt, action='chat'):
     """Get response from Groq API using a supported model"""
-    
+
     # Get API key from environment
     api_key = os.getenv('GROQ_API_KEY')
     if not api_key:
         return {"response": "Groq API key not configured. Please set GROQ_API_KEY environment variable."}
-    
+
     # Use the latest supported model
     model = 'llama-3.1-8b-instant'
-    
+
     # Create appropriate prompt based on action
     if action == 'advice':
         full_prompt = f"You are a helpful farming assistant. Provide practical farming advice for this query: {prompt}"
@@ -21,11 +44,11 @@ def get_groq_response(prompt, action='chat'):
         full_prompt = f"You are a crop disease diagnosis expert. Analyze these symptoms and provide diagnosis: {prompt}"
     else:  # chat
         full_prompt = prompt
-    
+
     try:
         # Make request to Groq API
-        response = requests.post(
-            'https://api.groq.com/openai/v1/chat/completions',
+        response = get_session().post(
+            GROQ_API_URL,
             headers={
                 'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json'
@@ -38,7 +61,7 @@ def get_groq_response(prompt, action='chat'):
             },
             timeout=30
         )
-        
+
         if response.status_code == 200:
             data = response.json()
             ai_response = data['choices'][0]['message']['content']
@@ -46,36 +69,89 @@ def get_groq_response(prompt, action='chat'):
         else:
             error_data = response.json()
             return {"response": f"Error from Groq API: {error_data.get('error', {}).get('message', 'Unknown error')}"}
-            
+
     except Exception as e:
         return {"response": f"Error connecting to Groq API: {str(e)}"}
 
+def handle_request(request):
+    """Turn one {"action", "input"} request into a {"response"} result"""
+    action = request.get('action', 'chat')
+    input_text = request.get('input', '')
+
+    if not input_text:
+        return {"response": "No input text provided"}
+
+    # Get response from Groq
+    return get_groq_response(input_text, action)
+
+def serve(max_workers):
+    """
+    Resident mode: read one JSON request per line from stdin and answer each
+    with one JSON line on stdout. Requests run concurrently on a thread pool
+    and share the keep-alive session; an optional "id" field is echoed back
+    so callers can match out-of-order responses.
+    """
+    write_lock = threading.Lock()
+
+    def send(message):
+        with write_lock:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    def run(request):
+        try:
+            result = handle_request(request)
+        except Exception as e:
+            result = {"response": f"Error processing request: {str(e)}"}
+        result['id'] = request.get('id')
+        send(result)
+
+    # Open the pool before the first request so its handshake is not on the clock
+    get_session()
+    send({"ready": True, "pid": os.getpid()})
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                send({"id": None, "response": "Invalid JSON input"})
+                continue
+            executor.submit(run, request)
+
 def main():
     """Main function to handle stdin input"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', action='store_true',
+                        help='Stay resident and answer JSON-lines requests on stdin')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.getenv('MISTRAL_SERVICE_WORKERS', '8')),
+                        help='Concurrent requests in resident mode')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.workers)
+        return
+
     try:
         # Read input from stdin
         input_data = sys.stdin.read()
         if not input_data:
             print(json.dumps({"response": "No input provided"}))
             return
-            
+
         # Parse JSON input
         request = json.loads(input_data)
-        action = request.get('action', 'chat')
-        input_text = request.get('input', '')
-        
-        if not input_text:
-            print(json.dumps({"response": "No input text provided"}))
-            return
-            
-        # Get response from Groq
-        result = get_groq_response(input_text, action)
+        result = handle_request(request)
         print(json.dumps(result))
-        
+
     except json.JSONDecodeError:
         print(json.dumps({"response": "Invalid JSON input"}))
     except Exception as e:
         print(json.dumps({"response": f"Error processing request: {str(e)}"}))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
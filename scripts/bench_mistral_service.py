@@ -0,0 +1,116 @@
+"""
+Latency benchmark for mistral_service.py: one process per request vs resident mode.
+
+Runs against a local stand-in for the Groq chat completions endpoint, so no
+API key or network is needed. The stand-in speaks plain HTTP/1.1 keep-alive,
+so the numbers cover interpreter start-up and connection reuse but not the
+TLS handshake saved against the real endpoint.
+
+Usage:
+    python scripts/bench_mistral_service.py --requests 20 --concurrency 4
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVICE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mistral_service.py')
+
+
+class StandInGroqHandler(BaseHTTPRequestHandler):
+    """Answers every POST like a chat completions endpoint"""
+    protocol_version = 'HTTP/1.1'
+    delay_s = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        body = json.dumps({'choices': [{'message': {'content': 'stand-in answer'}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(delay_ms):
+    StandInGroqHandler.delay_s = delay_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions'
+
+
+def bench_one_shot(env, count):
+    latencies = []
+    payload = json.dumps({'action': 'chat', 'input': 'How often should I water tomatoes?'})
+    for _ in range(count):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, SERVICE_PATH], input=payload, env=env,
+                       capture_output=True, text=True, check=True)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_resident(env, count, concurrency):
+    proc = subprocess.Popen([sys.executable, SERVICE_PATH, '--serve', '--workers', str(concurrency)],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True, bufsize=1)
+    json.loads(proc.stdout.readline())  # ready line
+
+    sent_at = {}
+    latencies = []
+    next_id = 0
+    in_flight = 0
+    try:
+        while len(latencies) < count:
+            while in_flight < concurrency and next_id < count:
+                sent_at[next_id] = time.perf_counter()
+                proc.stdin.write(json.dumps({'id': next_id, 'action': 'chat', 'input': 'How often should I water tomatoes?'}) + '\n')
+                next_id += 1
+                in_flight += 1
+            reply = json.loads(proc.stdout.readline())
+            latencies.append(time.perf_counter() - sent_at.pop(reply['id']))
+            in_flight -= 1
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=10)
+    return latencies
+
+
+def summarize(name, latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<10} n={len(ordered):<4} mean={statistics.mean(ordered) * 1000:8.1f}ms "
+          f"p50={statistics.median(ordered) * 1000:8.1f}ms p95={p95 * 1000:8.1f}ms")
+    return statistics.median(ordered)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1, help='In-flight requests in resident mode')
+    parser.add_argument('--delay-ms', type=float, default=0.0, help='Simulated upstream latency')
+    args = parser.parse_args()
+
+    server, url = start_stand_in(args.delay_ms)
+    env = dict(os.environ, GROQ_API_URL=url, GROQ_API_KEY='bench')
+    try:
+        one_shot = summarize('one-shot', bench_one_shot(env, args.requests))
+        resident = summarize('resident', bench_resident(env, args.requests, args.concurrency))
+        print(f"median speed-up: {one_shot / resident:.1f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()